@@ -1,23 +1,40 @@
-from flask import Blueprint, request, jsonify
-from twilio.rest import Client
-from twilio.base.exceptions import TwilioRestException
-from datetime import datetime, timezone, timedelta
-from dateutil import parser
-from dateutil.tz import gettz
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
-from google.oauth2 import service_account
+from flask import Blueprint, Response, request, jsonify, g, has_request_context
+from datetime import datetime, date, timezone, timedelta
 from dotenv import load_dotenv
-from typing import Optional, Tuple, List, Dict
+from typing import Optional, Tuple, List, Dict, Set
+from contextlib import contextmanager
 from collections import defaultdict
+from concurrent.futures import Future
 from zoneinfo import ZoneInfo
-import pytz
-import gspread
+import threading
+import click
+import copy
 import os
 import json
 
 load_dotenv()
 
+# Local modules read their settings from the environment when imported, so .env is loaded first
+from patient_index import (
+    patient_matches, patient_identity, normalize_phone, event_dentist, private_properties, parse_description_fields
+)
+from event_stream import stream_events, PAGE_SIZE, LOOKUP_PAGE_SIZE
+from outbox import Outbox, PermanentFailure, get_outbox
+from audit_writer import AuditWriter, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL
+from sms_dispatcher import SmsDispatcher, build_twilio_client
+from availability import OpeningHours, parse_clock, slot_grid, merge_intervals, free_slots
+from freebusy import parse_calendar_map, query_busy
+from availability_cache import get_availability_cache
+from call_context import get_call_contexts, request_call_id
+from slot_locks import SlotLockTimeout, get_slot_locks
+from idempotency import idempotent
+from appointment import decode_event, parse_iso, parse_datetime, DISPLAY_TIME_FORMAT
+from metrics import log, span, instrument_blueprint, render_metrics
+from profiling import install_profiler
+from bulk_ops import BULK_MAX_DAYS, CallResult, delete_events, patch_events
+import google_services
+import calendar_mirror
+
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
@@ -25,6 +42,18 @@ GMAIL_ACCOUNT = os.getenv("GMAIL_ACCOUNT")
 SPREAD_SHEET = os.getenv("SPREAD_SHEET")
 SERVICE_TIME = int(os.getenv("SERVICE_TIME", 60))
 ALDERSHOT_DENTURE_CLINIC = os.getenv("ALDERSHOT_DENTURE_CLINIC")
+AVAILABILITY_PROPERTY_FILTER = os.getenv("AVAILABILITY_PROPERTY_FILTER", "false").lower() in ("1", "true", "yes")
+# Set once `flask aldershot backfill-properties` has run: every upcoming event then carries the
+# patient's phone property, so a lookup the property filter misses skips the full calendar scan
+PATIENT_PROPERTIES_BACKFILLED = os.getenv("PATIENT_PROPERTIES_BACKFILLED", "false").lower() in ("1", "true", "yes")
+# "events" lists event bodies and matches the dentist in each; "freebusy" asks the FreeBusy API
+# for the busy time of each dentist's own calendar in DENTIST_CALENDARS
+AVAILABILITY_BACKEND = os.getenv("AVAILABILITY_BACKEND", "events").lower()
+DENTIST_CALENDARS = parse_calendar_map(os.getenv("DENTIST_CALENDARS"))
+# Comma-separated dentist roster used when a batch availability request asks for "all"
+DENTISTS = [name.strip() for name in os.getenv("DENTISTS", "").split(",") if name.strip()]
+
+TORONTO_TZ = ZoneInfo("America/Toronto")
 
 SERVICE_ACCOUNT_FILE = "vapi-dentist-book-222f512f966f.json"
 SCOPES = [
@@ -36,6 +65,8 @@ SCOPES = [
 
 # Create a Blueprint for the extra routes
 asbp = Blueprint("aldershot", __name__)
+instrument_blueprint(asbp)
+install_profiler(asbp)
 
 
 class BusinessHours:
@@ -44,11 +75,85 @@ class BusinessHours:
     LUNCH_START = int(os.getenv("LUNCH_START", 12))
     LUNCH_END = int(os.getenv("LUNCH_END", 13))
     SLOT_DURATION = int(os.getenv("SERVICE_TIME", 60))
+    # Minute-level overrides, e.g. OPEN_TIME=8:30 or LUNCH_END_TIME=12:45
+    OPEN_TIME = os.getenv("OPEN_TIME", f"{OPEN_HOUR}:00")
+    CLOSE_TIME = os.getenv("CLOSE_TIME", f"{CLOSE_HOUR}:00")
+    LUNCH_START_TIME = os.getenv("LUNCH_START_TIME", f"{LUNCH_START}:00")
+    LUNCH_END_TIME = os.getenv("LUNCH_END_TIME", f"{LUNCH_END}:00")
+    # Spacing between offered start times (5, 10, 15, ... minutes); defaults to one slot per appointment
+    SLOT_GRANULARITY = int(os.getenv("SLOT_GRANULARITY", SLOT_DURATION))
+    # How many business days /get_available looks ahead, and the most a caller may ask for
+    AVAILABILITY_DAYS = int(os.getenv("AVAILABILITY_DAYS", 3))
+    MAX_AVAILABILITY_DAYS = int(os.getenv("MAX_AVAILABILITY_DAYS", 30))
+
+    @classmethod
+    def opening_hours(cls) -> OpeningHours:
+        return OpeningHours(
+            open_minute=parse_clock(cls.OPEN_TIME),
+            close_minute=parse_clock(cls.CLOSE_TIME),
+            lunch_start_minute=parse_clock(cls.LUNCH_START_TIME),
+            lunch_end_minute=parse_clock(cls.LUNCH_END_TIME),
+            slot_duration=cls.SLOT_DURATION,
+            granularity=cls.SLOT_GRANULARITY
+        )
+
+
+_sms_dispatcher: Optional[SmsDispatcher] = None
+_sms_dispatcher_pid: Optional[int] = None
+_sms_dispatcher_lock = threading.Lock()
+
+def get_sms_dispatcher() -> SmsDispatcher:
+    """
+    Return the process-wide SMS dispatcher, sharing one Twilio client and HTTP session
 
+    A forked child builds its own: the parent's sender threads do not survive
+    the fork and its HTTP connections must not be shared.
+    """
+    global _sms_dispatcher, _sms_dispatcher_pid
+    if _sms_dispatcher_pid != os.getpid():
+        with _sms_dispatcher_lock:
+            if _sms_dispatcher_pid != os.getpid():
+                _sms_dispatcher = SmsDispatcher(
+                    lambda: build_twilio_client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN))
+                _sms_dispatcher_pid = os.getpid()
+    return _sms_dispatcher
+
+def dispatch_sms(to_number: str, message_body: str, from_number: str = None) -> Future:
+    """
+    Queue an SMS notification on the rate-limited dispatcher
+
+    Takes the same parameters as send_sms_notification().
+
+    Returns:
+    - Future: Resolves to the result dict described in send_sms_notification()
+    """
+    # Validate required credentials
+    if not all([TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN]):
+        return completed_future({
+            'success': False,
+            'message': 'Twilio credentials not properly configured',
+            'error_code': 'MISSING_CREDENTIALS'
+        })
+
+    # Use provided from_number or fall back to default
+    sender = from_number or TWILIO_PHONE_NUMBER
+    if not sender:
+        return completed_future({
+            'success': False,
+            'message': 'No sender phone number provided or configured',
+            'error_code': 'MISSING_SENDER'
+        })
+
+    return get_sms_dispatcher().send(to_number, message_body, sender)
+
+def completed_future(result) -> Future:
+    future = Future()
+    future.set_result(result)
+    return future
 
 def send_sms_notification(to_number: str, message_body: str, from_number: str = None) -> dict:
     """
-    Send SMS notification using Twilio
+    Send SMS notification using Twilio and wait for the result
     
     Parameters:
     - to_number (str): Recipient's phone number in E.164 format (e.g., '+1234567890')
@@ -64,57 +169,93 @@ def send_sms_notification(to_number: str, message_body: str, from_number: str =
             'error_code': str,  # Only included if failed
         }
     """
-    try:
-        # Get Twilio credentials from environment variables
-        account_sid = os.getenv('TWILIO_ACCOUNT_SID')
-        auth_token = os.getenv('TWILIO_AUTH_TOKEN')
-        default_from = os.getenv('TWILIO_PHONE_NUMBER')
+    return dispatch_sms(to_number, message_body, from_number).result()
 
-        # Validate required credentials
-        if not all([account_sid, auth_token]):
-            return {
-                'success': False,
-                'message': 'Twilio credentials not properly configured',
-                'error_code': 'MISSING_CREDENTIALS'
-            }
+_audit_writer: Optional[AuditWriter] = None
+_audit_writer_lock = threading.Lock()
 
-        # Use provided from_number or fall back to default
-        sender = from_number or default_from
-        if not sender:
-            return {
-                'success': False,
-                'message': 'No sender phone number provided or configured',
-                'error_code': 'MISSING_SENDER'
-            }
+def get_audit_writer() -> AuditWriter:
+    """Return the process-wide audit writer"""
+    global _audit_writer
+    if _audit_writer is None:
+        with _audit_writer_lock:
+            if _audit_writer is None:
+                _audit_writer = AuditWriter(get_sheet_service, SPREAD_SHEET)
+    return _audit_writer
 
-        # Initialize Twilio client
-        client = Client(account_sid, auth_token)
+def deliver_audit_rows(payloads: List[dict]):
+    """
+    Outbox handler: append a batch of audit rows to the clinic spreadsheet in one write
 
-        # Send message
-        message = client.messages.create(
-            body=message_body,
-            from_=sender,
-            to=to_number
-        )
+    The outbox holds new rows back until AUDIT_BATCH_SIZE of them are
+    queued or the oldest has waited AUDIT_FLUSH_INTERVAL seconds, so a busy
+    clinic makes one Sheets call per batch rather than one per booking.
+    """
+    get_audit_writer().write_rows([payload['row'] for payload in payloads])
+
+def deliver_sms(payload: dict):
+    """Outbox handler: send one SMS, raising so that failures are retried or dead-lettered"""
+    result = send_sms_notification(to_number=payload['to'], message_body=payload['body'])
+    if result['success']:
+        return
+
+    error_code = result.get('error_code')
+    # Configuration errors and Twilio 21xxx request errors (invalid number, ...) never succeed on retry
+    if error_code in ('MISSING_CREDENTIALS', 'MISSING_SENDER') or (
+            isinstance(error_code, int) and 21000 <= error_code < 22000):
+        raise PermanentFailure(result['message'])
+    raise RuntimeError(result['message'])
+
+def get_side_effect_outbox() -> Outbox:
+    """Return the process-wide outbox with the audit row and SMS handlers registered"""
+    side_effects = get_outbox()
+    side_effects.register("audit_row", deliver_audit_rows, batch_size=AUDIT_BATCH_SIZE, max_wait=AUDIT_FLUSH_INTERVAL)
+    side_effects.register("sms", deliver_sms)
+    return side_effects
+
+def stop_side_effects(timeout: float = 5):
+    """Stop the outbox workers, e.g. before an embedding process exits; undelivered items stay queued"""
+    get_outbox().stop(timeout)
+
+def record_side_effects(audit_row: list, sms_to: str, sms_body: str):
+    """
+    Durably record the audit row and SMS of a calendar change
 
-        return {
-            'success': True,
-            'message': 'SMS sent successfully',
-            'sid': message.sid
-        }
+    Both are written to the outbox in one transaction and delivered by its
+    background workers, so the caller does not wait on Sheets or Twilio. If the
+    outbox itself is unavailable they are delivered inline as before.
+    """
+    audit_payload = {'row': audit_row}
+    sms_payload = {'to': sms_to, 'body': sms_body}
+    try:
+        get_side_effect_outbox().enqueue([("audit_row", audit_payload), ("sms", sms_payload)])
+        return
+    except Exception as e:
+        log("side_effects", f"Failed to queue side effects, delivering inline: {str(e)}", level="warning")
 
-    except TwilioRestException as e:
-        return {
-            'success': False,
-            'message': f'Twilio error: {str(e)}',
-            'error_code': e.code
-        }
+    try:
+        deliver_audit_rows([audit_payload])
     except Exception as e:
-        return {
-            'success': False,
-            'message': f'Unexpected error: {str(e)}',
-            'error_code': 'UNKNOWN_ERROR'
-        }
+        log("side_effects", f"Failed to open spreadsheet: {str(e)}", level="warning")
+    try:
+        deliver_sms(sms_payload)
+    except Exception as e:
+        log("side_effects", f"Failed to send SMS: {str(e)}", level="warning")
+
+@asbp.cli.command("outbox-dead-letters")
+def outbox_dead_letters_command():
+    """List audit rows and SMS that could not be delivered"""
+    for item in get_side_effect_outbox().dead_letters():
+        print(json.dumps(item))
+
+@asbp.cli.command("outbox-retry")
+@click.argument("item_id", type=int)
+def outbox_retry_command(item_id: int):
+    """Put a dead-lettered outbox item back in the queue"""
+    if get_side_effect_outbox().retry_dead_letter(item_id):
+        print(f"Requeued outbox item {item_id}")
+    else:
+        print(f"No dead-lettered outbox item {item_id}")
 
 def validate_appointment_time(appointment_date: str) -> tuple[bool, str, datetime]:
     """
@@ -128,18 +269,17 @@ def validate_appointment_time(appointment_date: str) -> tuple[bool, str, datetim
     """
     try:
         # Parse the appointment date
-        toronto_tz = gettz('America/Toronto')
-        appointment_dt = parser.parse(appointment_date)
+        appointment_dt = parse_datetime(appointment_date)
         
         # If timezone not specified, assume Toronto time
         if appointment_dt.tzinfo is None:
-            appointment_dt = appointment_dt.replace(tzinfo=toronto_tz)
+            appointment_dt = appointment_dt.replace(tzinfo=TORONTO_TZ)
         else:
             # Convert to Toronto time if in different timezone
-            appointment_dt = appointment_dt.astimezone(toronto_tz)
+            appointment_dt = appointment_dt.astimezone(TORONTO_TZ)
             
         # Check if appointment is in the future
-        now = datetime.now(toronto_tz)
+        now = datetime.now(TORONTO_TZ)
         if appointment_dt <= now:
             return False, "Appointment time must be in the future", None
             
@@ -150,22 +290,414 @@ def validate_appointment_time(appointment_date: str) -> tuple[bool, str, datetim
 
 def format_appointment_time(iso_time_str: str) -> str:
     """Convert ISO time string to human-readable format in Toronto timezone"""
-    toronto_tz = pytz.timezone('America/Toronto')
-    dt = parser.parse(iso_time_str)
-    toronto_time = dt.astimezone(toronto_tz)
-    return toronto_time.strftime("%B %d, %Y at %I:%M %p %Z")
+    return parse_iso(iso_time_str).astimezone(TORONTO_TZ).strftime(DISPLAY_TIME_FORMAT)
 
 def get_calendar_service():
-    credentials = service_account.Credentials.from_service_account_file(
-        SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    
-    return build('calendar', 'v3', credentials=credentials)
+    """
+    Return a pooled Calendar client leased to the current request
+
+    The client is checked out of the process-wide pool on first use and
+    returned to it when the request is torn down, so it is never shared
+    between threads while a call is in flight.
+    """
+    lease = g.get('calendar_lease')
+    if lease is None:
+        lease = google_services.registry.calendar_pool(SERVICE_ACCOUNT_FILE, SCOPES).acquire()
+        g.calendar_lease = lease
+    return lease.service
 
 def get_sheet_service():
-    credentials = service_account.Credentials.from_service_account_file(
-        SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    
-    return gspread.authorize(credentials=credentials)
+    """Return the process-wide gspread client (rebuilt only when the key file or scopes change)"""
+    return google_services.registry.sheets(SERVICE_ACCOUNT_FILE, SCOPES)
+
+@contextmanager
+def calendar_service_scope():
+    """Yield a Calendar client: the request's lease inside a request, a pooled one in background threads"""
+    if has_request_context():
+        yield get_calendar_service()
+        return
+    with google_services.registry.calendar_pool(SERVICE_ACCOUNT_FILE, SCOPES).checkout() as service:
+        yield service
+
+@asbp.teardown_request
+def release_pooled_clients(exc):
+    lease = g.pop('calendar_lease', None)
+    if lease is not None:
+        lease.release()
+
+def list_events_between(
+    service,
+    calendar_id: str,
+    time_min: datetime,
+    time_max: datetime,
+    dentist: Optional[str] = None
+) -> List[dict]:
+    """
+    Return the events overlapping [time_min, time_max), ordered by start time
+
+    When `dentist` is given and AVAILABILITY_PROPERTY_FILTER is enabled, the
+    live listing asks Google for that dentist's events only. Events booked
+    before extendedProperties were written carry no `dentist` property, so
+    enable the filter only once they have been backfilled.
+    """
+    if calendar_mirror.MIRROR_ENABLED:
+        mirror = calendar_mirror.get_mirror(calendar_id)
+        mirror.refresh(service)
+        return mirror.between(time_min, time_max)
+
+    params = {}
+    if dentist and AVAILABILITY_PROPERTY_FILTER:
+        params['privateExtendedProperty'] = f"dentist={dentist.strip().lower()}"
+
+    return list(stream_events(
+        service,
+        calendar_id,
+        timeMin=time_min.isoformat(),
+        timeMax=time_max.isoformat(),
+        singleEvents=True,
+        orderBy='startTime',
+        **params
+    ))
+
+def current_call_id() -> Optional[str]:
+    """The Vapi call ID of the current tool call; None outside a request or when the caller sends none"""
+    if not has_request_context():
+        return None
+    if 'call_id' not in g:
+        g.call_id = request_call_id(request.get_json(silent=True))
+    return g.call_id
+
+def find_patient_events(
+    service,
+    calendar_id: str,
+    patient_name: str,
+    patient_phone: str,
+    limit: Optional[int] = None
+) -> List[dict]:
+    """
+    Return the upcoming events booked for a patient, ordered by start time
+
+    An earlier tool call of the same Vapi call may already have found them;
+    otherwise they are looked up and kept for the rest of the call.
+    """
+    call_id = current_call_id()
+    if call_id:
+        events = get_call_contexts().patient_events(call_id, patient_name, patient_phone, limit)
+        if events is not None:
+            return events
+
+    events = lookup_patient_events(service, calendar_id, patient_name, patient_phone, limit)
+    if call_id:
+        get_call_contexts().remember_patient_events(call_id, patient_name, patient_phone, limit, events)
+    return events
+
+def patient_lookup_filters(patient_phone: str) -> List[dict]:
+    """
+    The listing parameters a live patient lookup tries, in order, until one finds the patient
+
+    Events booked through /book carry the phone as a private property, so
+    Google can filter them. Events booked before that are only found by a
+    full scan, which is skipped once PATIENT_PROPERTIES_BACKFILLED says the
+    backfill gave them the property too.
+    """
+    filters = [{'privateExtendedProperty': f"phone={normalize_phone(patient_phone)}"}]
+    if not PATIENT_PROPERTIES_BACKFILLED:
+        filters.append({})
+    return filters
+
+def lookup_patient_events(
+    service,
+    calendar_id: str,
+    patient_name: str,
+    patient_phone: str,
+    limit: Optional[int] = None
+) -> List[dict]:
+    """
+    Look a patient's upcoming events up in the mirror or the live calendar
+
+    With `limit`, the live listing stops as soon as that many matches are
+    found, so a typical lookup reads a single small page.
+    """
+    if calendar_mirror.MIRROR_ENABLED:
+        mirror = calendar_mirror.get_mirror(calendar_id)
+        mirror.refresh(service)
+        return mirror.find_patient(patient_name, patient_phone)[:limit]
+
+    for params in patient_lookup_filters(patient_phone):
+        matches = []
+        for event in stream_events(
+            service,
+            calendar_id,
+            page_size=LOOKUP_PAGE_SIZE if limit else PAGE_SIZE,
+            prefetch=not limit,
+            timeMin=datetime.now(timezone.utc).isoformat(),
+            singleEvents=True,
+            orderBy='startTime',
+            **params
+        ):
+            if patient_matches(event, patient_name, patient_phone):
+                matches.append(event)
+                if limit and len(matches) >= limit:
+                    break
+        if matches:
+            return matches
+    return []
+
+def dentist_matches(event: dict, dentist: str) -> bool:
+    """Check whether an event keeps `dentist` busy; an empty dentist matches every booked event"""
+    event_dentist_name = event_dentist(event)
+    if event_dentist_name is None:
+        return False
+    return not dentist or event_dentist_name == dentist.strip().lower()
+
+def busy_intervals_by_dentist(
+    service,
+    calendar_id: str,
+    time_min: datetime,
+    time_max: datetime,
+    dentists: List[str]
+) -> Dict[str, List[Tuple[datetime, datetime]]]:
+    """
+    Return the merged, sorted periods in which each dentist is busy
+
+    With AVAILABILITY_BACKEND=freebusy the dentists' calendars from
+    DENTIST_CALENDARS are queried through the FreeBusy API (an empty dentist
+    means every mapped calendar). Dentists without their own calendar fall
+    back to the shared calendar, listed once and partitioned by dentist in a
+    single pass.
+
+    Busy intervals fetched by an earlier tool call of the same Vapi call
+    for a covering window are reused.
+
+    Returns:
+    - Dict[str, List[Tuple[datetime, datetime]]]: Busy intervals per lowercased dentist
+    """
+    keys = list(dict.fromkeys(dentist.strip().lower() for dentist in dentists))
+    busy = {}
+    call_id = current_call_id()
+    if call_id:
+        for key in keys:
+            intervals = get_call_contexts().busy_intervals(call_id, key, time_min, time_max)
+            if intervals is not None:
+                busy[key] = intervals
+        reused = set(busy)
+
+    if AVAILABILITY_BACKEND == 'freebusy':
+        calendars = {}
+        for key in keys:
+            if key in busy:
+                continue
+            if key in DENTIST_CALENDARS:
+                calendars[key] = [DENTIST_CALENDARS[key]]
+            elif not key and DENTIST_CALENDARS:
+                calendars[key] = list(DENTIST_CALENDARS.values())
+        if calendars:
+            by_calendar = query_busy(
+                service, [cid for ids in calendars.values() for cid in ids], time_min, time_max)
+            for key, ids in calendars.items():
+                busy[key] = merge_intervals(interval for cid in ids for interval in by_calendar[cid])
+        for key in keys:
+            if key not in busy:
+                log("busy_intervals", f"no calendar configured for dentist '{key}', using the events listing")
+
+    remaining = [key for key in keys if key not in busy]
+    if remaining:
+        events = list_events_between(
+            service, calendar_id, time_min, time_max,
+            dentist=remaining[0] if len(remaining) == 1 else None)
+        busy.update(partition_busy_intervals(events, remaining))
+    if call_id:
+        get_call_contexts().remember_busy_intervals(
+            call_id, {key: intervals for key, intervals in busy.items() if key not in reused}, time_min, time_max)
+    return busy
+
+def partition_busy_intervals(events: List[dict], dentists: List[str]) -> Dict[str, List[Tuple[datetime, datetime]]]:
+    """Split events into merged busy intervals per lowercased dentist, in a single pass"""
+    intervals = {key: [] for key in dentists}
+    for event in events:
+        owner = event_dentist(event)
+        if owner is None:
+            continue
+        bounds = calendar_mirror.event_bounds(event)
+        if bounds is None:
+            continue
+        # An empty dentist is kept busy by every booked event, as in dentist_matches()
+        if '' in intervals:
+            intervals[''].append(bounds)
+        if owner and owner in intervals:
+            intervals[owner].append(bounds)
+    return {key: merge_intervals(key_intervals) for key, key_intervals in intervals.items()}
+
+def busy_intervals(
+    service,
+    calendar_id: str,
+    time_min: datetime,
+    time_max: datetime,
+    dentist: str
+) -> List[Tuple[datetime, datetime]]:
+    """Return the merged, sorted periods in which `dentist` is busy"""
+    return busy_intervals_by_dentist(service, calendar_id, time_min, time_max, [dentist])[dentist.strip().lower()]
+
+def availability_window(days: List[date]) -> Tuple[datetime, datetime]:
+    """From the opening of the first day to the closing of the last"""
+    hours = BusinessHours.opening_hours()
+    midnight = datetime.min.time()
+    return (
+        datetime.combine(min(days), midnight, tzinfo=TORONTO_TZ) + timedelta(minutes=hours.open_minute),
+        datetime.combine(max(days), midnight, tzinfo=TORONTO_TZ) + timedelta(minutes=hours.close_minute),
+    )
+
+def free_slots_by_dentist(
+    wanted: Dict[str, List[date]],
+    busy: Dict[str, List[Tuple[datetime, datetime]]]
+) -> Dict[str, Dict[date, List[datetime]]]:
+    """Sweep each dentist's slot grid against their merged busy intervals in a single pass"""
+    hours = BusinessHours.opening_hours()
+    grids = {}
+    duration = timedelta(minutes=hours.slot_duration)
+    result = {}
+    for dentist, days in wanted.items():
+        days = sorted(days)
+        for day in days:
+            if day not in grids:
+                grids[day] = slot_grid(day, hours, TORONTO_TZ)
+        candidate_slots = [slot for day in days for slot in grids[day]]
+        slots_by_day = {day: [] for day in days}
+        for slot in free_slots(candidate_slots, busy[dentist.strip().lower()], duration):
+            slots_by_day[slot.date()].append(slot)
+        result[dentist] = slots_by_day
+    return result
+
+def compute_free_slots_by_dentist(
+    service,
+    calendar_id: str,
+    wanted: Dict[str, List[date]]
+) -> Dict[str, Dict[date, List[datetime]]]:
+    """
+    Return the free slots of each wanted day for each dentist
+
+    Busy time for every dentist and day is fetched once, from the opening of
+    the first day to the closing of the last, and each dentist's slot grid is
+    swept against it in a single pass.
+
+    Parameters:
+    - wanted: Business days wanted per dentist
+
+    Returns:
+    - Dict[str, Dict[date, List[datetime]]]: Free slots per dentist, then per day
+    """
+    time_min, time_max = availability_window([day for days in wanted.values() for day in days])
+    busy = busy_intervals_by_dentist(service, calendar_id, time_min, time_max, list(wanted))
+    return free_slots_by_dentist(wanted, busy)
+
+def load_free_slots(wanted: Dict[str, List[date]]) -> Dict[str, Dict[date, List[datetime]]]:
+    """Availability cache loader; also runs in the cache's background refresh threads"""
+    with calendar_service_scope() as service:
+        return compute_free_slots_by_dentist(service, GMAIL_ACCOUNT, wanted)
+
+def find_slot_conflicts(
+    service,
+    calendar_id: str,
+    dentist: str,
+    start: datetime,
+    end: datetime,
+    exclude_id: Optional[str] = None,
+    check_freebusy: bool = True
+) -> List[dict]:
+    """
+    Return what keeps `dentist` busy somewhere in [start, end), read live from Google
+
+    The mirror may lag behind bookings made by other processes, so this always
+    asks the API; the window is a single appointment, so it is one small page.
+    With the FreeBusy backend, busy time on the dentist's own calendar counts
+    too and is returned as bare {'start', 'end'} entries.
+    """
+    conflicts = slot_conflicts_in(stream_events(
+        service,
+        calendar_id,
+        page_size=LOOKUP_PAGE_SIZE,
+        prefetch=False,
+        timeMin=start.isoformat(),
+        timeMax=end.isoformat(),
+        singleEvents=True,
+        orderBy='startTime'
+    ), dentist, start, end, exclude_id)
+
+    key = dentist.strip().lower()
+    if check_freebusy and AVAILABILITY_BACKEND == 'freebusy' and key in DENTIST_CALENDARS:
+        dentist_calendar = DENTIST_CALENDARS[key]
+        for busy_start, busy_end in query_busy(service, [dentist_calendar], start, end)[dentist_calendar]:
+            if busy_start < end and busy_end > start:
+                conflicts.append({
+                    'start': {'dateTime': busy_start.isoformat()},
+                    'end': {'dateTime': busy_end.isoformat()},
+                })
+    return conflicts
+
+def slot_conflicts_in(
+    events,
+    dentist: str,
+    start: datetime,
+    end: datetime,
+    exclude_id: Optional[str] = None
+) -> List[dict]:
+    """Return the events that keep `dentist` busy somewhere in [start, end)"""
+    conflicts = []
+    for event in events:
+        if event.get('id') == exclude_id or event.get('status') == 'cancelled':
+            continue
+        if not dentist_matches(event, dentist):
+            continue
+        bounds = calendar_mirror.event_bounds(event)
+        if bounds is not None and bounds[0] < end and bounds[1] > start:
+            conflicts.append(event)
+    return conflicts
+
+def booked_before(event: dict, other: dict) -> bool:
+    """Order events by creation time, then ID, so racing bookings agree on a single winner"""
+    return (event.get('created', ''), event.get('id', '')) < (other.get('created', ''), other.get('id', ''))
+
+def slot_conflict_response(dentist: str, appointment_dt: datetime, message: str):
+    """The 409 returned by /book when the dentist is not free at the requested time"""
+    get_availability_cache().invalidate(dentist, appointment_dt.astimezone(TORONTO_TZ).date())
+    return {
+        "booking_status": f"error: {message}",
+        "error_code": "SLOT_CONFLICT",
+        "dentist": dentist,
+        "appointment_date": appointment_dt.isoformat()
+    }, 409
+
+def event_days(event: dict) -> List[date]:
+    """Return the Toronto calendar days an event covers"""
+    bounds = calendar_mirror.event_bounds(event)
+    if bounds is None:
+        return []
+    start, end = (moment.astimezone(TORONTO_TZ) for moment in bounds)
+    last = (end - timedelta(microseconds=1)).date() if end > start else start.date()
+    return [start.date() + timedelta(days=offset) for offset in range((last - start.date()).days + 1)]
+
+def invalidate_availability(*events: dict):
+    """
+    Drop cached availability for the dentist and days of events we created, moved or deleted,
+    and what any ongoing Vapi call remembers about their patient and time
+    """
+    cache = get_availability_cache()
+    for event in events:
+        for day in event_days(event):
+            cache.invalidate(event_dentist(event), day)
+        bounds = calendar_mirror.event_bounds(event)
+        if bounds is not None:
+            get_call_contexts().invalidate(patient_identity(event), event_dentist(event), *bounds)
+
+def remember_calendar_event(calendar_id: str, event: dict):
+    """Write an event we inserted or updated through to the local mirror"""
+    if calendar_mirror.MIRROR_ENABLED:
+        calendar_mirror.get_mirror(calendar_id).upsert(event)
+
+def forget_calendar_event(calendar_id: str, event_id: str):
+    """Drop an event we deleted from the local mirror"""
+    if calendar_mirror.MIRROR_ENABLED:
+        calendar_mirror.get_mirror(calendar_id).remove(event_id)
 
 
 def validate_appointment_params(
@@ -202,18 +734,17 @@ def validate_appointment_params(
 
     # Validate appointment date
     try:
-        toronto_tz = gettz('America/Toronto')
-        appointment_dt = parser.parse(appointment_date)
+        appointment_dt = parse_datetime(appointment_date)
         
         # If timezone not specified, assume Toronto time
         if appointment_dt.tzinfo is None:
-            appointment_dt = appointment_dt.replace(tzinfo=toronto_tz)
+            appointment_dt = appointment_dt.replace(tzinfo=TORONTO_TZ)
         else:
             # Convert to Toronto time if in different timezone
-            appointment_dt = appointment_dt.astimezone(toronto_tz)
+            appointment_dt = appointment_dt.astimezone(TORONTO_TZ)
             
         # Check if appointment is in the future
-        now = datetime.now(toronto_tz)
+        now = datetime.now(TORONTO_TZ)
         if appointment_dt <= now:
             return False, "Appointment time must be in the future", None
             
@@ -247,43 +778,561 @@ Dentist: {dentist}
     
     return description.strip()
 
+def create_appointment_properties(
+    patient_name: str,
+    patient_phone: str,
+    service_type: str,
+    dentist: str
+) -> Dict[str, str]:
+    """
+    Create the private extendedProperties stored on the calendar event
+
+    Lookups query these with `privateExtendedProperty`, so Google filters the
+    events instead of us downloading and scanning every description.
+    """
+    return {
+        'patient_name': patient_name,
+        'phone': normalize_phone(patient_phone),
+        'dentist': (dentist or '').strip().lower(),
+        'service': service_type,
+    }
+
+def build_appointment_event(
+    patient_name: str,
+    patient_phone: str,
+    service_type: str,
+    dentist: str,
+    appointment_dt: datetime,
+    end_time: datetime,
+    referral: Optional[str] = None,
+    insurance_name: Optional[str] = None
+) -> dict:
+    """Create the Google Calendar event body of a new appointment"""
+    return {
+        'summary': f"{service_type} - {patient_name}",
+        'location': ALDERSHOT_DENTURE_CLINIC,
+        'description': create_appointment_description(
+            patient_name=patient_name,
+            patient_phone=patient_phone,
+            service_type=service_type,
+            dentist=dentist,
+            referral=referral,
+            insurance_name=insurance_name
+        ),
+        'extendedProperties': {
+            'private': create_appointment_properties(
+                patient_name=patient_name,
+                patient_phone=patient_phone,
+                service_type=service_type,
+                dentist=dentist
+            ),
+        },
+        'start': {
+            'dateTime': appointment_dt.isoformat(),
+            'timeZone': 'America/Toronto',
+        },
+        'end': {
+            'dateTime': end_time.isoformat(),
+            'timeZone': 'America/Toronto',
+        },
+        'reminders': {
+            'useDefault': False,
+            'overrides': [
+                {'method': 'email', 'minutes': 24 * 60},  # 24 hours
+                {'method': 'popup', 'minutes': 60},       # 1 hour
+            ],
+        },
+    }
+
+def rescheduled_times(existing_event: dict, new_appointment_dt: datetime) -> dict:
+    """
+    Return the patch body moving an event to `new_appointment_dt`, keeping its duration
+
+    Only `start` and `end` are sent: events are listed with a `fields`
+    projection, so writing a listed event back whole would clear the
+    attendees, visibility and other fields that were not fetched.
+    """
+    existing = decode_event(existing_event)
+    new_end_dt = new_appointment_dt + (existing.end - existing.start)
+    return {
+        'start': dict(existing_event['start'], dateTime=new_appointment_dt.isoformat()),
+        'end': dict(existing_event['end'], dateTime=new_end_dt.isoformat()),
+    }
+
+def rescheduled_event(existing_event: dict, new_appointment_dt: datetime) -> dict:
+    """Return a copy of an event moved to `new_appointment_dt`, keeping its duration"""
+    updated_event = copy.deepcopy(existing_event)
+    updated_event.update(rescheduled_times(existing_event, new_appointment_dt))
+    return updated_event
+
+def audit_timestamp() -> str:
+    return datetime.now(TORONTO_TZ).strftime("%Y-%m-%d %H:%M:%S %Z")
+
+def book_side_effects(
+    patient_name: str,
+    patient_phone: str,
+    service_type: str,
+    dentist: str,
+    appointment_dt: datetime,
+    referral: Optional[str],
+    insurance_name: Optional[str]
+) -> dict:
+    """The audit row and confirmation SMS of a booking, as keyword arguments of record_side_effects()"""
+    return {
+        'audit_row': ["@Book", 
+                      service_type, 
+                      patient_name, 
+                      patient_phone,
+                      referral, 
+                      dentist, 
+                      insurance_name, 
+                      appointment_dt.isoformat(), 
+                      "", 
+                      audit_timestamp()],
+        'sms_to': patient_phone,
+        'sms_body': (
+            f"Hello {patient_name}, "
+            f"Your {service_type} appointment has been scheduled for "
+            f"{appointment_dt.strftime('%B %d, %Y at %I:%M %p')} "
+            f"with Dr. {dentist}. "
+            "Please arrive 10 minutes early. "
+            "If you need to reschedule, please contact our office."
+        ),
+    }
+
+def cancel_side_effects(patient_name: str, patient_phone: str, existing_event_detail: dict) -> dict:
+    """The audit row and SMS of a cancellation, as keyword arguments of record_side_effects()"""
+    return {
+        'audit_row': ["@Cancel", 
+                      existing_event_detail['service_type'] if 'service_type' in existing_event_detail else "", 
+                      patient_name, 
+                      patient_phone, 
+                      "", 
+                      "", 
+                      "", 
+                      "",
+                      existing_event_detail['start_time'] if 'start_time' in existing_event_detail else "", 
+                      audit_timestamp()],
+        'sms_to': patient_phone,
+        'sms_body': (
+            f"Hello {patient_name}, "
+            "Your appointment has been cancelled successfully."
+            f"Service: {existing_event_detail['service_type'] if 'service_type' in existing_event_detail else ''}"
+            f"BookTime: {existing_event_detail['start_time'] if 'start_time' in existing_event_detail else ''}."
+        ),
+    }
+
+def reschedule_side_effects(
+    patient_name: str,
+    patient_phone: str,
+    existing_event_detail: dict,
+    new_appointment_dt: datetime
+) -> dict:
+    """The audit row and SMS of a reschedule, as keyword arguments of record_side_effects()"""
+    return {
+        'audit_row': ["@Reschedule", 
+                      existing_event_detail['service_type'] if 'service_type' in existing_event_detail else "", 
+                      patient_name, 
+                      patient_phone, 
+                      "", 
+                      "", 
+                      "", 
+                      new_appointment_dt.isoformat(), 
+                      existing_event_detail['start_time'] if 'start_time' in existing_event_detail else "", 
+                      audit_timestamp()],
+        'sms_to': patient_phone,
+        'sms_body': (
+            f"Hello {patient_name}, "
+            f"Your appointment has been rescheduled to {new_appointment_dt.strftime('%B %d, %Y at %I:%M %p')} "
+            "Toronto time. "
+            f"From: {existing_event_detail['start_time'] if 'start_time' in existing_event_detail else ''}"
+        ),
+    }
+
+def backfill_appointment_properties(service, calendar_id: str) -> int:
+    """
+    Write extendedProperties onto upcoming events booked before /book stored them
+
+    Returns:
+    - int: Number of events patched
+    """
+    patched = 0
+    legacy_events = [
+        event for event in stream_events(
+            service,
+            calendar_id,
+            timeMin=datetime.now(timezone.utc).isoformat(),
+            singleEvents=True
+        )
+        if not private_properties(event).get('phone')
+    ]
+    for event in legacy_events:
+        fields = parse_description_fields(event.get('description', ''))
+        patient_phone = fields.get('phone')
+        if not patient_phone:
+            continue
+        properties = create_appointment_properties(
+            patient_name=fields.get('patient') or fields.get('patient name') or '',
+            patient_phone=patient_phone,
+            service_type=fields.get('service', ''),
+            dentist=fields.get('dentist', '')
+        )
+        with span("calendar", "events.patch"):
+            updated = service.events().patch(
+                calendarId=calendar_id,
+                eventId=event['id'],
+                body={'extendedProperties': {'private': properties}}
+            ).execute()
+        remember_calendar_event(calendar_id, updated)
+        patched += 1
+    return patched
+
+@asbp.cli.command("backfill-properties")
+def backfill_properties_command():
+    """Store patient and dentist extendedProperties on older upcoming events"""
+    pool = google_services.registry.calendar_pool(SERVICE_ACCOUNT_FILE, SCOPES)
+    with pool.checkout() as service:
+        patched = backfill_appointment_properties(service, GMAIL_ACCOUNT)
+    print(f"Patched {patched} events")
+    if not PATIENT_PROPERTIES_BACKFILLED:
+        print("Set PATIENT_PROPERTIES_BACKFILLED=true so patient lookups no longer fall back to a full scan")
+
+def parse_bulk_range(data: dict) -> Tuple[date, date]:
+    """
+    Read the 'start_date' and optional 'end_date' (YYYY-MM-DD, inclusive) of a bulk request
+
+    Raises ValueError when they are missing, malformed, reversed or span more than BULK_MAX_DAYS days.
+    """
+    if not data.get('start_date'):
+        raise ValueError("start_date is not indicated")
+    first_day = date.fromisoformat(str(data['start_date']))
+    last_day = date.fromisoformat(str(data['end_date'])) if data.get('end_date') else first_day
+    if last_day < first_day:
+        raise ValueError("end_date is before start_date")
+    if (last_day - first_day).days >= BULK_MAX_DAYS:
+        raise ValueError(f"at most {BULK_MAX_DAYS} days can be changed at once")
+    return first_day, last_day
+
+def select_dentist_appointments(
+    service,
+    calendar_id: str,
+    dentist: str,
+    first_day: date,
+    last_day: date
+) -> List[dict]:
+    """Return the dentist's appointments starting between `first_day` and `last_day` inclusive"""
+    time_min = datetime.combine(first_day, datetime.min.time(), tzinfo=TORONTO_TZ)
+    time_max = datetime.combine(last_day + timedelta(days=1), datetime.min.time(), tzinfo=TORONTO_TZ)
+    appointments = []
+    for event in list_events_between(service, calendar_id, time_min, time_max, dentist=dentist):
+        start = decode_event(event).start
+        if event.get('status') == 'cancelled' or start is None or not time_min <= start < time_max:
+            continue
+        if dentist_matches(event, dentist):
+            appointments.append(event)
+    return appointments
+
+def shift_appointments(events: List[dict], shift_days: int) -> Tuple[Dict[str, dict], Dict[str, str]]:
+    """
+    Work out where each event lands when moved by `shift_days` days
+
+    The move keeps the Toronto wall-clock time; targets off business days are refused.
+
+    Returns:
+    - Tuple[Dict[str, dict], Dict[str, str]]: Moved event bodies, and refusal reasons, by event ID
+    """
+    moves, refused = {}, {}
+    for event in events:
+        new_start = decode_event(event).start.astimezone(TORONTO_TZ) + timedelta(days=shift_days)
+        if not is_business_day(new_start):
+            refused[event['id']] = f"{new_start.strftime('%A, %B %d, %Y')} is not a business day"
+            continue
+        moves[event['id']] = rescheduled_event(event, new_start)
+    return moves, refused
+
+def move_conflicts(
+    service,
+    calendar_id: str,
+    dentist: str,
+    moves: Dict[str, dict],
+    moving_ids: Set[str]
+) -> Dict[str, List[dict]]:
+    """Return, per moved event, the dentist's other events overlapping its target, read with one listing"""
+    if not moves:
+        return {}
+    targets = [decode_event(moved).bounds for moved in moves.values()]
+    staying = [
+        event for event in list_events_between(
+            service, calendar_id, min(start for start, _ in targets), max(end for _, end in targets), dentist=dentist)
+        if event.get('id') not in moving_ids
+    ]
+    return {
+        event_id: slot_conflicts_in(staying, dentist, *decode_event(moved).bounds)
+        for event_id, moved in moves.items()
+    }
+
+def move_appointments(
+    service,
+    calendar_id: str,
+    dentist: str,
+    events: List[dict],
+    shift_days: int,
+    dry_run: bool = False
+) -> Tuple[Dict[str, dict], Dict[str, str], Dict[str, CallResult]]:
+    """
+    Move events by `shift_days` days, holding the target slots like book() does
+
+    The dentist's slot locks on every target are held from the availability
+    check through the batch patch to the rival check. A target taken by
+    another of the dentist's appointments is refused; one booked meanwhile by
+    another process, by an event created earlier, is moved back and refused.
+
+    Returns:
+    - Tuple: Moved event bodies, refusal reasons, and the patch results
+      ((response, None) or (None, error); none with `dry_run`), by event ID
+    """
+    moves, refused = shift_appointments(events, shift_days)
+    if not moves:
+        return moves, refused, {}
+
+    moving_ids = {event['id'] for event in events}
+    targets = [decode_event(moved).bounds for moved in moves.values()]
+    try:
+        with get_slot_locks(BusinessHours.SLOT_GRANULARITY).reserve_many(dentist, targets):
+            for event_id, conflicts in move_conflicts(service, calendar_id, dentist, moves, moving_ids).items():
+                if conflicts:
+                    refused[event_id] = f"Dr. {dentist} is not available at {decode_event(moves.pop(event_id)).start.isoformat()}"
+            if dry_run or not moves:
+                return moves, refused, {}
+
+            results = patch_events(service, calendar_id, {
+                event_id: {'start': moved['start'], 'end': moved['end']} for event_id, moved in moves.items()
+            })
+
+            # Another process may have booked a target meanwhile; the earlier booking wins
+            patched = {event_id: response for event_id, (response, error) in results.items() if error is None}
+            lost = [
+                event_id for event_id, rivals in move_conflicts(service, calendar_id, dentist, patched, moving_ids).items()
+                if any(booked_before(rival, patched[event_id]) for rival in rivals)
+            ]
+            if lost:
+                originals = {event['id']: event for event in events}
+                reverted = patch_events(service, calendar_id, {
+                    event_id: {'start': originals[event_id]['start'], 'end': originals[event_id]['end']}
+                    for event_id in lost
+                })
+                for event_id in lost:
+                    if reverted[event_id][1] is not None:
+                        log("bulk_cancel", f"Failed to move {event_id} back: {str(reverted[event_id][1])}", level="warning")
+                    refused[event_id] = f"Dr. {dentist} was just booked at {decode_event(moves.pop(event_id)).start.isoformat()}"
+                    del results[event_id]
+            return moves, refused, results
+    except SlotLockTimeout as e:
+        for event_id in moves:
+            refused[event_id] = str(e)
+        return {}, refused, {}
+
+def bulk_cancel_appointments(
+    service,
+    calendar_id: str,
+    dentist: str,
+    first_day: date,
+    last_day: date,
+    shift_days: int = 0,
+    notify: bool = True,
+    dry_run: bool = False
+) -> List[dict]:
+    """
+    Cancel, or move by `shift_days` days, all of a dentist's appointments in a date range
+
+    Calendar deletes/patches go out as batch requests (bulk_ops), moves hold
+    the slot locks of their targets (move_appointments), the audit rows of
+    every change are written with one Sheets call, and the patient SMS are
+    queued in the outbox, so this returns without waiting for Twilio.
+
+    Returns:
+    - List[dict]: One outcome per appointment, in start time order; 'status' is
+      cancelled, moved or failed (would_cancel / would_move with `dry_run`),
+      and 'sms' is queued or skipped for the changed ones
+    """
+    events = select_dentist_appointments(service, calendar_id, dentist, first_day, last_day)
+    outcomes = {}
+    for event in events:
+        appointment = decode_event(event)
+        outcomes[event['id']] = {
+            "event_id": event['id'],
+            "patient_name": appointment.patient_name,
+            "start_time": appointment.format_start(),
+        }
+
+    refused = {}
+    if shift_days:
+        moves, refused, results = move_appointments(service, calendar_id, dentist, events, shift_days, dry_run=dry_run)
+        for event_id, reason in refused.items():
+            outcomes[event_id].update(status="failed", error=reason)
+        for event_id, moved in moves.items():
+            outcomes[event_id]["new_start_time"] = decode_event(moved).format_start()
+    if dry_run:
+        for event_id, outcome in outcomes.items():
+            outcome.setdefault("status", "would_move" if shift_days else "would_cancel")
+        return list(outcomes.values())
+
+    if not shift_days:
+        results = delete_events(service, calendar_id, list(outcomes))
+
+    audit_rows = []
+    sms_payloads = {}
+    for event in events:
+        if event['id'] in refused:
+            continue
+        outcome = outcomes[event['id']]
+        response, error = results[event['id']]
+        if error is not None:
+            outcome.update(status="failed", error=str(error))
+            continue
+
+        appointment = decode_event(event)
+        details = appointment.details()
+        if shift_days:
+            remember_calendar_event(calendar_id, response)
+            invalidate_availability(event, response)
+            side_effects = reschedule_side_effects(
+                appointment.patient_name, appointment.patient_phone, details,
+                decode_event(response).start.astimezone(TORONTO_TZ))
+            outcome["status"] = "moved"
+        else:
+            forget_calendar_event(calendar_id, event['id'])
+            invalidate_availability(event)
+            side_effects = cancel_side_effects(appointment.patient_name, appointment.patient_phone, details)
+            outcome["status"] = "cancelled"
+
+        audit_rows.append(side_effects['audit_row'])
+        if notify and appointment.patient_phone:
+            sms_payloads[event['id']] = {'to': side_effects['sms_to'], 'body': side_effects['sms_body']}
+
+    if audit_rows:
+        try:
+            get_audit_writer().write_rows(audit_rows)
+        except Exception as e:
+            log("bulk_cancel", f"audit write failed, queueing {len(audit_rows)} rows: {str(e)}", level="warning")
+            get_side_effect_outbox().enqueue([("audit_row", {'row': row}) for row in audit_rows])
+
+    if sms_payloads:
+        try:
+            get_side_effect_outbox().enqueue([("sms", payload) for payload in sms_payloads.values()])
+        except Exception as e:
+            log("bulk_cancel", f"Failed to queue {len(sms_payloads)} SMS, sending them in the background: {str(e)}",
+                level="warning")
+            for payload in sms_payloads.values():
+                dispatch_sms(payload['to'], payload['body'])
+    for event_id, outcome in outcomes.items():
+        if outcome.get("status") in ("cancelled", "moved"):
+            outcome["sms"] = "queued" if event_id in sms_payloads else "skipped"
+    return list(outcomes.values())
+
+def bulk_summary(outcomes: List[dict]) -> Dict[str, int]:
+    summary = defaultdict(int)
+    for outcome in outcomes:
+        summary[outcome["status"]] += 1
+    return dict(summary)
+
+@asbp.cli.command("bulk-cancel")
+@click.argument("dentist")
+@click.argument("start_date")
+@click.argument("end_date", required=False)
+@click.option("--shift-days", type=int, default=0, help="Move the appointments this many days instead of cancelling them")
+@click.option("--no-notify", is_flag=True, help="Do not text the patients")
+@click.option("--dry-run", is_flag=True, help="Only list the appointments that would change")
+def bulk_cancel_command(dentist: str, start_date: str, end_date: Optional[str], shift_days: int, no_notify: bool, dry_run: bool):
+    """Cancel or move all of a dentist's appointments from START_DATE to END_DATE (YYYY-MM-DD)"""
+    first_day, last_day = parse_bulk_range({'start_date': start_date, 'end_date': end_date})
+    pool = google_services.registry.calendar_pool(SERVICE_ACCOUNT_FILE, SCOPES)
+    with pool.checkout() as service:
+        outcomes = bulk_cancel_appointments(
+            service, GMAIL_ACCOUNT, dentist, first_day, last_day,
+            shift_days=shift_days, notify=not no_notify, dry_run=dry_run)
+    for outcome in outcomes:
+        print(json.dumps(outcome))
+    print(json.dumps(bulk_summary(outcomes)))
+
 def is_business_day(date: datetime) -> bool:
     """Check if the given date is a business day (Monday-Friday)"""
     return date.weekday() < 5  # Monday = 0, Friday = 4
 
 def get_next_three_business_days(start_date: datetime) -> List[datetime]:
     """Get the next three business days from the given start date"""
+    return get_next_business_days(start_date, 3)
+
+def get_next_business_days(start_date: datetime, count: int) -> List[datetime]:
+    """Get the next `count` business days from the given start date"""
     business_days = []
     current_date = start_date
     
-    while len(business_days) < 3:
+    while len(business_days) < count:
         if is_business_day(current_date):
             business_days.append(current_date)
         current_date += timedelta(days=1)
     
     return business_days
 
+def parse_request_date(data: dict, key: str) -> date:
+    """Read a YYYY-MM-DD (or ISO date-time) field of a request body, raising ValueError when it is not one"""
+    try:
+        return datetime.fromisoformat(str(data[key])).date()
+    except ValueError:
+        raise ValueError(f"{key} must be a date in YYYY-MM-DD format, got {data[key]!r}") from None
+
+def invalid_window_response(error: ValueError):
+    """The 400 returned by the availability endpoints for a malformed start_date / end_date"""
+    return {
+        "status": "error",
+        "message": f"Invalid date range: {str(error)}"
+    }, 400
+
+def requested_business_days(data: dict, now: datetime) -> List[date]:
+    """
+    Return the business days an availability request asks for
+
+    The window starts at 'start_date' (YYYY-MM-DD, default today) and covers
+    'days' business days (default BusinessHours.AVAILABILITY_DAYS), or runs
+    to 'end_date' inclusive; never more than MAX_AVAILABILITY_DAYS days.
+
+    Raises ValueError when 'start_date' or 'end_date' is not a date.
+    """
+    start = now
+    if data.get('start_date'):
+        start = max(now, datetime.combine(
+            parse_request_date(data, 'start_date'), datetime.min.time(), tzinfo=TORONTO_TZ))
+
+    if data.get('end_date'):
+        end = parse_request_date(data, 'end_date')
+        days = [day.date() for day in get_next_business_days(start, BusinessHours.MAX_AVAILABILITY_DAYS)]
+        return [day for day in days if day <= end] or days[:1]
+
+    try:
+        day_count = int(data.get('days') or BusinessHours.AVAILABILITY_DAYS)
+    except (TypeError, ValueError):
+        day_count = BusinessHours.AVAILABILITY_DAYS
+    day_count = max(1, min(day_count, BusinessHours.MAX_AVAILABILITY_DAYS))
+    return [day.date() for day in get_next_business_days(start, day_count)]
+
+def format_available_slots(slots_by_day: Dict[date, List[datetime]], now: datetime) -> Dict[str, List[str]]:
+    """Format free slots still in the future as {"Monday, March 03, 2025": ["09:00 AM", ...]}, skipping empty days"""
+    details = {}
+    for day in sorted(slots_by_day):
+        times = [slot.strftime("%I:%M %p") for slot in slots_by_day[day] if slot > now]
+        if times:
+            details[day.strftime("%A, %B %d, %Y")] = times
+    return details
+
 def get_time_slots(date: datetime) -> List[datetime]:
-    """Generate all possible time slots for a given day"""
-    slots = []
-    current_time = date.replace(
-        hour=BusinessHours.OPEN_HOUR,
-        minute=0,
-        second=0,
-        microsecond=0
-    )
-    
-    while current_time.hour < BusinessHours.CLOSE_HOUR:
-        # Skip lunch hour
-        if current_time.hour != BusinessHours.LUNCH_START:
-            slots.append(current_time)
-        # If we're at lunch start, jump to lunch end
-        if current_time.hour == BusinessHours.LUNCH_START:
-            current_time = current_time.replace(hour=BusinessHours.LUNCH_END)
-        else:
-            current_time += timedelta(minutes=BusinessHours.SLOT_DURATION)
-    
-    return slots
+    """
+    Generate all possible time slots for a given day
+
+    Slots start every BusinessHours.SLOT_GRANULARITY minutes and must fit
+    entirely before lunch or between lunch and closing.
+    """
+    return slot_grid(date.date(), BusinessHours.opening_hours(), TORONTO_TZ)
 
 def format_time_slots(available_slots: Dict[str, List[datetime]]) -> str:
     """
@@ -304,28 +1353,30 @@ def format_time_slots(available_slots: Dict[str, List[datetime]]) -> str:
             min_time = min(slots)
             max_time = max(slots) + timedelta(minutes=BusinessHours.SLOT_DURATION)  # Add duration to get end time
             
-            # Format start and end times
+            # Format start and end times; slots start on SLOT_GRANULARITY boundaries, so keep the minutes
             start_hour = min_time.hour
             end_hour = max_time.hour
+            start_minutes = f"{min_time.minute:02d}"
+            end_minutes = f"{max_time.minute:02d}"
             
             # Format start time
             if start_hour < 12:
-                start_formatted = f"{start_hour}:00 am"
+                start_formatted = f"{start_hour}:{start_minutes} am"
             elif start_hour == 12:
-                start_formatted = "12:00 pm"
+                start_formatted = f"12:{start_minutes} pm"
             else:
-                start_formatted = f"{start_hour - 12}:00 pm"
+                start_formatted = f"{start_hour - 12}:{start_minutes} pm"
                 
             # Format end time
             # For end times, decide whether to use 12-hour or 24-hour format
             if end_hour < 12:
-                end_formatted = f"{end_hour}:00 am"
+                end_formatted = f"{end_hour}:{end_minutes} am"
             elif end_hour == 12:
-                end_formatted = "12:00 pm"
+                end_formatted = f"12:{end_minutes} pm"
             elif end_hour <= 17:  # Up to 5 PM, use 12-hour format
-                end_formatted = f"{end_hour - 12}:00 pm"
+                end_formatted = f"{end_hour - 12}:{end_minutes} pm"
             else:  # After 5 PM, use 24-hour format
-                end_formatted = f"{end_hour}:00 pm"
+                end_formatted = f"{end_hour}:{end_minutes} pm"
             
             # Remove leading zeros
             start_formatted = start_formatted.replace(" 0", " ")
@@ -368,111 +1419,17 @@ def extract_event_details(event: dict) -> dict:
     Returns:
     - Dictionary containing parsed event details
     """
-    try:
-        # Parse the description field to extract patient information
-        description = event.get('description', '')
-        description_lines = description.split('\n')
-        
-        # Initialize details dictionary with default values
-        details = {
-            'event_id': event.get('id'),
-            'summary': event.get('summary', ''),
-            'patient_name': '',
-            'patient_phone': '',
-            'service_type': '',
-            'dentist': '',
-            'referral': '',
-            'insurance_name': '',
-            'location': event.get('location', ''),
-            'start_time': '',
-            'end_time': '',
-            'created_at': event.get('created', ''),
-            'last_updated': event.get('updated', ''),
-            'status': event.get('status', ''),
-            'creator': event.get('creator', {}).get('email', ''),
-            'organizer': event.get('organizer', {}).get('email', ''),
-        }
-
-        # Parse description lines to extract information
-        for line in description_lines:
-            line = line.strip()
-            if ':' in line:
-                key, value = line.split(':', 1)
-                key = key.strip().lower()
-                value = value.strip()
-                
-                if 'Patient' in key:
-                    details['patient_name'] = value
-                elif 'Phone' in key:
-                    details['patient_phone'] = value
-                elif 'Service' in key:
-                    details['service_type'] = value
-                elif 'Dentist' in key:
-                    details['dentist'] = value
-                elif 'Referral' in key:
-                    details['referral'] = value
-                elif 'Insurance' in key:
-                    details['insurance_name'] = value
-
-        # Parse and format time information
-        if 'start' in event:
-            start_dt = parser.parse(event['start'].get('dateTime', event['start'].get('date')))
-            details['start_time'] = start_dt.astimezone(pytz.timezone('America/Toronto')).strftime('%Y-%m-%d %I:%M %p %Z')
-
-        if 'end' in event:
-            end_dt = parser.parse(event['end'].get('dateTime', event['end'].get('date')))
-            details['end_time'] = end_dt.astimezone(pytz.timezone('America/Toronto')).strftime('%Y-%m-%d %I:%M %p %Z')
-
-        # Calculate appointment duration
-        if 'start' in event and 'end' in event:
-            start_dt = parser.parse(event['start'].get('dateTime', event['start'].get('date')))
-            end_dt = parser.parse(event['end'].get('dateTime', event['end'].get('date')))
-            duration = end_dt - start_dt
-            details['duration_minutes'] = int(duration.total_seconds() / 60)
-
-        # Get conference details if any
-        if 'conferenceData' in event:
-            conf_data = event['conferenceData']
-            details['conference_link'] = conf_data.get('entryPoints', [{}])[0].get('uri', '')
-            details['conference_type'] = conf_data.get('conferenceSolution', {}).get('name', '')
-
-        # Get attachment information if any
-        if 'attachments' in event:
-            details['attachments'] = [
-                {
-                    'title': attachment.get('title', ''),
-                    'file_url': attachment.get('fileUrl', '')
-                }
-                for attachment in event['attachments']
-            ]
-
-        # Get reminder settings
-        if 'reminders' in event:
-            details['reminders'] = event['reminders'].get('overrides', [])
-
-        # Get recurrence information if any
-        if 'recurrence' in event:
-            details['recurrence_rule'] = event['recurrence']
-
-        # Get color information
-        if 'colorId' in event:
-            details['color_id'] = event['colorId']
-
-        return details
-
-    except Exception as e:
-        # Log parsing error but return what we have
-        print(f"Error parsing event details: {str(e)}")
-        return details
+    return decode_event(event).details()
 
 @asbp.route("/cancel", methods=['POST'])
+@idempotent
 def cancel():
     try:
         data = request.get_json()
         patient_name = data.get('patient_name')
         patient_phone = data.get('patient_phone')
 
-        print(f"@cancel: patient name: {patient_name}, number: {patient_phone}")
+        log("cancel", f"patient name: {patient_name}, number: {patient_phone}")
         
         if not patient_name or not patient_phone:
             return {
@@ -485,39 +1442,24 @@ def cancel():
         # Get the calendar ID (use 'primary' for primary calendar)
         calendar_id = GMAIL_ACCOUNT  # or your specific calendar ID
         
-        # Get current time in ISO format
-        now = datetime.now(timezone.utc).isoformat()
-        
         # 1. Create Google Calendar Event
         # 
         existing_event_detail = {}
         try:
-            # Get all events from now
-            events_result = service.events().list(
-                calendarId=calendar_id,
-                timeMin=now,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            events = events_result.get('items', [])
-            
-            matching_event = None
-            
-            # Search through events to find matching patient
-            for event in events:
-                description = event.get('description', '').lower()
-                if (patient_name.lower() in description and 
-                    patient_phone in description):
-                    matching_event = event
-                    break
+            # Find the patient's next appointment
+            patient_events = find_patient_events(service, calendar_id, patient_name, patient_phone, limit=1)
+            matching_event = patient_events[0] if patient_events else None
             
             if matching_event:
                 existing_event_detail = extract_event_details(matching_event)
                 # Cancel the event
-                service.events().delete(
-                    calendarId=calendar_id,
-                    eventId=matching_event['id']
-                ).execute()
+                with span("calendar", "events.delete"):
+                    service.events().delete(
+                        calendarId=calendar_id,
+                        eventId=matching_event['id']
+                    ).execute()
+                forget_calendar_event(calendar_id, matching_event['id'])
+                invalidate_availability(matching_event)
                 
             else:
                 return {
@@ -529,51 +1471,19 @@ def cancel():
                 "cancel_appointment_statusmessage": f"error: Error accessing calendar: {str(calendar_error)}"
             }, 500
 
-        print(f"@cancel: delete calendar event")
+        log("cancel", "delete calendar event")
 
-        # 2. Update the Google Spreedsheet in Clinic's gmail account
+        # 2. Record the audit row and the cancellation SMS; both are delivered in the background
         # 
-        now_toronto = datetime.now(ZoneInfo("America/Toronto"))
-        current_datetime = now_toronto.strftime("%Y-%m-%d %H:%M:%S %Z")
-
-        try:
-            spread_client = get_sheet_service()
-            spreadsheet = spread_client.open(SPREAD_SHEET)
-            sheet = spreadsheet.sheet1 
-            sheet.append_row(["@Cancel", 
-                              existing_event_detail['service_type'] if 'service_type' in existing_event_detail else "", 
-                              patient_name, 
-                              patient_phone, 
-                              "", 
-                              "", 
-                              "", 
-                              "",
-                              existing_event_detail['start_time'] if 'start_time' in existing_event_detail else "", 
-                              current_datetime])
-    
-            pass
-        except Exception as e:
-            print(f"Failed to open spreadsheet: {str(e)}")
-            pass
-
-
-        # Send cancellation confirmation SMS
-        sms_result = send_sms_notification(
-            to_number=patient_phone,
-            message_body=(
-                f"Hello {patient_name}, "
-                "Your appointment has been cancelled successfully."
-                f"Service: {existing_event_detail['service_type'] if 'service_type' in existing_event_detail else ''}"
-                f"BookTime: {existing_event_detail['start_time'] if 'start_time' in existing_event_detail else ''}."
-            )
-        )
+        record_side_effects(**cancel_side_effects(patient_name, patient_phone, existing_event_detail))
 
-        print(f"@cancel: SMS sent, {str(sms_result)}")
+        log("cancel", "audit row and SMS queued")
         return {"cancel_appointment_statusmessage": "success"}
     except Exception as e:
         return {"cancel_appointment_statusmessage": f"error : {str(e)}"}
 
 @asbp.route("/reschedule", methods=['POST'])
+@idempotent
 def reschedule():
     try:
         # Get and validate required parameters
@@ -582,7 +1492,7 @@ def reschedule():
         patient_phone = data.get('patient_phone')
         appointment_date = data.get('appointment_date')
         
-        print(f"@reschedule: patient name: {patient_name}, number: {patient_phone}, appointment date: {appointment_date}")
+        log("reschedule", f"patient name: {patient_name}, number: {patient_phone}, appointment date: {appointment_date}")
 
         if not all([patient_name, patient_phone, appointment_date]):
             return {
@@ -600,98 +1510,44 @@ def reschedule():
         service = get_calendar_service()
         calendar_id = GMAIL_ACCOUNT  # or your specific calendar ID
         
-        # Get current time in ISO format
-        now = datetime.now(timezone.utc).isoformat()
-        
         existing_event_detail = {}
         try:
             # Find existing appointment
-            events_result = service.events().list(
-                calendarId=calendar_id,
-                timeMin=now,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            
-            existing_event = None
-            for event in events_result.get('items', []):
-                description = event.get('description', '').lower()
-                if (patient_name.lower() in description and 
-                    patient_phone in description):
-                    existing_event = event
-                    break
+            patient_events = find_patient_events(service, calendar_id, patient_name, patient_phone, limit=1)
+            existing_event = patient_events[0] if patient_events else None
             
             if not existing_event:
                 return {
                     "rescheduling_appointment_status": f"error: No active appointment found for {patient_name} with phone {patient_phone}"
                 }, 404
 
-            print(f"@reschedule: found previous record")
+            log("reschedule", "found previous record")
 
             existing_event_detail = extract_event_details(existing_event)
 
-            # Calculate new event end time (assume same duration as original appointment)
-            original_start = parser.parse(existing_event['start']['dateTime'])
-            original_end = parser.parse(existing_event['end']['dateTime'])
-            duration = original_end - original_start
-            new_end_dt = new_appointment_dt + duration
-            
-            # Create new event object with updated times
-            updated_event = existing_event.copy()
-            updated_event['start']['dateTime'] = new_appointment_dt.isoformat()
-            updated_event['end']['dateTime'] = new_end_dt.isoformat()
-            
-            # Update the event
-            updated_event = service.events().update(
-                calendarId=calendar_id,
-                eventId=existing_event['id'],
-                body=updated_event
-            ).execute()
+            # Move the event, keeping the duration of the original appointment
+            with span("calendar", "events.patch"):
+                updated_event = service.events().patch(
+                    calendarId=calendar_id,
+                    eventId=existing_event['id'],
+                    body=rescheduled_times(existing_event, new_appointment_dt)
+                ).execute()
+            remember_calendar_event(calendar_id, updated_event)
+            invalidate_availability(existing_event, updated_event)
             
         except Exception as calendar_error:
             return {
                 "rescheduling_appointment_status": f"error: couldn't reschedule calendar - {str(calendar_error)}",
             }, 400
 
-        print(f"@reschedule: update existing calendar event")
+        log("reschedule", "update existing calendar event")
 
-        # 2. Update the Google Spreedsheet in Clinic's gmail account
+        # 2. Record the audit row and the rescheduling SMS; both are delivered in the background
         # 
-        now_toronto = datetime.now(ZoneInfo("America/Toronto"))
-        current_datetime = now_toronto.strftime("%Y-%m-%d %H:%M:%S %Z")
+        record_side_effects(**reschedule_side_effects(
+            patient_name, patient_phone, existing_event_detail, new_appointment_dt))
 
-        try:
-            spread_client = get_sheet_service()
-            spreadsheet = spread_client.open(SPREAD_SHEET)
-            sheet = spreadsheet.sheet1 
-            sheet.append_row(["@Reschedule", 
-                              existing_event_detail['service_type'] if 'service_type' in existing_event_detail else "", 
-                              patient_name, 
-                              patient_phone, 
-                              "", 
-                              "", 
-                              "", 
-                              new_appointment_dt.isoformat(), 
-                              existing_event_detail['start_time'] if 'start_time' in existing_event_detail else "", 
-                              current_datetime])
-    
-            pass
-        except Exception as e:
-            print(f"Failed to open spreadsheet: {str(e)}")
-            pass
-
-        # Send SMS notification
-        sms_result = send_sms_notification(
-            to_number=patient_phone,
-            message_body=(
-                f"Hello {patient_name}, "
-                f"Your appointment has been rescheduled to {new_appointment_dt.strftime('%B %d, %Y at %I:%M %p')} "
-                "Toronto time. "
-                f"From: {existing_event_detail['start_time'] if 'start_time' in existing_event_detail else ''}"
-            )
-        )
-
-        print(f"@reschedule: SMS sent")
+        log("reschedule", "audit row and SMS queued")
 
     except Exception as e:
         return {"rescheduling_appointment_status": f"error: {str(e)}"}
@@ -706,7 +1562,7 @@ def find_existing():
         patient_name = data.get('patient_name')
         patient_phone = data.get('patient_phone')
         
-        print(f"@reschedule: patient name: {patient_name}, number: {patient_phone}")
+        log("find_existing", f"patient name: {patient_name}, number: {patient_phone}")
         if not patient_name or not patient_phone:
             return {"existing_appointment_status": f"error: patient_name or patient_phone is not indicated"}
 
@@ -714,41 +1570,27 @@ def find_existing():
         service = get_calendar_service()
         calendar_id = GMAIL_ACCOUNT  # or your specific calendar ID
         
-        # Get current time in ISO format
-        now = datetime.now(timezone.utc).isoformat()
-        
         try:
-            # Search for upcoming events
-            events_result = service.events().list(
-                calendarId=calendar_id,
-                timeMin=now,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            
             matching_appointments = []
             
-            # Search through events to find matching patient
-            for event in events_result.get('items', []):
-                description = event.get('description', '').lower()
-                if (patient_name.lower() in description and 
-                    patient_phone in description):
-                    
-                    # Format appointment details
-                    appointment_details = {
-                        "summary": event.get('summary'),
-                        "start_time": format_appointment_time(event['start']['dateTime']),
-                        "end_time": format_appointment_time(event['end']['dateTime']),
-                        "location": event.get('location', 'No location specified'),
-                        "event_id": event['id'],
-                        "raw_start": event['start']['dateTime'],  # Keep ISO format for sorting
-                    }
-                    matching_appointments.append(appointment_details)
+            # Look up the patient's upcoming appointments
+            for event in find_patient_events(service, calendar_id, patient_name, patient_phone):
+                # Format appointment details
+                appointment = decode_event(event)
+                appointment_details = {
+                    "summary": event.get('summary'),
+                    "start_time": appointment.format_start(),
+                    "end_time": appointment.format_end(),
+                    "location": appointment.location or 'No location specified',
+                    "event_id": appointment.event_id,
+                    "start": appointment.start,  # Keep the datetime for sorting
+                }
+                matching_appointments.append(appointment_details)
             
             if matching_appointments:
                 # Sort appointments by start time
-                matching_appointments.sort(key=lambda x: x['raw_start'])
-                print(f"@reschedule: found matched appointments")              
+                matching_appointments.sort(key=lambda x: x['start'])
+                log("find_existing", "found matched appointments")
                 
             else:
                 return {"existing_appointment_status": "False"}
@@ -762,6 +1604,7 @@ def find_existing():
     return {"existing_appointment_status": "True"}
 
 @asbp.route("/book", methods=['POST'])
+@idempotent
 def book():
     try:
         # Get request data
@@ -795,88 +1638,56 @@ def book():
         calendar_id = GMAIL_ACCOUNT  # or your specific calendar ID
 
         # Calculate event end time (default to 1 hour unless specified by service type)
-        duration_minutes = SERVICE_TIME
-        end_time = appointment_dt + timedelta(minutes=duration_minutes)
+        end_time = appointment_dt + timedelta(minutes=SERVICE_TIME)
 
-        # Create event description
-        description = create_appointment_description(
+        # Create calendar event
+        event = build_appointment_event(
             patient_name=patient_name,
             patient_phone=patient_phone,
             service_type=service_type,
             dentist=dentist,
+            appointment_dt=appointment_dt,
+            end_time=end_time,
             referral=referral,
             insurance_name=insurance_name
         )
 
-        # Create calendar event
-        event = {
-            'summary': f"{service_type} - {patient_name}",
-            'location': ALDERSHOT_DENTURE_CLINIC,
-            'description': description,
-            'start': {
-                'dateTime': appointment_dt.isoformat(),
-                'timeZone': 'America/Toronto',
-            },
-            'end': {
-                'dateTime': end_time.isoformat(),
-                'timeZone': 'America/Toronto',
-            },
-            'reminders': {
-                'useDefault': False,
-                'overrides': [
-                    {'method': 'email', 'minutes': 24 * 60},  # 24 hours
-                    {'method': 'popup', 'minutes': 60},       # 1 hour
-                ],
-            },
-        }
-
         try:
-            event = service.events().insert(
-                calendarId=calendar_id,
-                body=event
-            ).execute()
-
-            # 2. Update the Google Spreedsheet in Clinic's gmail account
+            # Hold this dentist's slot while checking it is free and inserting, so two calls
+            # offered the same time cannot both book it; other slots are not blocked
+            with get_slot_locks(BusinessHours.SLOT_GRANULARITY).reserve(dentist, appointment_dt, end_time):
+                if find_slot_conflicts(service, calendar_id, dentist, appointment_dt, end_time):
+                    return slot_conflict_response(
+                        dentist, appointment_dt, f"Dr. {dentist} is not available at {appointment_dt.isoformat()}")
+
+                with span("calendar", "events.insert"):
+                    event = service.events().insert(
+                        calendarId=calendar_id,
+                        body=event
+                    ).execute()
+
+                # Another process may have booked the same slot meanwhile; the earlier booking wins
+                rivals = find_slot_conflicts(
+                    service, calendar_id, dentist, appointment_dt, end_time,
+                    exclude_id=event.get('id'), check_freebusy=False)
+                if any(booked_before(rival, event) for rival in rivals):
+                    with span("calendar", "events.delete"):
+                        service.events().delete(calendarId=calendar_id, eventId=event['id']).execute()
+                    return slot_conflict_response(
+                        dentist, appointment_dt, f"Dr. {dentist} was just booked at {appointment_dt.isoformat()}")
+
+                remember_calendar_event(calendar_id, event)
+                invalidate_availability(event)
+
+            # 2. Record the audit row and the confirmation SMS; both are delivered in the background
             # 
-            now_toronto = datetime.now(ZoneInfo("America/Toronto"))
-            current_datetime = now_toronto.strftime("%Y-%m-%d %H:%M:%S %Z")
-
-            try:
-                spread_client = get_sheet_service()
-                spreadsheet = spread_client.open(SPREAD_SHEET)
-                sheet = spreadsheet.sheet1 
-                sheet.append_row(["@Book", 
-                                  service_type, 
-                                  patient_name, 
-                                  patient_phone,
-                                  referral, 
-                                  dentist, 
-                                  insurance_name, 
-                                  appointment_dt.isoformat(), 
-                                  "", 
-                                  current_datetime])
-        
-                pass
-            except Exception as e:
-                print(f"Failed to open spreadsheet: {str(e)}")
-                pass
-
-
-            # Send confirmation SMS
-            sms_result = send_sms_notification(
-                to_number=patient_phone,
-                message_body=(
-                    f"Hello {patient_name}, "
-                    f"Your {service_type} appointment has been scheduled for "
-                    f"{appointment_dt.strftime('%B %d, %Y at %I:%M %p')} "
-                    f"with Dr. {dentist}. "
-                    "Please arrive 10 minutes early. "
-                    "If you need to reschedule, please contact our office."
-                )
-            )
+            record_side_effects(**book_side_effects(
+                patient_name, patient_phone, service_type, dentist, appointment_dt, referral, insurance_name))
 
             return {"booking_status": "success"}
 
+        except SlotLockTimeout as e:
+            return slot_conflict_response(dentist, appointment_dt, str(e))
         except Exception as calendar_error:
             return {"booking_status": f"error : {str(calendar_error)}"}, 500
 
@@ -892,80 +1703,23 @@ def get_available():
         if not dentist:
             dentist = ""
 
-        # Initialize calendar service
-        service = get_calendar_service()
-        calendar_id = GMAIL_ACCOUNT  # or specific calendar ID
-        
         # Get Toronto timezone
-        toronto_tz = pytz.timezone('America/Toronto')
-        now = datetime.now(toronto_tz)
-        
-        # Get next three business days
-        business_days = get_next_three_business_days(now)
+        now = datetime.now(TORONTO_TZ)
         
-        # Calculate time range for calendar query
-        time_min = now.isoformat()
-        time_max = (business_days[-1].replace(
-            hour=BusinessHours.CLOSE_HOUR,
-            minute=0,
-            second=0,
-            microsecond=0
-        ) + timedelta(minutes=BusinessHours.SLOT_DURATION)).isoformat()
+        # Get the business days to offer, three unless the caller asks for more
+        try:
+            business_days = requested_business_days(data, now)
+        except ValueError as e:
+            return invalid_window_response(e)
         
         try:
-            # Get existing events for the dentist
-            events_result = service.events().list(
-                calendarId=calendar_id,
-                timeMin=time_min,
-                timeMax=time_max,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            
-            # Filter events for the specified dentist
-            busy_slots = []
-            for event in events_result.get('items', []):
-                description = event.get('description', '').lower()
-                if f"dentist: {dentist.lower()}" in description:
-                    start = parser.parse(event['start']['dateTime'])
-                    end = parser.parse(event['end']['dateTime'])
-                    busy_slots.append((start, end))
-            
-            # Calculate available slots for each business day
-            available_slots = defaultdict(list)
+            # Free slots per day, from the availability cache or one Calendar fetch for the missing days
+            slots_by_day = get_availability_cache().get_many([dentist], business_days, load_free_slots)[dentist.strip().lower()]
             
-            for day in business_days:
-                # Get all possible time slots for the day
-                day_slots = get_time_slots(day)
-                
-                # Remove slots that are in the past
-                if day.date() == now.date():
-                    day_slots = [slot for slot in day_slots if slot > now]
-                
-                # Check each slot against busy periods
-                for slot in day_slots:
-                    slot_end = slot + timedelta(minutes=BusinessHours.SLOT_DURATION)
-                    is_available = True
-                    
-                    for busy_start, busy_end in busy_slots:
-                        if (slot < busy_end and slot_end > busy_start):
-                            is_available = False
-                            break
-                    
-                    if is_available:
-                        date_key = slot.strftime("%A, %B %d, %Y")
-                        available_slots[date_key].append(slot)
-            
-            # Format the response
-            formatted_slots = format_time_slots(available_slots)
-            
-            # Create detailed response
+            # Create detailed response, dropping slots already in the past
             response = {
                 "available_dates": "success",
-                "details": {
-                    date: [slot.strftime("%I:%M %p") for slot in slots]
-                    for date, slots in available_slots.items()
-                }
+                "details": format_available_slots(slots_by_day, now)
             }
             
             return jsonify(response)
@@ -983,3 +1737,123 @@ def get_available():
         }), 500
 
     return {"available_dates": "Thursday, Friday 11:00 am ~ 4:00pm"}
+
+@asbp.route("/get_available_batch", methods=['POST'])
+def get_available_batch():
+    """
+    Availability of several dentists at once
+
+    Request body: 'dentists' (a list of names, or "all" for the DENTISTS and
+    DENTIST_CALENDARS roster) plus the window of /get_available ('days', or
+    'start_date'/'end_date'). Whatever is not cached is computed from a
+    single calendar fetch shared by every dentist.
+
+    Response: 'details' per dentist in the /get_available format, and
+    'any_dentist' with the slots at least one of them has free.
+    """
+    try:
+        data = request.get_json() or {}
+        dentists = data.get('dentists') or "all"
+        if isinstance(dentists, str):
+            if dentists.strip().lower() != "all":
+                dentists = [name for name in dentists.split(",") if name.strip()]
+            else:
+                dentists = list(dict.fromkeys(
+                    [name.strip().lower() for name in DENTISTS] + list(DENTIST_CALENDARS)))
+        if not dentists:
+            return jsonify({
+                "status": "error",
+                "message": "No dentists given and no DENTISTS roster configured"
+            }), 400
+
+        now = datetime.now(TORONTO_TZ)
+        try:
+            business_days = requested_business_days(data, now)
+        except ValueError as e:
+            return invalid_window_response(e)
+
+        try:
+            slots = get_availability_cache().get_many(dentists, business_days, load_free_slots)
+        except Exception as calendar_error:
+            return jsonify({
+                "status": "error",
+                "message": f"Error accessing calendar: {str(calendar_error)}"
+            }), 500
+
+        union = {
+            day: sorted({slot for slots_by_day in slots.values() for slot in slots_by_day[day]})
+            for day in business_days
+        }
+        return jsonify({
+            "available_dates": "success",
+            "dentists": {
+                name: format_available_slots(slots[name.strip().lower()], now)
+                for name in dentists
+            },
+            "any_dentist": format_available_slots(union, now)
+        })
+
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": f"Server error: {str(e)}"
+        }), 500
+
+@asbp.route("/availability_stats", methods=['GET'])
+def availability_stats():
+    """Hit, miss and staleness counters of the availability cache"""
+    return jsonify(get_availability_cache().stats())
+
+@asbp.route("/metrics", methods=['GET'])
+def metrics():
+    """Request and upstream call counters and latency histograms, in the Prometheus text format"""
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+@asbp.route("/bulk_cancel", methods=['POST'])
+@idempotent
+def bulk_cancel():
+    """
+    Cancel, or move, all of a dentist's appointments in a date range
+
+    Request body: 'dentist', 'start_date' and optional 'end_date' (YYYY-MM-DD,
+    inclusive), optional 'shift_days' to move the appointments instead of
+    cancelling them, 'notify' (default true) to text the patients and
+    'dry_run' to only list what would change.
+
+    Response: 'summary' with the count of each outcome and 'appointments'
+    with the outcome of each appointment.
+    """
+    try:
+        data = request.get_json() or {}
+        dentist = (data.get('dentist') or "").strip()
+        log("bulk_cancel", f"dentist: {dentist}, from: {data.get('start_date')}, to: {data.get('end_date')}")
+        if not dentist:
+            return jsonify({"bulk_status": "error: dentist is not indicated"}), 400
+        try:
+            first_day, last_day = parse_bulk_range(data)
+            shift_days = int(data.get('shift_days') or 0)
+        except (TypeError, ValueError) as e:
+            return jsonify({"bulk_status": f"error: {str(e)}"}), 400
+
+        try:
+            outcomes = bulk_cancel_appointments(
+                get_calendar_service(), GMAIL_ACCOUNT, dentist, first_day, last_day,
+                shift_days=shift_days,
+                notify=data.get('notify', True) is not False,
+                dry_run=bool(data.get('dry_run')))
+        except Exception as calendar_error:
+            return jsonify({"bulk_status": f"error: Error accessing calendar: {str(calendar_error)}"}), 500
+
+        summary = bulk_summary(outcomes)
+        return jsonify({
+            "bulk_status": "partial" if summary.get("failed") else "success",
+            "dentist": dentist,
+            "start_date": first_day.isoformat(),
+            "end_date": last_day.isoformat(),
+            "summary": summary,
+            "appointments": outcomes
+        })
+
+    except Exception as e:
+        return jsonify({"bulk_status": f"error: {str(e)}"}), 500
@@ -0,0 +1,833 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone, timedelta
+from flask import Blueprint, Response, request
+from google.auth.transport.requests import Request as GoogleAuthRequest
+from typing import AsyncIterator, Awaitable, Callable, Optional, Tuple, List, Dict
+from urllib.parse import quote
+from werkzeug.datastructures import Headers
+import threading
+import asyncio
+import aiohttp
+import json
+import time
+import os
+
+import aldershot
+from aldershot import (
+    BusinessHours, GMAIL_ACCOUNT, SPREAD_SHEET, SERVICE_TIME, SERVICE_ACCOUNT_FILE, SCOPES, TORONTO_TZ,
+    TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER,
+    validate_appointment_params, validate_appointment_time, extract_event_details,
+    build_appointment_event, rescheduled_times, book_side_effects, cancel_side_effects, reschedule_side_effects,
+    patient_lookup_filters, requested_business_days, invalid_window_response, availability_window, free_slots_by_dentist, format_available_slots,
+    partition_busy_intervals, slot_conflicts_in, booked_before, slot_conflict_response,
+    invalidate_availability, remember_calendar_event, forget_calendar_event
+)
+from patient_index import patient_matches
+from appointment import decode_event
+from event_stream import LIST_FIELDS, PAGE_SIZE, LOOKUP_PAGE_SIZE
+from audit_writer import SPREAD_SHEET_KEY, normalize_row
+from sms_dispatcher import SMS_RATE_PER_SECOND, SMS_HTTP_TIMEOUT, TWILIO_BASE_URL
+from freebusy import freebusy_body, busy_from_response, chunk_calendar_ids
+from slot_locks import SlotLocks, SlotLockTimeout, SLOT_LOCK_TIMEOUT, get_slot_locks
+from idempotency import (
+    IDEMPOTENCY_WAIT_TIMEOUT, get_idempotency_store, request_idempotency_key, request_fingerprint
+)
+from metrics import REQUEST_ID_HEADER, log, span, start_request, finish_request, instrument_blueprint
+from google_services import CALENDAR_API_URL, SHEETS_API_URL, DRIVE_API_URL
+import google_services
+
+TWILIO_API_URL = f"{TWILIO_BASE_URL}/2010-04-01"
+
+ASYNC_HTTP_CONNECTIONS = int(os.getenv("ASYNC_HTTP_CONNECTIONS", 100))
+ASYNC_HTTP_TIMEOUT = float(os.getenv("ASYNC_HTTP_TIMEOUT", 30))
+# Path prefix the ASGI app strips, matching the /aldershot mount of the Flask blueprint
+ASYNC_URL_PREFIX = os.getenv("ASYNC_URL_PREFIX", "/aldershot")
+
+
+class UpstreamError(Exception):
+    """A Google or Twilio REST call answered with an error status"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+class AsyncRateLimiter:
+    """Token bucket for coroutines; the async counterpart of sms_dispatcher.RateLimiter"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncSlotLocks:
+    """The (dentist, grid cell) locks of slot_locks.SlotLocks for coroutines on one event loop"""
+
+    def __init__(self, cell_minutes: int, timeout: float = SLOT_LOCK_TIMEOUT):
+        self._cells = SlotLocks(cell_minutes, timeout)
+        self.timeout = timeout
+        self._locks: Dict[Tuple[str, int], List] = {}
+
+    @asynccontextmanager
+    async def reserve(self, dentist: str, start: datetime, end: datetime):
+        held = []
+        try:
+            for key in self._cells.cells(dentist, start, end):
+                entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+                entry[1] += 1
+                try:
+                    await asyncio.wait_for(entry[0].acquire(), self.timeout)
+                except asyncio.TimeoutError:
+                    self._checkin(key)
+                    raise SlotLockTimeout(f"Slot {start.isoformat()} for '{dentist}' is being booked by another call")
+                held.append((key, entry[0]))
+            yield
+        finally:
+            for key, lock in reversed(held):
+                lock.release()
+                self._checkin(key)
+
+    def _checkin(self, key: Tuple[str, int]):
+        entry = self._locks[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._locks[key]
+
+
+class SharedSlotLocks:
+    """
+    The process-wide threaded SlotLocks behind the async reserve() of AsyncSlotLocks
+
+    For event loops that serve a single request, such as Flask async views:
+    blocking the loop while waiting holds up nothing else, and bookings made
+    by other loops and by the threaded views are ordered by the same locks.
+    """
+
+    def __init__(self, locks: SlotLocks):
+        self._locks = locks
+
+    @asynccontextmanager
+    async def reserve(self, dentist: str, start: datetime, end: datetime):
+        with self._locks.reserve(dentist, start, end):
+            yield
+
+
+_refresh_lock = threading.Lock()
+
+
+def refresh_credentials(credentials, force: bool = False):
+    """Refresh the shared service account credentials once, whichever thread or event loop asks"""
+    with _refresh_lock:
+        if force or not credentials.valid:
+            credentials.refresh(GoogleAuthRequest())
+
+
+def _query(params: dict) -> Dict[str, str]:
+    # aiohttp only accepts str/int/float query values
+    return {key: ('true' if value is True else 'false' if value is False else value)
+            for key, value in params.items() if value is not None}
+
+
+def _upstream_operation(method: str, url: str) -> Tuple[str, str]:
+    """The (upstream, operation) metrics labels of a Google REST call, named as in the Flask path"""
+    if url.startswith(SHEETS_API_URL):
+        return "sheets", "append"
+    if url.startswith(DRIVE_API_URL):
+        return "sheets", "open"
+    if url.endswith("/freeBusy"):
+        return "calendar", "freebusy.query"
+    operations = {'GET': 'events.list', 'POST': 'events.insert', 'PATCH': 'events.patch', 'DELETE': 'events.delete'}
+    return "calendar", operations.get(method, method.lower())
+
+
+class AsyncUpstreams:
+    """
+    aiohttp clients for the Calendar, Sheets and Drive REST APIs and Twilio
+
+    All calls share one keep-alive connection pool of ASYNC_HTTP_CONNECTIONS
+    connections. Google access tokens come from the process-wide service
+    account credentials; refreshing them blocks, so it runs in a thread, once
+    for all waiting coroutines. Use one instance per event loop, and close it
+    (or use it as an async context manager) when the loop ends.
+    """
+
+    def __init__(
+        self,
+        key_file: str = SERVICE_ACCOUNT_FILE,
+        scopes: List[str] = SCOPES,
+        connections: int = ASYNC_HTTP_CONNECTIONS,
+        timeout: float = ASYNC_HTTP_TIMEOUT
+    ):
+        self.key_file = key_file
+        self.scopes = scopes
+        self.connections = connections
+        self.timeout = timeout
+        self.spreadsheet_key = SPREAD_SHEET_KEY
+        self.slot_locks = AsyncSlotLocks(BusinessHours.SLOT_GRANULARITY)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._token_lock = asyncio.Lock()
+        self._sms_limiter = AsyncRateLimiter(SMS_RATE_PER_SECOND)
+
+    async def __aenter__(self) -> 'AsyncUpstreams':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def google_token(self, force_refresh: bool = False) -> str:
+        credentials = google_services.registry.credentials(self.key_file, self.scopes)
+        if force_refresh or not credentials.valid:
+            async with self._token_lock:
+                if force_refresh or not credentials.valid:
+                    await asyncio.to_thread(refresh_credentials, credentials, force_refresh)
+        return credentials.token
+
+    async def google(self, method: str, url: str, params: Optional[dict] = None, body: Optional[dict] = None) -> dict:
+        """Call a Google REST endpoint, refreshing the token once if it was rejected"""
+        upstream, operation = _upstream_operation(method, url)
+        for attempt in range(2):
+            token = await self.google_token(force_refresh=attempt > 0)
+            with span(upstream, operation):
+                async with self.session().request(
+                    method,
+                    url,
+                    params=_query(params or {}),
+                    json=body,
+                    # Anonymous credentials (GOOGLE_ANONYMOUS_CREDENTIALS) carry no token
+                    headers={'Authorization': f"Bearer {token}"} if token else None
+                ) as response:
+                    if response.status == 401 and attempt == 0:
+                        continue
+                    text = await response.text()
+                    if response.status >= 400:
+                        raise UpstreamError(response.status, text)
+                    return json.loads(text) if text else {}
+
+    # Calendar
+
+    @staticmethod
+    def events_url(calendar_id: str, event_id: Optional[str] = None) -> str:
+        url = f"{CALENDAR_API_URL}/calendars/{quote(calendar_id, safe='')}/events"
+        return f"{url}/{quote(event_id, safe='')}" if event_id else url
+
+    async def list_events(self, calendar_id: str, page_size: int = PAGE_SIZE, **params) -> AsyncIterator[dict]:
+        """Yield events page by page with the same field projection as event_stream"""
+        params = dict(params, fields=LIST_FIELDS, maxResults=page_size)
+        while True:
+            page = await self.google('GET', self.events_url(calendar_id), params=params)
+            for item in page.get('items', []):
+                yield item
+            if not page.get('nextPageToken'):
+                return
+            params['pageToken'] = page['nextPageToken']
+
+    async def insert_event(self, calendar_id: str, event: dict) -> dict:
+        return await self.google('POST', self.events_url(calendar_id), body=event)
+
+    async def patch_event(self, calendar_id: str, event_id: str, body: dict) -> dict:
+        """Change only the fields in `body`; the rest of the event is left as it is"""
+        return await self.google('PATCH', self.events_url(calendar_id, event_id), body=body)
+
+    async def delete_event(self, calendar_id: str, event_id: str):
+        await self.google('DELETE', self.events_url(calendar_id, event_id))
+
+    async def query_busy(self, calendar_ids: List[str], time_min: datetime, time_max: datetime) -> dict:
+        """freebusy.query for any number of calendars, the chunks in parallel"""
+        chunks = chunk_calendar_ids(calendar_ids)
+        responses = await asyncio.gather(*(
+            self.google('POST', f"{CALENDAR_API_URL}/freeBusy",
+                        body=freebusy_body(chunk, time_min, time_max, "America/Toronto"))
+            for chunk in chunks
+        ))
+        busy = {}
+        for chunk, response in zip(chunks, responses):
+            busy.update(busy_from_response(chunk, response))
+        return busy
+
+    # Sheets
+
+    async def spreadsheet_id(self) -> str:
+        """The audit spreadsheet's ID: SPREAD_SHEET_KEY, or found by name with one Drive search"""
+        if not self.spreadsheet_key:
+            name = (SPREAD_SHEET or "").replace("\\", "\\\\").replace("'", "\\'")
+            result = await self.google('GET', f"{DRIVE_API_URL}/files", params={
+                'q': f"name = '{name}' and mimeType = 'application/vnd.google-apps.spreadsheet' and trashed = false",
+                'fields': 'files(id)',
+                'pageSize': 1,
+            })
+            files = result.get('files') or []
+            if not files:
+                raise UpstreamError(404, f"Spreadsheet '{SPREAD_SHEET}' not found")
+            self.spreadsheet_key = files[0]['id']
+        return self.spreadsheet_key
+
+    async def append_rows(self, rows: List[list]):
+        """Append audit rows to the first worksheet with one values.append call"""
+        spreadsheet_id = await self.spreadsheet_id()
+        await self.google(
+            'POST',
+            f"{SHEETS_API_URL}/spreadsheets/{spreadsheet_id}/values/A1:append",
+            params={'valueInputOption': 'RAW', 'insertDataOption': 'INSERT_ROWS'},
+            body={'values': [normalize_row(row) for row in rows]})
+
+    # Twilio
+
+    async def send_sms(self, to_number: str, message_body: str, from_number: Optional[str] = None) -> dict:
+        """Send an SMS; returns the result dict described in aldershot.send_sms_notification()"""
+        if not all([TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN]):
+            return {
+                'success': False,
+                'message': 'Twilio credentials not properly configured',
+                'error_code': 'MISSING_CREDENTIALS'
+            }
+        sender = from_number or TWILIO_PHONE_NUMBER
+        if not sender:
+            return {
+                'success': False,
+                'message': 'No sender phone number provided or configured',
+                'error_code': 'MISSING_SENDER'
+            }
+
+        await self._sms_limiter.acquire()
+        payload = {}
+        try:
+            with span("twilio", "messages.create"):
+                async with self.session().post(
+                    f"{TWILIO_API_URL}/Accounts/{TWILIO_ACCOUNT_SID}/Messages.json",
+                    data={'To': to_number, 'From': sender, 'Body': message_body},
+                    auth=aiohttp.BasicAuth(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN),
+                    timeout=aiohttp.ClientTimeout(total=SMS_HTTP_TIMEOUT)
+                ) as response:
+                    payload = await response.json(content_type=None)
+                    if response.status >= 400:
+                        raise UpstreamError(response.status, str(payload.get('message')))
+            return {
+                'success': True,
+                'message': 'SMS sent successfully',
+                'sid': payload.get('sid')
+            }
+        except UpstreamError:
+            return {
+                'success': False,
+                'message': f"Twilio error: {payload.get('message')}",
+                'error_code': payload.get('code')
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Unexpected error: {str(e)}',
+                'error_code': 'UNKNOWN_ERROR'
+            }
+
+
+class FlaskAsyncUpstreams(AsyncUpstreams):
+    """
+    AsyncUpstreams for one Flask async view
+
+    Flask runs every async view in an event loop of its own, so nothing tied
+    to a loop outlives the request. The slot locks and the SMS rate limit
+    must hold across requests, so they are the process-wide ones the threaded
+    blueprint uses: SharedSlotLocks and the SMS dispatcher.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.slot_locks = SharedSlotLocks(get_slot_locks(BusinessHours.SLOT_GRANULARITY))
+
+    async def send_sms(self, to_number: str, message_body: str, from_number: Optional[str] = None) -> dict:
+        return await asyncio.wrap_future(aldershot.dispatch_sms(to_number, message_body, from_number))
+
+
+async def deliver_side_effects(upstreams: AsyncUpstreams, audit_row: list, sms_to: str, sms_body: str):
+    """Append the audit row and send the SMS concurrently; failures are logged, not raised"""
+    audit_result, sms_result = await asyncio.gather(
+        upstreams.append_rows([audit_row]),
+        upstreams.send_sms(sms_to, sms_body),
+        return_exceptions=True)
+    if isinstance(audit_result, Exception):
+        log("side_effects", f"Failed to open spreadsheet: {str(audit_result)}", level="warning")
+    if isinstance(sms_result, Exception) or not sms_result.get('success'):
+        log("side_effects", f"Failed to send SMS: {sms_result}", level="warning")
+
+
+async def find_patient_events(
+    upstreams: AsyncUpstreams,
+    calendar_id: str,
+    patient_name: str,
+    patient_phone: str,
+    limit: Optional[int] = None
+) -> List[dict]:
+    """Async aldershot.find_patient_events() on the live listing: property filter first, then a full scan if needed"""
+    for params in patient_lookup_filters(patient_phone):
+        matches = []
+        async for event in upstreams.list_events(
+            calendar_id,
+            page_size=LOOKUP_PAGE_SIZE if limit else PAGE_SIZE,
+            timeMin=datetime.now(timezone.utc).isoformat(),
+            singleEvents=True,
+            orderBy='startTime',
+            **params
+        ):
+            if patient_matches(event, patient_name, patient_phone):
+                matches.append(event)
+                if limit and len(matches) >= limit:
+                    break
+        if matches:
+            return matches
+    return []
+
+
+async def busy_intervals_by_dentist(
+    upstreams: AsyncUpstreams,
+    calendar_id: str,
+    time_min: datetime,
+    time_max: datetime,
+    dentists: List[str]
+) -> Dict[str, List[Tuple[datetime, datetime]]]:
+    """Async aldershot.busy_intervals_by_dentist(), honouring AVAILABILITY_BACKEND"""
+    keys = list(dict.fromkeys(dentist.strip().lower() for dentist in dentists))
+    busy = {}
+    if aldershot.AVAILABILITY_BACKEND == 'freebusy':
+        calendars = {}
+        for key in keys:
+            if key in aldershot.DENTIST_CALENDARS:
+                calendars[key] = [aldershot.DENTIST_CALENDARS[key]]
+            elif not key and aldershot.DENTIST_CALENDARS:
+                calendars[key] = list(aldershot.DENTIST_CALENDARS.values())
+        if calendars:
+            by_calendar = await upstreams.query_busy(
+                [cid for ids in calendars.values() for cid in ids], time_min, time_max)
+            for key, ids in calendars.items():
+                busy[key] = aldershot.merge_intervals(interval for cid in ids for interval in by_calendar[cid])
+
+    remaining = [key for key in keys if key not in busy]
+    if remaining:
+        params = {}
+        if len(remaining) == 1 and remaining[0] and aldershot.AVAILABILITY_PROPERTY_FILTER:
+            params['privateExtendedProperty'] = f"dentist={remaining[0]}"
+        events = [event async for event in upstreams.list_events(
+            calendar_id,
+            timeMin=time_min.isoformat(),
+            timeMax=time_max.isoformat(),
+            singleEvents=True,
+            orderBy='startTime',
+            **params
+        )]
+        busy.update(partition_busy_intervals(events, remaining))
+    return busy
+
+
+async def cancel(upstreams: AsyncUpstreams, data: dict) -> Tuple[dict, int]:
+    try:
+        patient_name = data.get('patient_name')
+        patient_phone = data.get('patient_phone')
+
+        log("cancel", f"patient name: {patient_name}, number: {patient_phone}")
+
+        if not patient_name or not patient_phone:
+            return {
+                "cancel_appointment_statusmessage": "error: patient name or phone number is not indicated",
+            }, 400
+
+        calendar_id = GMAIL_ACCOUNT
+        existing_event_detail = {}
+        try:
+            patient_events = await find_patient_events(upstreams, calendar_id, patient_name, patient_phone, limit=1)
+            matching_event = patient_events[0] if patient_events else None
+            if not matching_event:
+                return {
+                    "cancel_appointment_statusmessage": f"error: No active appointment found for {patient_name} with phone {patient_phone}"
+                }, 404
+
+            existing_event_detail = extract_event_details(matching_event)
+            await upstreams.delete_event(calendar_id, matching_event['id'])
+            forget_calendar_event(calendar_id, matching_event['id'])
+            invalidate_availability(matching_event)
+        except Exception as calendar_error:
+            return {
+                "cancel_appointment_statusmessage": f"error: Error accessing calendar: {str(calendar_error)}"
+            }, 500
+
+        await deliver_side_effects(upstreams, **cancel_side_effects(patient_name, patient_phone, existing_event_detail))
+        return {"cancel_appointment_statusmessage": "success"}, 200
+    except Exception as e:
+        return {"cancel_appointment_statusmessage": f"error : {str(e)}"}, 200
+
+
+async def reschedule(upstreams: AsyncUpstreams, data: dict) -> Tuple[dict, int]:
+    try:
+        patient_name = data.get('patient_name')
+        patient_phone = data.get('patient_phone')
+        appointment_date = data.get('appointment_date')
+
+        log("reschedule", f"patient name: {patient_name}, number: {patient_phone}, appointment date: {appointment_date}")
+
+        if not all([patient_name, patient_phone, appointment_date]):
+            return {
+                "rescheduling_appointment_status": "error: patient name or phone number or appointment_date is not indicated",
+            }, 400
+
+        is_valid, error_message, new_appointment_dt = validate_appointment_time(appointment_date)
+        if not is_valid:
+            return {
+                "rescheduling_appointment_status": "error: appintment date is not ISO format",
+            }, 400
+
+        calendar_id = GMAIL_ACCOUNT
+        existing_event_detail = {}
+        try:
+            patient_events = await find_patient_events(upstreams, calendar_id, patient_name, patient_phone, limit=1)
+            existing_event = patient_events[0] if patient_events else None
+            if not existing_event:
+                return {
+                    "rescheduling_appointment_status": f"error: No active appointment found for {patient_name} with phone {patient_phone}"
+                }, 404
+
+            existing_event_detail = extract_event_details(existing_event)
+            updated_event = await upstreams.patch_event(
+                calendar_id, existing_event['id'], rescheduled_times(existing_event, new_appointment_dt))
+            remember_calendar_event(calendar_id, updated_event)
+            invalidate_availability(existing_event, updated_event)
+        except Exception as calendar_error:
+            return {
+                "rescheduling_appointment_status": f"error: couldn't reschedule calendar - {str(calendar_error)}",
+            }, 400
+
+        await deliver_side_effects(upstreams, **reschedule_side_effects(
+            patient_name, patient_phone, existing_event_detail, new_appointment_dt))
+    except Exception as e:
+        return {"rescheduling_appointment_status": f"error: {str(e)}"}, 200
+
+    return {"rescheduling_appointment_status": "success"}, 200
+
+
+async def find_existing(upstreams: AsyncUpstreams, data: dict) -> Tuple[dict, int]:
+    try:
+        patient_name = data.get('patient_name')
+        patient_phone = data.get('patient_phone')
+
+        log("find_existing", f"patient name: {patient_name}, number: {patient_phone}")
+        if not patient_name or not patient_phone:
+            return {"existing_appointment_status": f"error: patient_name or patient_phone is not indicated"}, 200
+
+        try:
+            matching_appointments = [
+                {
+                    "summary": appointment.summary,
+                    "start_time": appointment.format_start(),
+                    "end_time": appointment.format_end(),
+                    "event_id": appointment.event_id,
+                }
+                for appointment in map(decode_event, await find_patient_events(
+                    upstreams, GMAIL_ACCOUNT, patient_name, patient_phone))
+            ]
+            if not matching_appointments:
+                return {"existing_appointment_status": "False"}, 200
+        except Exception as calendar_error:
+            return {"existing_appointment_status": f"error: error accessing calendar {str(calendar_error)}"}, 500
+    except Exception as e:
+        return {"existing_appointment_status": f"error: {str(e)}"}, 200
+
+    return {"existing_appointment_status": "True"}, 200
+
+
+async def book(upstreams: AsyncUpstreams, data: dict) -> Tuple[dict, int]:
+    try:
+        patient_name = data.get('patient_name')
+        patient_phone = data.get('patient_phone')
+        service_type = data.get('service_type')
+        dentist = data.get('dentist', "Non - Indicated")
+        appointment_date = data.get('appointment_date')
+        referral = data.get('referral')
+        insurance_name = data.get('insurance_name')
+
+        is_valid, error_message, appointment_dt = validate_appointment_params(
+            patient_name=patient_name,
+            patient_phone=patient_phone,
+            service_type=service_type,
+            dentist=dentist,
+            appointment_date=appointment_date,
+            referral=referral,
+            insurance_name=insurance_name
+        )
+        if not is_valid:
+            return {"booking_status": f"error: {error_message}"}, 400
+
+        calendar_id = GMAIL_ACCOUNT
+        end_time = appointment_dt + timedelta(minutes=SERVICE_TIME)
+        event = build_appointment_event(
+            patient_name=patient_name,
+            patient_phone=patient_phone,
+            service_type=service_type,
+            dentist=dentist,
+            appointment_dt=appointment_dt,
+            end_time=end_time,
+            referral=referral,
+            insurance_name=insurance_name
+        )
+
+        async def slot_conflicts(exclude_id: Optional[str] = None, check_freebusy: bool = True) -> List[dict]:
+            events = [item async for item in upstreams.list_events(
+                calendar_id,
+                page_size=LOOKUP_PAGE_SIZE,
+                timeMin=appointment_dt.isoformat(),
+                timeMax=end_time.isoformat(),
+                singleEvents=True,
+                orderBy='startTime'
+            )]
+            conflicts = slot_conflicts_in(events, dentist, appointment_dt, end_time, exclude_id)
+            key = dentist.strip().lower()
+            if check_freebusy and aldershot.AVAILABILITY_BACKEND == 'freebusy' and key in aldershot.DENTIST_CALENDARS:
+                dentist_calendar = aldershot.DENTIST_CALENDARS[key]
+                busy = await upstreams.query_busy([dentist_calendar], appointment_dt, end_time)
+                conflicts += [
+                    {'start': {'dateTime': start.isoformat()}, 'end': {'dateTime': end.isoformat()}}
+                    for start, end in busy[dentist_calendar]
+                    if start < end_time and end > appointment_dt
+                ]
+            return conflicts
+
+        try:
+            async with upstreams.slot_locks.reserve(dentist, appointment_dt, end_time):
+                if await slot_conflicts():
+                    return slot_conflict_response(
+                        dentist, appointment_dt, f"Dr. {dentist} is not available at {appointment_dt.isoformat()}")
+
+                event = await upstreams.insert_event(calendar_id, event)
+
+                rivals = await slot_conflicts(exclude_id=event.get('id'), check_freebusy=False)
+                if any(booked_before(rival, event) for rival in rivals):
+                    await upstreams.delete_event(calendar_id, event['id'])
+                    return slot_conflict_response(
+                        dentist, appointment_dt, f"Dr. {dentist} was just booked at {appointment_dt.isoformat()}")
+
+                remember_calendar_event(calendar_id, event)
+                invalidate_availability(event)
+
+            await deliver_side_effects(upstreams, **book_side_effects(
+                patient_name, patient_phone, service_type, dentist, appointment_dt, referral, insurance_name))
+            return {"booking_status": "success"}, 200
+
+        except SlotLockTimeout as e:
+            return slot_conflict_response(dentist, appointment_dt, str(e))
+        except Exception as calendar_error:
+            return {"booking_status": f"error : {str(calendar_error)}"}, 500
+
+    except Exception as e:
+        return {"booking_status": f"error : {str(e)}"}, 500
+
+
+async def get_available(upstreams: AsyncUpstreams, data: dict) -> Tuple[dict, int]:
+    try:
+        dentist = data.get('dentist') or ""
+        now = datetime.now(TORONTO_TZ)
+        try:
+            business_days = requested_business_days(data, now)
+        except ValueError as e:
+            return invalid_window_response(e)
+        try:
+            time_min, time_max = availability_window(business_days)
+            busy = await busy_intervals_by_dentist(upstreams, GMAIL_ACCOUNT, time_min, time_max, [dentist])
+            slots_by_day = free_slots_by_dentist({dentist: business_days}, busy)[dentist]
+            return {
+                "available_dates": "success",
+                "details": format_available_slots(slots_by_day, now)
+            }, 200
+        except Exception as calendar_error:
+            return {
+                "status": "error",
+                "message": f"Error accessing calendar: {str(calendar_error)}"
+            }, 500
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Server error: {str(e)}"
+        }, 500
+
+
+Handler = Callable[[AsyncUpstreams, dict], Awaitable[Tuple[dict, int]]]
+
+HANDLERS: Dict[str, Handler] = {
+    "cancel": cancel,
+    "reschedule": reschedule,
+    "find_existing": find_existing,
+    "book": book,
+    "get_available": get_available,
+}
+IDEMPOTENT_HANDLERS = {"cancel", "reschedule", "book"}
+
+
+def encode_json(payload: dict) -> bytes:
+    """Serialize like Flask's jsonify() in production: sorted keys, compact, trailing newline"""
+    return json.dumps(payload, sort_keys=True, separators=(",", ":")).encode() + b"\n"
+
+
+async def respond(
+    name: str,
+    upstreams: AsyncUpstreams,
+    data: Optional[dict],
+    headers: Headers
+) -> Tuple[bytes, int, Dict[str, str]]:
+    """
+    Run the handler of an endpoint, replaying stored responses for repeated idempotency keys
+
+    Returns:
+    - Tuple[bytes, int, Dict[str, str]]: JSON body, status code and extra response headers
+    """
+    handler = HANDLERS[name]
+    key = request_idempotency_key(data, headers) if name in IDEMPOTENT_HANDLERS else None
+    if not key:
+        payload, status = await handler(upstreams, data)
+        return encode_json(payload), status, {}
+
+    store = get_idempotency_store()
+    scoped_key = f"aldershot.{name}:{key}"
+    fingerprint = request_fingerprint(data)
+    entry, owner = store.begin(scoped_key, fingerprint)
+    if not owner:
+        if entry.fingerprint != fingerprint:
+            return encode_json({
+                "status": "error",
+                "error_code": "IDEMPOTENCY_KEY_REUSED",
+                "message": "This idempotency key was already used with a different request"
+            }), 422, {}
+        if not await asyncio.to_thread(entry.done.wait, IDEMPOTENCY_WAIT_TIMEOUT) or entry.response is None:
+            return encode_json({
+                "status": "error",
+                "error_code": "REQUEST_IN_PROGRESS",
+                "message": "The original request with this idempotency key has not finished"
+            }), 409, {}
+        body, status, _ = entry.response
+        return body, status, {'Idempotent-Replayed': 'true'}
+
+    result = None
+    try:
+        payload, status = await handler(upstreams, data)
+        result = (encode_json(payload), status, 'application/json')
+        return result[0], result[1], {}
+    finally:
+        store.finish(scoped_key, entry, result)
+
+
+class AldershotASGI:
+    """
+    Raw ASGI application serving the five aldershot endpoints asynchronously
+
+    Paths and request/response bodies are those of the Flask blueprint,
+    with or without the ASYNC_URL_PREFIX mount. One AsyncUpstreams, and so
+    one connection pool, serves every request; it is closed on lifespan
+    shutdown. Run with e.g. `uvicorn aldershot_async:asgi_app`.
+    """
+
+    def __init__(self, prefix: str = ASYNC_URL_PREFIX):
+        self.prefix = prefix.rstrip('/')
+        self._upstreams: Optional[AsyncUpstreams] = None
+
+    def upstreams(self) -> AsyncUpstreams:
+        if self._upstreams is None:
+            self._upstreams = AsyncUpstreams()
+        return self._upstreams
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    if self._upstreams is not None:
+                        await self._upstreams.close()
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+
+        path = scope['path']
+        if self.prefix and path.startswith(self.prefix + '/'):
+            path = path[len(self.prefix):]
+        name = path.strip('/')
+
+        if name not in HANDLERS:
+            await self._send(send, encode_json({"status": "error", "message": "Not Found"}), 404)
+            return
+        if scope['method'] != 'POST':
+            await self._send(send, encode_json({"status": "error", "message": "Method Not Allowed"}), 405)
+            return
+
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            data = None
+
+        headers = Headers([(key.decode('latin-1'), value.decode('latin-1')) for key, value in scope['headers']])
+        context = start_request(f"aldershot.{name}", headers.get(REQUEST_ID_HEADER))
+        status = 500
+        try:
+            payload, status, extra_headers = await respond(name, self.upstreams(), data, headers)
+            extra_headers[REQUEST_ID_HEADER] = context.request_id
+            extra_headers['Server-Timing'] = context.server_timing()
+            await self._send(send, payload, status, extra_headers)
+        finally:
+            finish_request(context, scope['method'], status)
+
+    @staticmethod
+    async def _send(send, body: bytes, status: int, extra_headers: Optional[Dict[str, str]] = None):
+        headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        headers += [(key.lower().encode(), value.encode()) for key, value in (extra_headers or {}).items()]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+asgi_app = AldershotASGI()
+
+# The same handlers as Flask async views (needs `pip install flask[async]`). Flask runs each
+# async view in its own event loop, so every request gets, and closes, its own connection pool;
+# slot locks and the SMS rate limit are shared with the threaded views (FlaskAsyncUpstreams).
+async_asbp = Blueprint("aldershot_async", __name__)
+instrument_blueprint(async_asbp)
+
+
+def _flask_view(name: str):
+    async def view():
+        async with FlaskAsyncUpstreams() as upstreams:
+            body, status, extra_headers = await respond(name, upstreams, request.get_json(silent=True), request.headers)
+        return Response(body, status=status, mimetype='application/json', headers=extra_headers)
+    view.__name__ = f"{name}_async"
+    return view
+
+
+for _name in HANDLERS:
+    async_asbp.add_url_rule(f"/{_name}", view_func=_flask_view(_name), methods=['POST'])
@@ -1,22 +1,32 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
-from twilio.rest import Client
-from datetime import date, datetime, timedelta, timezone
-from urllib.parse import quote
-from zoneinfo import ZoneInfo
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-
-from dotenv import load_dotenv
-import dateparser
-import os
-import pyshorteners
-import uuid
-import urllib
-import gspread
+from flask import Flask, render_template
+
+# The commented-out routes below used twilio, googleapiclient, gspread,
+# dateparser and pyshorteners; import those inside a route if it is revived,
+# so they do not slow down every cold start.
 from aldershot import asbp
+from profiling import install_profiler
+from warmup import warm_up
+
+
+def create_app(warmup: str = "off") -> Flask:
+    """
+    Build the app, optionally warming it up before it serves its first request
+
+    Importing this module builds `app` without a warmup, so imports, the flask
+    CLI and tests make no network calls; the serving entrypoints warm up.
 
-app = Flask(__name__)
-app.register_blueprint(asbp, url_prefix="/aldershot")
+    Parameters:
+    - warmup (str): Warmup stage to run, see warmup.py ('full', 'prepare', 'connect' or 'off')
+
+    Returns:
+    - Flask: The app with the aldershot blueprint under /aldershot
+    """
+    app = Flask(__name__)
+    install_profiler(app)
+    app.register_blueprint(asbp, url_prefix="/aldershot")
+    app.add_url_rule('/', 'index', index)
+    warm_up(warmup)
+    return app
 
 
 
@@ -212,10 +222,13 @@ app.register_blueprint(asbp, url_prefix="/aldershot")
 #         print(f"Error happened: {str(e)}")
 #         return jsonify({"status": "failure", "error": str(e)}), 500
 
-@app.route('/')
 def index():
     return render_template('index.html')
 
 
+app = create_app()
+
+
 if __name__ == '__main__':
+    warm_up()
     app.run(debug=False)
\ No newline at end of file
@@ -0,0 +1,280 @@
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta, tzinfo
+from typing import Optional, Tuple, Dict
+from zoneinfo import ZoneInfo
+import threading
+import os
+
+from metrics import log
+from patient_index import parse_description_fields, private_properties
+
+APPOINTMENT_CACHE_SIZE = int(os.getenv("APPOINTMENT_CACHE_SIZE", 4096))
+
+TORONTO_TZ = ZoneInfo("America/Toronto")
+DETAIL_TIME_FORMAT = "%Y-%m-%d %I:%M %p %Z"
+DISPLAY_TIME_FORMAT = "%B %d, %Y at %I:%M %p %Z"
+
+# Description keys (lowercased) and the detail each one fills, in the order they are tested
+DESCRIPTION_FIELDS = (
+    ('patient', 'patient_name'),
+    ('phone', 'patient_phone'),
+    ('service', 'service_type'),
+    ('dentist', 'dentist'),
+    ('referral', 'referral'),
+    ('insurance', 'insurance_name'),
+)
+# extendedProperties written by /book, used when the description lacks a field
+PROPERTY_FIELDS = {
+    'patient_name': 'patient_name',
+    'patient_phone': 'phone',
+    'service_type': 'service',
+    'dentist': 'dentist',
+}
+
+_offset_zones: Dict[str, tzinfo] = {'Z': timezone.utc, '+00:00': timezone.utc, '-00:00': timezone.utc}
+
+
+def _offset_zone(suffix: str) -> tzinfo:
+    zone = _offset_zones.get(suffix)
+    if zone is None:
+        sign = -1 if suffix[0] == '-' else 1
+        offset = timedelta(hours=int(suffix[1:3]), minutes=int(suffix[4:6]))
+        zone = _offset_zones.setdefault(suffix, timezone(sign * offset))
+    return zone
+
+
+def parse_iso(value: str) -> datetime:
+    """
+    Decode a Calendar API date or dateTime into an aware datetime
+
+    Google writes RFC 3339 ('2025-03-03T10:00:00-05:00', '...Z'); those take
+    a datetime.fromisoformat() fast path and share one tzinfo per offset.
+    Dates and naive times are anchored in Toronto, anything unusual goes
+    through dateutil. Raises ValueError when the value cannot be parsed.
+    """
+    if value.endswith('Z'):
+        local, zone = value[:-1], timezone.utc
+    elif len(value) > 6 and value[-6] in '+-' and value[-3] == ':':
+        local, zone = value[:-6], _offset_zone(value[-6:])
+    else:
+        local, zone = value, TORONTO_TZ
+    try:
+        return datetime.fromisoformat(local).replace(tzinfo=zone)
+    except ValueError:
+        from dateutil import parser
+        moment = parser.isoparse(value)
+        return moment if moment.tzinfo is not None else moment.replace(tzinfo=TORONTO_TZ)
+
+
+def parse_datetime(value: str) -> datetime:
+    """
+    Parse a caller-supplied date and time, naive unless it names an offset
+
+    ISO 8601 takes the datetime.fromisoformat() fast path; anything else goes
+    through dateutil's lenient parser, imported on first use. Raises
+    ValueError when neither can read the value.
+    """
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        from dateutil import parser
+        return parser.parse(value)
+
+
+def _event_time(boundary: Optional[dict]) -> Optional[str]:
+    if not boundary:
+        return None
+    return boundary.get('dateTime') or boundary.get('date')
+
+
+_UNSET = object()
+
+
+class Appointment:
+    """
+    Read-only view of a Google Calendar event booked through the blueprint
+
+    Only the identifying fields are copied when the record is built; times
+    and patient fields are decoded on first access and kept. Use
+    decode_event() to share records between repeated decodes of the same
+    event version.
+    """
+
+    __slots__ = (
+        'event_id', 'etag', 'summary', 'status', 'location', 'created', 'updated',
+        '_event', '_start', '_end', '_fields'
+    )
+
+    def __init__(self, event: dict):
+        self.event_id: Optional[str] = event.get('id')
+        self.etag: Optional[str] = event.get('etag')
+        self.summary: str = event.get('summary', '')
+        self.status: str = event.get('status', '')
+        self.location: str = event.get('location', '')
+        self.created: str = event.get('created', '')
+        self.updated: str = event.get('updated', '')
+        self._event = event
+        self._start = _UNSET
+        self._end = _UNSET
+        self._fields = None
+
+    def __repr__(self) -> str:
+        return f"Appointment(event_id={self.event_id!r}, start={self.start!r})"
+
+    def _decode_time(self, key: str) -> Optional[datetime]:
+        value = _event_time(self._event.get(key))
+        if value is None:
+            return None
+        try:
+            return parse_iso(value)
+        except ValueError as e:
+            log("appointment", f"Error parsing event details: {str(e)}", level="warning",
+                event_id=self.event_id, field=key)
+            return None
+
+    @property
+    def start(self) -> Optional[datetime]:
+        """Aware start time, or None when the event has none"""
+        if self._start is _UNSET:
+            self._start = self._decode_time('start')
+        return self._start
+
+    @property
+    def end(self) -> Optional[datetime]:
+        """Aware end time, or None when the event has none"""
+        if self._end is _UNSET:
+            self._end = self._decode_time('end')
+        return self._end
+
+    @property
+    def bounds(self) -> Optional[Tuple[datetime, datetime]]:
+        if self.start is None or self.end is None:
+            return None
+        return self.start, self.end
+
+    @property
+    def duration_minutes(self) -> Optional[int]:
+        if self.bounds is None:
+            return None
+        return int((self.end - self.start).total_seconds() / 60)
+
+    def fields(self) -> Dict[str, str]:
+        """Patient, phone, service, dentist, referral and insurance, from the description then the properties"""
+        if self._fields is None:
+            fields = {name: '' for _, name in DESCRIPTION_FIELDS}
+            for key, value in parse_description_fields(self._event.get('description', '')).items():
+                for needle, name in DESCRIPTION_FIELDS:
+                    if needle in key:
+                        fields[name] = value
+                        break
+            properties = private_properties(self._event)
+            for name, prop in PROPERTY_FIELDS.items():
+                if not fields[name] and properties.get(prop):
+                    fields[name] = properties[prop]
+            self._fields = fields
+        return self._fields
+
+    @property
+    def patient_name(self) -> str:
+        return self.fields()['patient_name']
+
+    @property
+    def patient_phone(self) -> str:
+        return self.fields()['patient_phone']
+
+    @property
+    def dentist(self) -> str:
+        return self.fields()['dentist']
+
+    def format_start(self, fmt: str = DISPLAY_TIME_FORMAT) -> str:
+        return self.start.astimezone(TORONTO_TZ).strftime(fmt) if self.start is not None else ''
+
+    def format_end(self, fmt: str = DISPLAY_TIME_FORMAT) -> str:
+        return self.end.astimezone(TORONTO_TZ).strftime(fmt) if self.end is not None else ''
+
+    def details(self) -> dict:
+        """
+        Return the event details dict of aldershot.extract_event_details()
+
+        A fresh dict each call, so callers may modify it.
+        """
+        event = self._event
+        details = {
+            'event_id': self.event_id,
+            'summary': self.summary,
+            **self.fields(),
+            'location': self.location,
+            'start_time': self.format_start(DETAIL_TIME_FORMAT),
+            'end_time': self.format_end(DETAIL_TIME_FORMAT),
+            'created_at': self.created,
+            'last_updated': self.updated,
+            'status': self.status,
+            'creator': event.get('creator', {}).get('email', ''),
+            'organizer': event.get('organizer', {}).get('email', ''),
+        }
+
+        if self.duration_minutes is not None:
+            details['duration_minutes'] = self.duration_minutes
+
+        if 'conferenceData' in event:
+            conf_data = event['conferenceData']
+            details['conference_link'] = conf_data.get('entryPoints', [{}])[0].get('uri', '')
+            details['conference_type'] = conf_data.get('conferenceSolution', {}).get('name', '')
+
+        if 'attachments' in event:
+            details['attachments'] = [
+                {
+                    'title': attachment.get('title', ''),
+                    'file_url': attachment.get('fileUrl', '')
+                }
+                for attachment in event['attachments']
+            ]
+
+        if 'reminders' in event:
+            details['reminders'] = event['reminders'].get('overrides', [])
+
+        if 'recurrence' in event:
+            details['recurrence_rule'] = event['recurrence']
+
+        if 'colorId' in event:
+            details['color_id'] = event['colorId']
+
+        return details
+
+
+_cache: "OrderedDict[Tuple[str, str], Appointment]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def decode_event(event: dict) -> Appointment:
+    """
+    Return the Appointment of an event, reusing the record of an earlier decode
+
+    Records are kept per (event ID, etag) for the APPOINTMENT_CACHE_SIZE most
+    recently used event versions; any change to an event changes its etag.
+    Events without an ID or etag (e.g. in tests) are decoded every time.
+    """
+    event_id = event.get('id')
+    etag = event.get('etag')
+    if not event_id or not etag or APPOINTMENT_CACHE_SIZE <= 0:
+        return Appointment(event)
+
+    key = (event_id, etag)
+    with _cache_lock:
+        appointment = _cache.get(key)
+        if appointment is not None:
+            _cache.move_to_end(key)
+            return appointment
+
+    appointment = Appointment(event)
+    with _cache_lock:
+        appointment = _cache.setdefault(key, appointment)
+        _cache.move_to_end(key)
+        while len(_cache) > APPOINTMENT_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return appointment
+
+
+def clear_appointment_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,73 @@
+from typing import Callable, Optional, List
+import threading
+import os
+
+from metrics import span
+
+SPREAD_SHEET_KEY = os.getenv("SPREAD_SHEET_KEY")
+# The side-effect outbox delivers audit rows in batches of up to AUDIT_BATCH_SIZE, holding
+# new rows for at most AUDIT_FLUSH_INTERVAL seconds while a batch fills up
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", 20))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", 5))
+
+# @Book/@Cancel/@Reschedule, service, patient, phone, referral, dentist,
+# insurance, new time, previous time, logged at
+AUDIT_ROW_WIDTH = 10
+
+
+def normalize_row(row: list) -> list:
+    """Pad or trim a row to the 10-column audit layout, writing None as an empty cell"""
+    row = ["" if value is None else value for value in row[:AUDIT_ROW_WIDTH]]
+    return row + [""] * (AUDIT_ROW_WIDTH - len(row))
+
+
+class AuditWriter:
+    """
+    Writer of audit rows to the first worksheet of the clinic spreadsheet
+
+    The worksheet is opened once, by key when SPREAD_SHEET_KEY is set, otherwise
+    by name (one Drive search) after which its key is remembered. Batching is
+    left to the side-effect outbox, which hands over whole batches of rows.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], object],
+        spreadsheet_name: Optional[str],
+        spreadsheet_key: Optional[str] = SPREAD_SHEET_KEY
+    ):
+        self._client_factory = client_factory
+        self.spreadsheet_name = spreadsheet_name
+        self.spreadsheet_key = spreadsheet_key
+        self._worksheet = None
+        self._worksheet_lock = threading.Lock()
+
+    def worksheet(self):
+        """Return the cached first worksheet, opening the spreadsheet on first use"""
+        worksheet = self._worksheet
+        if worksheet is None:
+            with self._worksheet_lock:
+                if self._worksheet is None:
+                    client = self._client_factory()
+                    with span("sheets", "open"):
+                        if self.spreadsheet_key:
+                            spreadsheet = client.open_by_key(self.spreadsheet_key)
+                        else:
+                            spreadsheet = client.open(self.spreadsheet_name)
+                            self.spreadsheet_key = spreadsheet.id
+                        self._worksheet = spreadsheet.sheet1
+                worksheet = self._worksheet
+        return worksheet
+
+    def write_rows(self, rows: List[list]):
+        """Append rows with one API call"""
+        if not rows:
+            return
+        try:
+            worksheet = self.worksheet()
+            with span("sheets", "append"):
+                worksheet.append_rows([normalize_row(row) for row in rows])
+        except Exception:
+            # The cached handle may point at a deleted or re-shared sheet; reopen next time
+            self._worksheet = None
+            raise
@@ -0,0 +1,104 @@
+from datetime import datetime, date, time, timedelta, tzinfo
+from typing import Iterable, Tuple, List
+import re
+
+Interval = Tuple[datetime, datetime]
+
+_CLOCK = re.compile(r"^\s*(\d{1,2})(?::(\d{2}))?\s*$")
+
+
+def parse_clock(value: str) -> int:
+    """
+    Parse a wall-clock time such as '9', '09:00' or '12:30' into minutes after midnight
+
+    Raises ValueError for anything else.
+    """
+    match = _CLOCK.match(str(value))
+    if not match:
+        raise ValueError(f"Invalid clock time: {value!r}")
+    hours, minutes = int(match.group(1)), int(match.group(2) or 0)
+    if hours > 24 or minutes > 59 or (hours == 24 and minutes):
+        raise ValueError(f"Invalid clock time: {value!r}")
+    return hours * 60 + minutes
+
+
+class OpeningHours:
+    """Daily opening hours and slot layout, all expressed in minutes after midnight"""
+
+    def __init__(
+        self,
+        open_minute: int,
+        close_minute: int,
+        lunch_start_minute: int,
+        lunch_end_minute: int,
+        slot_duration: int,
+        granularity: int
+    ):
+        if granularity <= 0 or slot_duration <= 0:
+            raise ValueError("Slot duration and granularity must be positive")
+        self.open_minute = open_minute
+        self.close_minute = close_minute
+        self.lunch_start_minute = lunch_start_minute
+        self.lunch_end_minute = lunch_end_minute
+        self.slot_duration = slot_duration
+        self.granularity = granularity
+
+    def sessions(self) -> List[Tuple[int, int]]:
+        """The bookable (start, end) periods of a day: before and after lunch"""
+        if self.lunch_end_minute <= self.lunch_start_minute:
+            return [(self.open_minute, self.close_minute)]
+        return [
+            (self.open_minute, min(self.lunch_start_minute, self.close_minute)),
+            (max(self.lunch_end_minute, self.open_minute), self.close_minute),
+        ]
+
+
+def slot_grid(day: date, hours: OpeningHours, tz: tzinfo) -> List[datetime]:
+    """
+    Generate every slot start of a day, `hours.granularity` minutes apart
+
+    A slot is offered only when the whole `slot_duration` fits inside the
+    morning or afternoon session, so no appointment runs into lunch or past
+    closing. Slots are built from the wall-clock time in `tz`, which keeps
+    them correct across DST changes.
+    """
+    slots = []
+    duration = hours.slot_duration
+    for session_start, session_end in hours.sessions():
+        minute = session_start
+        while minute + duration <= session_end:
+            slots.append(datetime.combine(day, time(minute // 60, minute % 60), tzinfo=tz))
+            minute += hours.granularity
+    return slots
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Merge overlapping or touching busy intervals into a sorted, disjoint list"""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_slots(slots: List[datetime], busy: List[Interval], duration: timedelta) -> List[datetime]:
+    """
+    Return the slots not overlapping any busy interval
+
+    Both inputs must be sorted, and `busy` merged with merge_intervals(). The
+    busy cursor only ever moves forward, so the sweep costs O(slots + busy)
+    instead of checking every slot against every interval.
+    """
+    available = []
+    cursor = 0
+    for slot in slots:
+        slot_end = slot + duration
+        while cursor < len(busy) and busy[cursor][1] <= slot:
+            cursor += 1
+        if cursor == len(busy) or busy[cursor][0] >= slot_end:
+            available.append(slot)
+    return available
+
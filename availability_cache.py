@@ -0,0 +1,204 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Callable, Optional, Tuple, List, Dict
+import threading
+import time
+import os
+
+from metrics import log
+
+AVAILABILITY_CACHE_TTL = float(os.getenv("AVAILABILITY_CACHE_TTL", 30))
+AVAILABILITY_CACHE_STALE = float(os.getenv("AVAILABILITY_CACHE_STALE", 120))
+AVAILABILITY_CACHE_MAX_ENTRIES = int(os.getenv("AVAILABILITY_CACHE_MAX_ENTRIES", 2048))
+AVAILABILITY_CACHE_REFRESH_WORKERS = int(os.getenv("AVAILABILITY_CACHE_REFRESH_WORKERS", 2))
+
+# loader({dentist: days}) -> free slots of each day per dentist, all from one upstream fetch
+BatchLoader = Callable[[Dict[str, List[date]]], Dict[str, Dict[date, List[datetime]]]]
+
+
+class AvailabilityCache:
+    """
+    Free slots per (dentist, business day), kept for a short TTL
+
+    An entry younger than `ttl` seconds is a hit. An entry expired by less
+    than `stale` more seconds is still served, and refreshed in the background
+    so a slow Calendar call never holds up the caller; older entries are
+    misses and are loaded inline, all missing days with one loader call.
+
+    Writes call invalidate() for the dentist and day they touch. A load that
+    was in flight while anything was invalidated is returned to its caller but
+    not stored, so it cannot put back what the write just dropped.
+    """
+
+    def __init__(
+        self,
+        ttl: float = AVAILABILITY_CACHE_TTL,
+        stale: float = AVAILABILITY_CACHE_STALE,
+        max_entries: int = AVAILABILITY_CACHE_MAX_ENTRIES,
+        refresh_workers: int = AVAILABILITY_CACHE_REFRESH_WORKERS
+    ):
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self.refresh_workers = refresh_workers
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, date], Tuple[List[datetime], float]]" = OrderedDict()
+        self._refreshing = set()
+        self._generation = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self._counters = {
+            'hits': 0,
+            'misses': 0,
+            'stale': 0,
+            'refreshes': 0,
+            'refresh_errors': 0,
+            'invalidations': 0,
+        }
+
+    @staticmethod
+    def _dentist_key(dentist: Optional[str]) -> str:
+        return (dentist or "").strip().lower()
+
+    def get_many(
+        self,
+        dentists: List[str],
+        days: List[date],
+        loader: BatchLoader
+    ) -> Dict[str, Dict[date, List[datetime]]]:
+        """
+        Return the free slots of each day for several dentists
+
+        Whatever is missing for any of them is loaded with a single loader
+        call, and stale entries are refreshed together in one background call.
+
+        Returns:
+        - Dict[str, Dict[date, List[datetime]]]: Free slots per lowercased dentist, then per day
+        """
+        dentists = list(dict.fromkeys(self._dentist_key(dentist) for dentist in dentists))
+        if self.ttl <= 0:
+            return loader({dentist: list(days) for dentist in dentists})
+
+        now = time.monotonic()
+        found: Dict[str, Dict[date, List[datetime]]] = {dentist: {} for dentist in dentists}
+        missing: Dict[str, List[date]] = {}
+        refresh: Dict[str, List[date]] = {}
+        with self._lock:
+            for dentist in dentists:
+                for day in days:
+                    key = (dentist, day)
+                    entry = self._entries.get(key)
+                    age = now - entry[1] if entry is not None else None
+                    if age is None or age > self.ttl + self.stale:
+                        missing.setdefault(dentist, []).append(day)
+                        self._counters['misses'] += 1
+                        continue
+                    self._entries.move_to_end(key)
+                    found[dentist][day] = entry[0]
+                    if age > self.ttl:
+                        self._counters['stale'] += 1
+                        if key not in self._refreshing:
+                            self._refreshing.add(key)
+                            refresh.setdefault(dentist, []).append(day)
+                    else:
+                        self._counters['hits'] += 1
+            generation = self._generation
+
+        if refresh:
+            self._get_executor().submit(self._refresh, refresh, loader)
+        if missing:
+            loaded = loader(missing)
+            self._store(loaded, generation)
+            for dentist, slots_by_day in loaded.items():
+                found.setdefault(dentist, {}).update(slots_by_day)
+        return {
+            dentist: {day: found[dentist].get(day, []) for day in days}
+            for dentist in dentists
+        }
+
+    def _store(self, loaded: Dict[str, Dict[date, List[datetime]]], generation: int):
+        stored_at = time.monotonic()
+        with self._lock:
+            if generation != self._generation:
+                return
+            for dentist, slots_by_day in loaded.items():
+                for day, slots in slots_by_day.items():
+                    key = (dentist, day)
+                    self._entries[key] = (slots, stored_at)
+                    self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _refresh(self, wanted: Dict[str, List[date]], loader: BatchLoader):
+        with self._lock:
+            generation = self._generation
+        try:
+            self._store(loader(wanted), generation)
+            with self._lock:
+                self._counters['refreshes'] += 1
+        except Exception as e:
+            with self._lock:
+                self._counters['refresh_errors'] += 1
+            log("availability_cache", f"background refresh for {', '.join(repr(d) for d in wanted)} failed: {str(e)}", level="warning")
+        finally:
+            with self._lock:
+                for dentist, days in wanted.items():
+                    for day in days:
+                        self._refreshing.discard((dentist, day))
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # A forked child inherits the executor but not its threads, so it builds its own
+        if self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.refresh_workers,
+                        thread_name_prefix="availability-refresh")
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def invalidate(self, dentist: Optional[str], day: date):
+        """
+        Drop the cached slots a write to `dentist` on `day` may have changed
+
+        The "any dentist" entry of that day is dropped too. A dentist of None
+        (an event naming no dentist) drops that day for every dentist.
+        """
+        with self._lock:
+            self._generation += 1
+            self._counters['invalidations'] += 1
+            if dentist is None:
+                for key in [key for key in self._entries if key[1] == day]:
+                    del self._entries[key]
+                return
+            self._entries.pop((self._dentist_key(dentist), day), None)
+            self._entries.pop(("", day), None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Counters since start-up plus the current number of entries"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['stale'] + stats['misses']
+        stats['hit_ratio'] = round((stats['hits'] + stats['stale']) / lookups, 4) if lookups else None
+        return stats
+
+
+_cache: Optional[AvailabilityCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_availability_cache() -> AvailabilityCache:
+    """Return the process-wide availability cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AvailabilityCache()
+    return _cache
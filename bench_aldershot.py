@@ -0,0 +1,276 @@
+"""
+Microbenchmarks of the scheduling and parsing hot paths
+
+    python bench_aldershot.py run --sizes 10,1000,50000 --output before.json
+    python bench_aldershot.py compare before.json after.json
+
+`run` times each benchmark on synthetic calendars of the given sizes and
+writes one JSON document; `compare` prints the change per benchmark and
+exits with status 1 when one got slower than --threshold.
+"""
+from datetime import datetime, date, timedelta
+from typing import Callable, Optional, List, Dict
+import statistics
+import subprocess
+import platform
+import argparse
+import random
+import json
+import time
+import sys
+
+from aldershot import (
+    BusinessHours, TORONTO_TZ, get_time_slots, format_time_slots, extract_event_details,
+    validate_appointment_params, partition_busy_intervals, free_slots_by_dentist,
+    create_appointment_description, create_appointment_properties
+)
+from appointment import clear_appointment_cache
+from patient_index import patient_matches
+
+DEFAULT_SIZES = (10, 100, 1000, 10000, 50000)
+DENTISTS = ("Dr. Smith", "Dr. Jones", "Dr. Patel")
+SERVICES = ("Consultation", "Denture Repair", "Reline")
+SCHEMA_VERSION = 1
+
+
+def make_events(count: int, seed: int = 0, start_day: Optional[date] = None, occupancy: float = 1.0) -> List[dict]:
+    """
+    Build a synthetic calendar of `count` appointments
+
+    Appointments fill the business days from `start_day` slot by slot for
+    each dentist in turn, each slot taken with probability `occupancy`. Every
+    other event is a legacy booking that only has the free-text description,
+    so both lookup paths are exercised.
+    """
+    rng = random.Random(seed)
+    hours = BusinessHours.opening_hours()
+    day = start_day or date.today() + timedelta(days=1)
+    events = []
+    while len(events) < count:
+        if day.weekday() < 5:
+            slots = get_time_slots(datetime.combine(day, datetime.min.time()))
+            for slot in slots[::max(1, hours.slot_duration // hours.granularity)]:
+                for dentist in DENTISTS:
+                    if len(events) >= count:
+                        break
+                    if occupancy < 1 and rng.random() >= occupancy:
+                        continue
+                    index = len(events)
+                    name = f"Patient {index}"
+                    phone = f"+1905{rng.randrange(10 ** 7):07d}"
+                    service = SERVICES[index % len(SERVICES)]
+                    event = {
+                        'id': f"evt{index}",
+                        'etag': f'"{seed}-{index}"',
+                        'summary': f"{service} - {name}",
+                        'description': create_appointment_description(name, phone, service, dentist),
+                        'start': {'dateTime': slot.isoformat(), 'timeZone': 'America/Toronto'},
+                        'end': {
+                            'dateTime': (slot + timedelta(minutes=hours.slot_duration)).isoformat(),
+                            'timeZone': 'America/Toronto',
+                        },
+                    }
+                    if index % 2 == 0:
+                        event['extendedProperties'] = {
+                            'private': create_appointment_properties(name, phone, service, dentist)
+                        }
+                    events.append(event)
+        day += timedelta(days=1)
+    return events
+
+
+def measure(function: Callable[[], object], repeat: int = 5, min_time: float = 0.05) -> Dict[str, float]:
+    """
+    Time `function` like timeit: calls are looped until one round takes at
+    least `min_time` seconds, then `repeat` rounds are timed
+
+    Returns:
+    - Dict[str, float]: Seconds per call (min, median, mean), the loops per round and the rounds
+    """
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+    timings = [elapsed / loops]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            function()
+        timings.append((time.perf_counter() - started) / loops)
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'loops': loops,
+        'rounds': len(timings),
+    }
+
+
+def fixed_benchmarks() -> Dict[str, Callable[[], object]]:
+    """Benchmarks whose cost does not depend on the calendar size"""
+    tomorrow = datetime.now(TORONTO_TZ) + timedelta(days=1)
+    days = [tomorrow + timedelta(days=offset) for offset in range(3)]
+    available = {day.strftime("%Y-%m-%d"): get_time_slots(day) for day in days}
+    appointment_date = (tomorrow.replace(hour=10, minute=0, second=0, microsecond=0)).isoformat()
+    return {
+        'get_time_slots': lambda: get_time_slots(tomorrow),
+        'format_time_slots': lambda: format_time_slots(available),
+        'validate_appointment_params': lambda: validate_appointment_params(
+            "Jane Doe", "+19055550100", "Consultation", "Dr. Smith", appointment_date),
+    }
+
+
+def sized_benchmarks(events: List[dict]) -> Dict[str, Callable[[], object]]:
+    """Benchmarks over every event of a synthetic calendar"""
+    dentists = [dentist.lower() for dentist in DENTISTS] + ['']
+    days = sorted({datetime.fromisoformat(event['start']['dateTime']).date() for event in events})
+    wanted = {dentist: days for dentist in dentists}
+    # The patient of the last event, so a matching scan reads the whole calendar
+    target = events[-1]['description']
+    patient_name = target.split("Patient: ", 1)[1].split("\n", 1)[0]
+    patient_phone = target.split("Phone: ", 1)[1].split("\n", 1)[0]
+
+    def decode_cold():
+        clear_appointment_cache()
+        for event in events:
+            extract_event_details(event)
+
+    def decode_warm():
+        for event in events:
+            extract_event_details(event)
+
+    def busy_filtering():
+        busy = partition_busy_intervals(events, dentists)
+        return free_slots_by_dentist(wanted, busy)
+
+    def patient_matching():
+        return [event for event in events if patient_matches(event, patient_name, patient_phone)]
+
+    return {
+        'extract_event_details.cold': decode_cold,
+        'extract_event_details.warm': decode_warm,
+        'busy_slot_filtering': busy_filtering,
+        'patient_matching': patient_matching,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes: List[int], repeat: int = 5, min_time: float = 0.05, only: Optional[str] = None) -> dict:
+    """
+    Run every benchmark (or those whose name contains `only`)
+
+    Returns:
+    - dict: The environment and one result per benchmark and calendar size, in seconds per call
+    """
+    results = []
+
+    def record(name: str, size: Optional[int], function: Callable[[], object]):
+        if only and only not in name:
+            return
+        timing = measure(function, repeat=repeat, min_time=min_time)
+        result = {'name': name, 'size': size, **timing}
+        if size:
+            result['per_event'] = timing['median'] / size
+        results.append(result)
+        label = f"{name}[{size}]" if size else name
+        print(f"{label:<40} {timing['median'] * 1e6:>14.1f} us", file=sys.stderr)
+
+    for name, function in fixed_benchmarks().items():
+        record(name, None, function)
+    for size in sizes:
+        events = make_events(size)
+        for name, function in sized_benchmarks(events).items():
+            record(name, size, function)
+    clear_appointment_cache()
+
+    return {
+        'schema': SCHEMA_VERSION,
+        'created': datetime.now().astimezone().isoformat(timespec="seconds"),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def result_key(result: dict) -> str:
+    return f"{result['name']}[{result['size']}]" if result['size'] else result['name']
+
+
+def compare_results(before: dict, after: dict, threshold: float = 0.10) -> List[dict]:
+    """
+    Compare the median of each benchmark present in both runs
+
+    Returns:
+    - List[dict]: name, before and after seconds, ratio and whether it regressed beyond `threshold`
+    """
+    old = {result_key(result): result for result in before['results']}
+    rows = []
+    for result in after['results']:
+        key = result_key(result)
+        if key not in old:
+            continue
+        ratio = result['median'] / old[key]['median'] if old[key]['median'] else float('inf')
+        rows.append({
+            'name': key,
+            'before': old[key]['median'],
+            'after': result['median'],
+            'ratio': ratio,
+            'regressed': ratio > 1 + threshold,
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the aldershot scheduling and parsing hot paths")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmarks and write JSON results")
+    run.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                     help="comma-separated calendar sizes (default: %(default)s)")
+    run.add_argument("--repeat", type=int, default=5, help="timed rounds per benchmark")
+    run.add_argument("--min-time", type=float, default=0.05, help="minimum seconds per round")
+    run.add_argument("--only", help="run only benchmarks whose name contains this")
+    run.add_argument("--output", "-o", help="write the results here instead of stdout")
+
+    compare = commands.add_parser("compare", help="compare two result files")
+    compare.add_argument("before")
+    compare.add_argument("after")
+    compare.add_argument("--threshold", type=float, default=0.10,
+                         help="slowdown ratio reported as a regression (default: %(default)s)")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+        document = json.dumps(run_benchmarks(sizes, args.repeat, args.min_time, args.only), indent=2)
+        if args.output:
+            with open(args.output, "w") as output:
+                output.write(document + "\n")
+        else:
+            print(document)
+        return 0
+
+    with open(args.before) as before, open(args.after) as after:
+        rows = compare_results(json.load(before), json.load(after), args.threshold)
+    for row in rows:
+        flag = "  REGRESSION" if row['regressed'] else ""
+        print(f"{row['name']:<40} {row['before'] * 1e6:>12.1f} us -> {row['after'] * 1e6:>12.1f} us"
+              f"  x{row['ratio']:.2f}{flag}")
+    return 1 if any(row['regressed'] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
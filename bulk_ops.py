@@ -0,0 +1,100 @@
+from googleapiclient.errors import HttpError
+from typing import Callable, Optional, Tuple, List, Dict
+import time
+import os
+
+from metrics import span
+
+# Google recommends at most 50 calls per Calendar batch request
+BULK_BATCH_SIZE = max(1, min(int(os.getenv("BULK_BATCH_SIZE", 50)), 50))
+BULK_RETRIES = int(os.getenv("BULK_RETRIES", 2))
+BULK_RETRY_DELAY = float(os.getenv("BULK_RETRY_DELAY", 1))
+BULK_MAX_DAYS = int(os.getenv("BULK_MAX_DAYS", 31))
+
+# result of one call: (response, None) or (None, error)
+CallResult = Tuple[Optional[dict], Optional[Exception]]
+
+_RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limiting and server errors are worth another try; anything else is final"""
+    if not isinstance(error, HttpError):
+        return False
+    status = error.resp.status
+    if status == 429 or status >= 500:
+        return True
+    return status == 403 and any(reason in str(error.content) for reason in _RATE_LIMIT_REASONS)
+
+
+def is_gone(error: Optional[Exception]) -> bool:
+    """The event was already deleted (404 Not Found, 410 Gone)"""
+    return isinstance(error, HttpError) and error.resp.status in (404, 410)
+
+
+def execute_batched(
+    service,
+    calls: Dict[str, Callable[[], object]],
+    batch_size: int = BULK_BATCH_SIZE,
+    retries: int = BULK_RETRIES,
+    retry_delay: float = BULK_RETRY_DELAY
+) -> Dict[str, CallResult]:
+    """
+    Run Calendar API calls as batch requests of up to `batch_size` calls each
+
+    Each batch is one HTTP round trip. Calls failing with a rate limit or a
+    server error are batched again, up to `retries` more times with growing
+    delays; other failures are final.
+
+    Parameters:
+    - service: Calendar API service
+    - calls: Factories of the HttpRequests to run, by caller-chosen ID
+
+    Returns:
+    - Dict[str, CallResult]: (response, None) or (None, error) per call ID
+    """
+    results: Dict[str, CallResult] = {}
+    pending = list(calls)
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(retry_delay * attempt)
+        for offset in range(0, len(pending), batch_size):
+            def callback(request_id, response, exception):
+                results[request_id] = (response, exception)
+
+            batch = service.new_batch_http_request(callback=callback)
+            for call_id in pending[offset:offset + batch_size]:
+                batch.add(calls[call_id](), request_id=call_id)
+            try:
+                with span("calendar", "batch"):
+                    batch.execute()
+            except Exception as e:
+                # The whole round trip failed; every call in it shares the error
+                for call_id in pending[offset:offset + batch_size]:
+                    results[call_id] = (None, e)
+
+        pending = [call_id for call_id in pending if results[call_id][1] is not None and is_retryable(results[call_id][1])]
+        if not pending:
+            break
+    return results
+
+
+def delete_events(service, calendar_id: str, event_ids: List[str], **kwargs) -> Dict[str, CallResult]:
+    """Delete events in batches; an event that is already gone counts as deleted"""
+    results = execute_batched(service, {
+        event_id: (lambda event_id=event_id: service.events().delete(calendarId=calendar_id, eventId=event_id))
+        for event_id in event_ids
+    }, **kwargs)
+    return {
+        event_id: (None, None) if is_gone(error) else (response, error)
+        for event_id, (response, error) in results.items()
+    }
+
+
+def patch_events(service, calendar_id: str, bodies: Dict[str, dict], **kwargs) -> Dict[str, CallResult]:
+    """Patch events in batches, sending only the fields in each body so the rest are left untouched"""
+    return execute_batched(service, {
+        event_id: (lambda event_id=event_id, body=body: service.events().patch(
+            calendarId=calendar_id, eventId=event_id, body=body))
+        for event_id, body in bodies.items()
+    }, **kwargs)
@@ -0,0 +1,216 @@
+from googleapiclient.errors import HttpError
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Tuple, List, Dict
+from patient_index import PatientIndex
+from appointment import decode_event
+from event_stream import stream_event_pages
+import bisect
+import threading
+import time
+import os
+
+MIRROR_ENABLED = os.getenv("CALENDAR_MIRROR", "true").lower() in ("1", "true", "yes")
+MIRROR_SYNC_INTERVAL = float(os.getenv("CALENDAR_MIRROR_SYNC_INTERVAL", 30))
+
+
+def event_bounds(event: dict) -> Optional[Tuple[datetime, datetime]]:
+    """
+    Return the (start, end) of an event as aware datetimes
+
+    All-day events only carry a `date`; they are anchored at midnight Toronto time.
+    """
+    return decode_event(event).bounds
+
+
+class CalendarMirror:
+    """
+    In-memory copy of the future events of one calendar
+
+    The first sync downloads the events that have not ended yet, never the
+    calendar's history; afterwards only the changes since the last
+    `nextSyncToken` are fetched. Writes made by the blueprint are applied
+    immediately through upsert()/remove(), and reads are served from an
+    index of (start, event_id) pairs kept sorted by start time.
+    """
+
+    def __init__(self, calendar_id: str, sync_interval: float = MIRROR_SYNC_INTERVAL):
+        self.calendar_id = calendar_id
+        self.sync_interval = sync_interval
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._events: Dict[str, dict] = {}
+        self._bounds: Dict[str, Tuple[datetime, datetime]] = {}
+        self._index: List[Tuple[datetime, str]] = []
+        self._max_duration = timedelta(0)
+        self.patients = PatientIndex()
+        self._sync_token: Optional[str] = None
+        self._last_sync: Optional[float] = None
+
+    @property
+    def is_synced(self) -> bool:
+        return self._last_sync is not None
+
+    def refresh(self, service, force: bool = False):
+        """
+        Sync with Google when the mirror is older than the sync interval
+
+        The first sync blocks every caller until it completes. Later syncs are
+        performed by a single thread; concurrent readers keep using the
+        current contents instead of waiting for it.
+        """
+        if not force and self.is_synced and time.monotonic() - self._last_sync < self.sync_interval:
+            return
+
+        if not self.is_synced:
+            with self._sync_lock:
+                if not self.is_synced:
+                    self.sync(service)
+            return
+
+        if self._sync_lock.acquire(blocking=False):
+            try:
+                self.sync(service)
+            finally:
+                self._sync_lock.release()
+
+    def sync(self, service):
+        """Run an incremental sync, falling back to a full sync when there is no valid token"""
+        if self._sync_token:
+            try:
+                self._incremental_sync(service)
+                return
+            except HttpError as e:
+                # 410 Gone: the sync token expired, start over
+                if e.resp.status != 410:
+                    raise
+        self._full_sync(service)
+
+    def _list_pages(self, service, **params):
+        return stream_event_pages(service, self.calendar_id, singleEvents=True, **params)
+
+    def _full_sync(self, service):
+        events = []
+        sync_token = None
+        # timeMin bounds the end time, so this lists exactly what _upsert_locked keeps
+        for page in self._list_pages(service, timeMin=datetime.now(timezone.utc).isoformat()):
+            events.extend(page.get('items', []))
+            sync_token = page.get('nextSyncToken') or sync_token
+
+        with self._lock:
+            self._events.clear()
+            self._bounds.clear()
+            self._index = []
+            self._max_duration = timedelta(0)
+            self.patients.clear()
+            for event in events:
+                self._upsert_locked(event)
+            self._sync_token = sync_token
+            self._last_sync = time.monotonic()
+
+    def _incremental_sync(self, service):
+        changes = []
+        sync_token = self._sync_token
+        for page in self._list_pages(service, syncToken=self._sync_token, showDeleted=True):
+            changes.extend(page.get('items', []))
+            sync_token = page.get('nextSyncToken') or sync_token
+
+        with self._lock:
+            for event in changes:
+                if event.get('status') == 'cancelled':
+                    self._remove_locked(event['id'])
+                else:
+                    self._upsert_locked(event)
+            self._sync_token = sync_token
+            self._last_sync = time.monotonic()
+
+    def _upsert_locked(self, event: dict):
+        event_id = event.get('id')
+        if not event_id or event.get('status') == 'cancelled':
+            return
+        bounds = event_bounds(event)
+        if bounds is None:
+            return
+        self._remove_locked(event_id)
+
+        # Past events are never read again, so they are not kept
+        if bounds[1] <= datetime.now(timezone.utc):
+            return
+
+        self._events[event_id] = event
+        self._bounds[event_id] = bounds
+        bisect.insort(self._index, (bounds[0], event_id))
+        self.patients.add(event, bounds[0])
+        self._max_duration = max(self._max_duration, bounds[1] - bounds[0])
+
+    def _remove_locked(self, event_id: str):
+        bounds = self._bounds.pop(event_id, None)
+        self._events.pop(event_id, None)
+        self.patients.remove(event_id)
+        if bounds is not None:
+            position = bisect.bisect_left(self._index, (bounds[0], event_id))
+            if position < len(self._index) and self._index[position] == (bounds[0], event_id):
+                del self._index[position]
+
+    def upsert(self, event: dict):
+        """Apply an event we just inserted or updated"""
+        with self._lock:
+            self._upsert_locked(event)
+
+    def remove(self, event_id: str):
+        """Forget an event we just deleted"""
+        with self._lock:
+            self._remove_locked(event_id)
+
+    def get(self, event_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._events.get(event_id)
+
+    def between(self, time_min: datetime, time_max: datetime) -> List[dict]:
+        """
+        Return the events overlapping [time_min, time_max), ordered by start time
+
+        Only events starting at most the longest known duration before
+        `time_min` can still overlap it, so the scan starts there.
+        """
+        with self._lock:
+            low = bisect.bisect_left(self._index, (time_min - self._max_duration, ''))
+            high = bisect.bisect_left(self._index, (time_max, ''))
+            return [
+                self._events[event_id]
+                for start, event_id in self._index[low:high]
+                if self._bounds[event_id][1] > time_min
+            ]
+
+    def find_patient(self, patient_name: str, patient_phone: str, now: Optional[datetime] = None) -> List[dict]:
+        """Return the patient's events that have not ended yet, ordered by start time"""
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            return [
+                self._events[event_id]
+                for event_id, start in self.patients.lookup(patient_name, patient_phone)
+                if event_id in self._events and self._bounds[event_id][1] > now
+            ]
+
+    def upcoming(self, now: Optional[datetime] = None) -> List[dict]:
+        """Return every event that has not ended yet, ordered by start time"""
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            low = bisect.bisect_left(self._index, (now - self._max_duration, ''))
+            return [
+                self._events[event_id]
+                for start, event_id in self._index[low:]
+                if self._bounds[event_id][1] > now
+            ]
+
+
+_mirrors: Dict[str, CalendarMirror] = {}
+_mirrors_lock = threading.Lock()
+
+
+def get_mirror(calendar_id: str) -> CalendarMirror:
+    """Return the process-wide mirror of a calendar"""
+    mirror = _mirrors.get(calendar_id)
+    if mirror is None:
+        with _mirrors_lock:
+            mirror = _mirrors.setdefault(calendar_id, CalendarMirror(calendar_id))
+    return mirror
@@ -0,0 +1,218 @@
+from collections import OrderedDict
+from datetime import datetime
+from flask import request
+from typing import Mapping, Optional, Tuple, List, Dict
+import threading
+import time
+import os
+
+from patient_index import normalize_phone, normalize_name
+
+CALL_CONTEXT_TTL = float(os.getenv("CALL_CONTEXT_TTL", 120))
+CALL_CONTEXT_MAX_ENTRIES = int(os.getenv("CALL_CONTEXT_MAX_ENTRIES", 1000))
+
+CALL_ID_HEADERS = ("X-Vapi-Call-Id",)
+CALL_ID_FIELDS = ("call_id", "callId")
+
+Interval = Tuple[datetime, datetime]
+
+
+class CallContext:
+    """What the earlier tool calls of one conversation looked up"""
+
+    __slots__ = ('patients', 'busy', 'expires_at')
+
+    def __init__(self, expires_at: float):
+        # (phone, name) -> (limit the lookup ran with, events found)
+        self.patients: Dict[Tuple[str, str], Tuple[Optional[int], List[dict]]] = {}
+        # dentist -> (time_min, time_max, busy intervals within that window)
+        self.busy: Dict[str, Tuple[datetime, datetime, List[Interval]]] = {}
+        self.expires_at = expires_at
+
+
+class CallContextCache:
+    """
+    Per-call memory of patient lookups and busy intervals, keyed by Vapi call ID
+
+    A reschedule conversation runs /find_existing, /get_available and
+    /reschedule in turn; with this cache the later tool calls reuse what the
+    earlier ones fetched instead of listing the calendar again. A call's
+    context expires `ttl` seconds after it was created, and past
+    `max_entries` the least recently used calls are dropped first. Writes
+    drop whatever they may have changed in every call's context.
+    """
+
+    def __init__(self, ttl: float = CALL_CONTEXT_TTL, max_entries: int = CALL_CONTEXT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CallContext]" = OrderedDict()
+        self._counters = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+        }
+
+    @staticmethod
+    def _patient_key(patient_name: str, patient_phone: str) -> Tuple[str, str]:
+        return normalize_phone(patient_phone), normalize_name(patient_name)
+
+    def _context_locked(self, call_id: str, create: bool = False) -> Optional[CallContext]:
+        now = time.monotonic()
+        context = self._entries.get(call_id)
+        if context is not None and context.expires_at <= now:
+            del self._entries[call_id]
+            context = None
+        if context is None and create:
+            context = self._entries[call_id] = CallContext(now + self.ttl)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if context is not None:
+            self._entries.move_to_end(call_id)
+        return context
+
+    def _count_locked(self, hit: bool):
+        self._counters['hits' if hit else 'misses'] += 1
+
+    def patient_events(
+        self,
+        call_id: str,
+        patient_name: str,
+        patient_phone: str,
+        limit: Optional[int] = None
+    ) -> Optional[List[dict]]:
+        """
+        Return the patient's events found earlier in the call, or None when they must be looked up
+
+        A lookup limited to N events answers later lookups of at most N
+        events; an unlimited one answers every lookup.
+        """
+        with self._lock:
+            context = self._context_locked(call_id)
+            found = context.patients.get(self._patient_key(patient_name, patient_phone)) if context else None
+            if found is not None:
+                found_limit, events = found
+                if found_limit is None or (limit is not None and limit <= found_limit):
+                    self._count_locked(True)
+                    return events[:limit]
+            self._count_locked(False)
+            return None
+
+    def remember_patient_events(
+        self,
+        call_id: str,
+        patient_name: str,
+        patient_phone: str,
+        limit: Optional[int],
+        events: List[dict]
+    ):
+        with self._lock:
+            context = self._context_locked(call_id, create=True)
+            context.patients[self._patient_key(patient_name, patient_phone)] = (limit, list(events))
+
+    def busy_intervals(
+        self,
+        call_id: str,
+        dentist: str,
+        time_min: datetime,
+        time_max: datetime
+    ) -> Optional[List[Interval]]:
+        """Return a dentist's busy intervals fetched earlier in the call for a window covering [time_min, time_max)"""
+        with self._lock:
+            context = self._context_locked(call_id)
+            found = context.busy.get(dentist) if context else None
+            if found is not None and found[0] <= time_min and found[1] >= time_max:
+                self._count_locked(True)
+                return [interval for interval in found[2] if interval[0] < time_max and interval[1] > time_min]
+            self._count_locked(False)
+            return None
+
+    def remember_busy_intervals(
+        self,
+        call_id: str,
+        busy: Dict[str, List[Interval]],
+        time_min: datetime,
+        time_max: datetime
+    ):
+        """Keep busy intervals per lowercased dentist, fetched for [time_min, time_max)"""
+        with self._lock:
+            context = self._context_locked(call_id, create=True)
+            for dentist, intervals in busy.items():
+                context.busy[dentist] = (time_min, time_max, list(intervals))
+
+    def invalidate(self, patient: Tuple[str, str], dentist: Optional[str], start: datetime, end: datetime):
+        """
+        Drop what a write to an event may have changed, in every call's context
+
+        That is the lookups of the event's patient, a normalized (phone, name)
+        pair, and the busy intervals of its dentist and of "any dentist"
+        overlapping [start, end). A dentist of None (an event naming no
+        dentist) drops the overlapping busy intervals of every dentist.
+        """
+        dentist = dentist.strip().lower() if dentist is not None else None
+        with self._lock:
+            self._counters['invalidations'] += 1
+            for context in self._entries.values():
+                context.patients.pop(patient, None)
+                for key, (time_min, time_max, _) in list(context.busy.items()):
+                    if dentist is not None and key not in (dentist, ""):
+                        continue
+                    if time_min < end and time_max > start:
+                        del context.busy[key]
+
+    def forget(self, call_id: str):
+        with self._lock:
+            self._entries.pop(call_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Counters since start-up plus the current number of calls"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['calls'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+        return stats
+
+
+def request_call_id(data: Optional[dict], headers: Optional[Mapping[str, str]] = None) -> Optional[str]:
+    """
+    Find the Vapi call ID of a tool call request
+
+    Checked in order: the X-Vapi-Call-Id header, the call_id / callId body
+    fields, and message.call.id in a Vapi 'message' envelope.
+
+    Parameters:
+    - data: The JSON body
+    - headers: Case-insensitive request headers; defaults to those of the current Flask request
+    """
+    headers = request.headers if headers is None else headers
+    for header in CALL_ID_HEADERS:
+        if headers.get(header):
+            return headers[header]
+    if not isinstance(data, dict):
+        return None
+    for field in CALL_ID_FIELDS:
+        if data.get(field):
+            return str(data[field])
+    message = data.get('message')
+    if isinstance(message, dict) and isinstance(message.get('call'), dict) and message['call'].get('id'):
+        return str(message['call']['id'])
+    return None
+
+
+_cache: Optional[CallContextCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_call_contexts() -> CallContextCache:
+    """Return the process-wide call context cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CallContextCache()
+    return _cache
@@ -0,0 +1,106 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, Optional
+import contextvars
+import threading
+import os
+
+from metrics import span
+
+PAGE_SIZE = int(os.getenv("CALENDAR_PAGE_SIZE", 250))
+LOOKUP_PAGE_SIZE = int(os.getenv("CALENDAR_LOOKUP_PAGE_SIZE", 50))
+PREFETCH_WORKERS = int(os.getenv("CALENDAR_PREFETCH_WORKERS", 4))
+
+# Only the event fields read by extract_event_details() and the patient/dentist matching
+EVENT_FIELDS = (
+    "id,etag,status,summary,description,location,start,end,created,updated,"
+    "creator/email,organizer/email,extendedProperties,reminders,"
+    "conferenceData(entryPoints/uri,conferenceSolution/name),"
+    "attachments(title,fileUrl),recurrence,colorId"
+)
+LIST_FIELDS = f"nextPageToken,nextSyncToken,items({EVENT_FIELDS})"
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # A forked child inherits the executor but not its threads, so it builds its own
+    global _executor, _executor_pid
+    if _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(
+                    max_workers=PREFETCH_WORKERS,
+                    thread_name_prefix="calendar-prefetch")
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def stream_event_pages(
+    service,
+    calendar_id: str,
+    fields: str = LIST_FIELDS,
+    page_size: int = PAGE_SIZE,
+    prefetch: bool = True,
+    **params
+) -> Iterator[dict]:
+    """
+    Lazily yield the pages of an events().list() call, following nextPageToken
+
+    Parameters:
+    - service: Calendar client; it must not be used for anything else while the
+      stream is open, because a prefetch may be in flight on its transport
+    - calendar_id (str): Calendar to list
+    - fields (str): Partial-response projection applied to every page
+    - page_size (int): maxResults per page
+    - prefetch (bool): Request the next page in the background while the
+      caller processes the current one. Leave it off for lookups that usually
+      stop on the first page, so no extra page is fetched for nothing.
+    - **params: Any other events().list() parameters (timeMin, syncToken, ...)
+
+    Closing the generator (breaking out of a for loop over it) waits for an
+    in-flight prefetch, so the transport is idle again when it returns.
+    """
+    def fetch(page_token: Optional[str]) -> dict:
+        with span("calendar", "events.list"):
+            return service.events().list(
+                calendarId=calendar_id,
+                fields=fields,
+                maxResults=page_size,
+                pageToken=page_token,
+                **params
+            ).execute()
+
+    pending: Optional[Future] = None
+    try:
+        page = fetch(None)
+        while True:
+            page_token = page.get('nextPageToken')
+            if page_token and prefetch:
+                # Run in a copy of the caller's context so the fetch is timed against its request
+                pending = _get_executor().submit(contextvars.copy_context().run, fetch, page_token)
+            yield page
+            if not page_token:
+                break
+            if pending is not None:
+                page, pending = pending.result(), None
+            else:
+                page = fetch(page_token)
+    finally:
+        if pending is not None:
+            pending.cancel()
+            try:
+                pending.result()
+            except Exception:
+                pass
+
+
+def stream_events(service, calendar_id: str, **kwargs) -> Iterator[dict]:
+    """Lazily yield events across every page; see stream_event_pages() for the arguments"""
+    pages = stream_event_pages(service, calendar_id, **kwargs)
+    try:
+        for page in pages:
+            yield from page.get('items', [])
+    finally:
+        pages.close()
@@ -0,0 +1,458 @@
+"""
+Local stand-ins for the Google Calendar, Sheets/Drive and Twilio APIs
+
+    python fake_upstreams.py --port 8099 --events 10000 --latency-ms 80 --error-rate 0.01
+
+One threaded HTTP server answers the Calendar v3 events list/get/insert/
+update/patch/delete and freeBusy calls, the Drive file search and Sheets
+metadata/append calls gspread makes, and Twilio's Messages create. Every call
+waits the configured latency and fails with the configured probability, so
+the blueprint can be load-tested without touching real quotas. Point the app
+at it with the variables printed on start (see FakeUpstreams.env()).
+"""
+from datetime import datetime, timezone, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+from collections import Counter
+from typing import Optional, Tuple, List, Dict
+import threading
+import argparse
+import bisect
+import random
+import time
+import json
+import re
+
+DEFAULT_CALENDAR_ID = "clinic@example.com"
+SPREADSHEET_ID = "fake-spreadsheet"
+
+_EVENTS = re.compile(r"^/calendar/v3/calendars/([^/]+)/events(?:/([^/]+))?$")
+_FREEBUSY = re.compile(r"^/calendar/v3/freeBusy$")
+_DRIVE_FILES = re.compile(r"^/drive/v3/files$")
+_SPREADSHEET = re.compile(r"^/v4/spreadsheets/([^/]+)$")
+_APPEND = re.compile(r"^/v4/spreadsheets/([^/]+)/values/(.+):append$")
+_MESSAGES = re.compile(r"^/2010-04-01/Accounts/([^/]+)/Messages\.json$")
+
+
+class FakeError(Exception):
+    def __init__(self, status: int, payload: dict):
+        super().__init__(status)
+        self.status = status
+        self.payload = payload
+
+
+def google_error(status: int, message: str, reason: str) -> FakeError:
+    return FakeError(status, {'error': {'code': status, 'message': message, 'errors': [{'reason': reason, 'message': message}]}})
+
+
+def parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def format_utc(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class FakeCalendar:
+    """
+    Events of one calendar kept sorted by start time
+
+    Every change gets a sequence number; a sync token is the last sequence
+    number seen, so incremental syncs return exactly the events changed (or
+    deleted) since.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events: Dict[str, dict] = {}
+        self._starts: Dict[str, datetime] = {}
+        self._order: List[Tuple[datetime, str]] = []
+        self._changes: Dict[str, int] = {}
+        self._tombstones: Dict[str, dict] = {}
+        self._sequence = 0
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def _store_locked(self, event: dict) -> dict:
+        event_id = event['id']
+        self._unindex_locked(event_id)
+        self._sequence += 1
+        event['etag'] = f'"{self._sequence}"'
+        event['status'] = 'confirmed'
+        event['updated'] = format_utc(datetime.now(timezone.utc))
+        start = parse_time(event['start']['dateTime'])
+        self._events[event_id] = event
+        self._starts[event_id] = start
+        bisect.insort(self._order, (start, event_id))
+        self._changes[event_id] = self._sequence
+        self._tombstones.pop(event_id, None)
+        return event
+
+    def _unindex_locked(self, event_id: str):
+        start = self._starts.pop(event_id, None)
+        if start is not None:
+            index = bisect.bisect_left(self._order, (start, event_id))
+            del self._order[index]
+        self._events.pop(event_id, None)
+
+    def load(self, events: List[dict]):
+        with self._lock:
+            for event in events:
+                self._store_locked(dict(event))
+
+    def insert(self, event: dict) -> dict:
+        with self._lock:
+            self._next_id += 1
+            event = dict(event, id=event.get('id') or f"fake{self._next_id:08d}")
+            return dict(self._store_locked(event))
+
+    def get(self, event_id: str) -> dict:
+        with self._lock:
+            if event_id in self._tombstones:
+                raise google_error(410, "Resource has been deleted", "deleted")
+            if event_id not in self._events:
+                raise google_error(404, "Not Found", "notFound")
+            return dict(self._events[event_id])
+
+    def update(self, event_id: str, event: dict, merge: bool = False) -> dict:
+        with self._lock:
+            if event_id not in self._events:
+                raise google_error(404, "Not Found", "notFound")
+            if merge:
+                event = {**self._events[event_id], **event}
+            return dict(self._store_locked(dict(event, id=event_id)))
+
+    def delete(self, event_id: str):
+        with self._lock:
+            if event_id in self._tombstones:
+                raise google_error(410, "Resource has been deleted", "deleted")
+            if event_id not in self._events:
+                raise google_error(404, "Not Found", "notFound")
+            self._unindex_locked(event_id)
+            self._sequence += 1
+            self._changes[event_id] = self._sequence
+            self._tombstones[event_id] = {'id': event_id, 'status': 'cancelled'}
+
+    def list(self, params: Dict[str, str]) -> dict:
+        """events.list: timeMin/timeMax, privateExtendedProperty, syncToken and offset page tokens"""
+        page_size = int(params.get('maxResults') or 250)
+        offset = int(params.get('pageToken') or 0)
+        with self._lock:
+            if params.get('syncToken'):
+                since = int(params['syncToken'])
+                if since > self._sequence:
+                    raise google_error(410, "Sync token is no longer valid", "fullSyncRequired")
+                changed = sorted((sequence, event_id) for event_id, sequence in self._changes.items() if sequence > since)
+                matches = [self._events.get(event_id) or self._tombstones[event_id] for _, event_id in changed]
+            else:
+                low = bisect.bisect_left(self._order, (parse_time(params['timeMin']), "")) if params.get('timeMin') else 0
+                high = bisect.bisect_left(self._order, (parse_time(params['timeMax']), "")) if params.get('timeMax') else len(self._order)
+                matches = [self._events[event_id] for _, event_id in self._order[low:high]]
+                if params.get('privateExtendedProperty'):
+                    key, _, value = params['privateExtendedProperty'].partition('=')
+                    matches = [
+                        event for event in matches
+                        if ((event.get('extendedProperties') or {}).get('private') or {}).get(key) == value
+                    ]
+            sequence = self._sequence
+            page = [dict(event) for event in matches[offset:offset + page_size]]
+
+        result = {'kind': 'calendar#events', 'items': page}
+        if offset + page_size < len(matches):
+            result['nextPageToken'] = str(offset + page_size)
+        else:
+            result['nextSyncToken'] = str(sequence)
+        return result
+
+    def busy(self, time_min: datetime, time_max: datetime) -> List[dict]:
+        with self._lock:
+            # Events start at most a day before they end, so a day of look-back finds every overlap
+            low = bisect.bisect_left(self._order, (time_min - timedelta(days=1), ""))
+            high = bisect.bisect_left(self._order, (time_max, ""))
+            busy = []
+            for start, event_id in self._order[low:high]:
+                end = parse_time(self._events[event_id]['end']['dateTime'])
+                if end > time_min:
+                    busy.append({'start': format_utc(max(start, time_min)), 'end': format_utc(min(end, time_max))})
+        return busy
+
+
+class FakeUpstreams:
+    """
+    The fake servers and their data
+
+    Parameters:
+    - events: Appointments generated into `calendar_id` (see load_events())
+    - occupancy: Share of the slots those appointments take
+    - latency: Seconds every call waits before answering, plus up to `jitter` more
+    - error_rate: Probability of answering 503 instead
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        events: int = 1000,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        occupancy: float = 1.0,
+        calendar_id: str = DEFAULT_CALENDAR_ID
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.seed = seed
+        self.occupancy = occupancy
+        self.calendar_id = calendar_id
+        self.calendars: Dict[str, FakeCalendar] = {}
+        self._calendars_lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.calls = Counter()
+        self._calls_lock = threading.Lock()
+        self.appended_rows: List[list] = []
+        self.messages: List[dict] = []
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+        if events:
+            self.load_events(events)
+
+    def load_events(self, count: int):
+        """
+        Add `count` synthetic appointments to the calendar
+
+        This imports the blueprint, which reads its settings from the
+        environment, so an in-process app must have env() applied first.
+        """
+        from bench_aldershot import make_events
+        self.calendar(self.calendar_id).load(make_events(count, seed=self.seed, occupancy=self.occupancy))
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment variables pointing the blueprint at these fakes"""
+        return {
+            'GOOGLE_CALENDAR_API_URL': f"{self.base_url}/calendar/v3",
+            'GOOGLE_SHEETS_API_URL': f"{self.base_url}/v4",
+            'GOOGLE_DRIVE_API_URL': f"{self.base_url}/drive/v3",
+            'TWILIO_BASE_URL': self.base_url,
+            'GOOGLE_ANONYMOUS_CREDENTIALS': "true",
+            'GMAIL_ACCOUNT': self.calendar_id,
+            'SPREAD_SHEET': "Fake Audit Log",
+            'TWILIO_ACCOUNT_SID': "ACfake",
+            'TWILIO_AUTH_TOKEN': "fake",
+            'TWILIO_PHONE_NUMBER': "+15550000000",
+        }
+
+    def calendar(self, calendar_id: str) -> FakeCalendar:
+        with self._calendars_lock:
+            calendar = self.calendars.get(calendar_id)
+            if calendar is None:
+                calendar = self.calendars[calendar_id] = FakeCalendar()
+            return calendar
+
+    def start(self) -> 'FakeUpstreams':
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-upstreams", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        try:
+            self.server.shutdown()
+        finally:
+            self.server.server_close()
+
+    def __enter__(self) -> 'FakeUpstreams':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stats(self) -> dict:
+        with self._calls_lock:
+            calls = dict(self.calls)
+        return {
+            'calls': calls,
+            'events': {calendar_id: len(calendar) for calendar_id, calendar in self.calendars.items()},
+            'appended_rows': len(self.appended_rows),
+            'messages': len(self.messages),
+        }
+
+    def _delay_and_maybe_fail(self, route: str):
+        with self._random_lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+            fail = self._random.random() < self.error_rate
+        with self._calls_lock:
+            self.calls[route] += 1
+        if delay:
+            time.sleep(delay)
+        if fail:
+            if route.startswith("twilio"):
+                raise FakeError(503, {'code': 20503, 'message': "Service unavailable", 'status': 503})
+            raise google_error(503, "Backend Error", "backendError")
+
+    def dispatch(self, method: str, path: str, params: Dict[str, str], body) -> Tuple[int, dict]:
+        """Answer one call; raises FakeError for error responses"""
+        match = _EVENTS.match(path)
+        if match:
+            calendar = self.calendar(unquote(match.group(1)))
+            event_id = unquote(match.group(2)) if match.group(2) else None
+            route = {
+                ('GET', False): "calendar.events.list", ('POST', False): "calendar.events.insert",
+                ('GET', True): "calendar.events.get", ('PUT', True): "calendar.events.update",
+                ('PATCH', True): "calendar.events.patch", ('DELETE', True): "calendar.events.delete",
+            }.get((method, event_id is not None))
+            if route is None:
+                raise google_error(405, "Method not allowed", "methodNotAllowed")
+            self._delay_and_maybe_fail(route)
+            if route == "calendar.events.list":
+                return 200, calendar.list(params)
+            if route == "calendar.events.insert":
+                return 200, calendar.insert(body)
+            if route == "calendar.events.get":
+                return 200, calendar.get(event_id)
+            if route == "calendar.events.delete":
+                calendar.delete(event_id)
+                return 204, None
+            return 200, calendar.update(event_id, body, merge=route == "calendar.events.patch")
+
+        if _FREEBUSY.match(path) and method == 'POST':
+            self._delay_and_maybe_fail("calendar.freebusy")
+            time_min, time_max = parse_time(body['timeMin']), parse_time(body['timeMax'])
+            return 200, {
+                'kind': 'calendar#freeBusy',
+                'timeMin': body['timeMin'],
+                'timeMax': body['timeMax'],
+                'calendars': {
+                    item['id']: {'busy': self.calendar(item['id']).busy(time_min, time_max)}
+                    for item in body.get('items', [])
+                },
+            }
+
+        if _DRIVE_FILES.match(path) and method == 'GET':
+            self._delay_and_maybe_fail("drive.files.list")
+            title = re.search(r"name\s*=\s*(['\"])(.*?)\1", params.get('q', ''))
+            name = title.group(2) if title else "Fake Audit Log"
+            now = format_utc(datetime.now(timezone.utc))
+            return 200, {'files': [{'id': SPREADSHEET_ID, 'name': name, 'createdTime': now, 'modifiedTime': now}]}
+
+        match = _SPREADSHEET.match(path)
+        if match and method == 'GET':
+            self._delay_and_maybe_fail("sheets.get")
+            return 200, {
+                'spreadsheetId': match.group(1),
+                'properties': {'title': "Fake Audit Log", 'locale': 'en_US', 'timeZone': 'America/Toronto'},
+                'sheets': [{'properties': {
+                    'sheetId': 0, 'title': 'Sheet1', 'index': 0, 'sheetType': 'GRID',
+                    'gridProperties': {'rowCount': 1000 + len(self.appended_rows), 'columnCount': 26},
+                }}],
+            }
+
+        match = _APPEND.match(path)
+        if match and method == 'POST':
+            self._delay_and_maybe_fail("sheets.append")
+            rows = body.get('values', [])
+            with self._calls_lock:
+                self.appended_rows.extend(rows)
+            return 200, {
+                'spreadsheetId': match.group(1),
+                'tableRange': unquote(match.group(2)),
+                'updates': {'spreadsheetId': match.group(1), 'updatedRows': len(rows),
+                            'updatedColumns': max((len(row) for row in rows), default=0)},
+            }
+
+        match = _MESSAGES.match(path)
+        if match and method == 'POST':
+            self._delay_and_maybe_fail("twilio.messages.create")
+            now = datetime.now(timezone.utc).strftime("%a, %d %b %Y %H:%M:%S +0000")
+            with self._calls_lock:
+                sid = f"SM{len(self.messages):032x}"
+                message = {
+                    'sid': sid, 'account_sid': match.group(1), 'status': 'queued',
+                    'to': body.get('To'), 'from': body.get('From'), 'body': body.get('Body'),
+                    'date_created': now, 'date_updated': now, 'num_segments': '1', 'direction': 'outbound-api',
+                    'uri': f"/2010-04-01/Accounts/{match.group(1)}/Messages/{sid}.json",
+                }
+                self.messages.append(message)
+            return 201, message
+
+        if path == "/_fake/stats":
+            return 200, self.stats()
+        raise google_error(404, f"No fake for {method} {path}", "notFound")
+
+    def _handler_class(self):
+        upstreams = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self):
+                url = urlsplit(self.path)
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b""
+                if self.headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+                    body = {key: values[-1] for key, values in parse_qs(raw.decode()).items()}
+                else:
+                    body = json.loads(raw) if raw else {}
+                try:
+                    status, payload = upstreams.dispatch(self.command, url.path, params, body)
+                except FakeError as e:
+                    status, payload = e.status, e.payload
+                except Exception as e:
+                    status, payload = 500, {'error': {'code': 500, 'message': str(e)}}
+                data = json.dumps(payload).encode() if payload is not None else b""
+                self.send_response(status)
+                if data:
+                    self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fake Google Calendar, Sheets and Twilio APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--events", type=int, default=1000, help="appointments in the fake calendar")
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay added to every call")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="random extra delay, up to this much")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of calls answered with 503")
+    parser.add_argument("--occupancy", type=float, default=0.5, help="share of the slots taken by the appointments")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--calendar", default=DEFAULT_CALENDAR_ID)
+    args = parser.parse_args()
+
+    upstreams = FakeUpstreams(
+        args.host, args.port, events=args.events,
+        latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate, seed=args.seed, occupancy=args.occupancy, calendar_id=args.calendar)
+    for key, value in upstreams.env().items():
+        print(f"export {key}={value}")
+    print(f"# serving {args.events} events on {upstreams.base_url}; stats at /_fake/stats", flush=True)
+    try:
+        upstreams.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        upstreams.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
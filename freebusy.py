@@ -0,0 +1,111 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Iterable
+import json
+
+from availability import Interval, merge_intervals
+from appointment import parse_iso
+from metrics import span
+
+# The FreeBusy API accepts at most 50 calendars or groups per query
+FREEBUSY_MAX_ITEMS = 50
+
+
+class FreeBusyError(RuntimeError):
+    """Google could not report busy time for a calendar (not found, not shared, ...)"""
+
+
+def parse_calendar_map(value: Optional[str]) -> Dict[str, str]:
+    """
+    Parse DENTIST_CALENDARS, a JSON object of dentist name to calendar or calendar group ID
+
+    e.g. '{"Dr. Smith": "c_abc123@group.calendar.google.com"}'. Names are
+    lowercased to match the dentist names written on events.
+    """
+    if not value:
+        return {}
+    mapping = json.loads(value)
+    if not isinstance(mapping, dict):
+        raise ValueError("DENTIST_CALENDARS must be a JSON object of dentist name to calendar ID")
+    return {str(name).strip().lower(): str(calendar_id) for name, calendar_id in mapping.items()}
+
+
+def parse_busy(entries: Iterable[dict]) -> List[Interval]:
+    """Convert FreeBusy {'start': ..., 'end': ...} entries to aware datetime pairs"""
+    return [(parse_iso(entry['start']), parse_iso(entry['end'])) for entry in entries]
+
+
+def _raise_errors(calendar_id: str, errors: Optional[List[dict]]):
+    if errors:
+        reasons = ", ".join(error.get('reason', 'unknown') for error in errors)
+        raise FreeBusyError(f"FreeBusy unavailable for {calendar_id}: {reasons}")
+
+
+def freebusy_body(calendar_ids: List[str], time_min: datetime, time_max: datetime, time_zone: str) -> dict:
+    """Request body of a freebusy.query call (at most FREEBUSY_MAX_ITEMS calendars)"""
+    return {
+        'timeMin': time_min.isoformat(),
+        'timeMax': time_max.isoformat(),
+        'timeZone': time_zone,
+        'items': [{'id': calendar_id} for calendar_id in calendar_ids],
+    }
+
+
+def busy_from_response(calendar_ids: List[str], response: dict) -> Dict[str, List[Interval]]:
+    """Merged busy intervals per requested calendar or group ID of a freebusy.query response"""
+    calendars = response.get('calendars', {})
+    groups = response.get('groups', {})
+    busy = {}
+    for calendar_id in calendar_ids:
+        if calendar_id in groups:
+            _raise_errors(calendar_id, groups[calendar_id].get('errors'))
+            members = groups[calendar_id].get('calendars', [])
+        else:
+            members = [calendar_id]
+
+        intervals = []
+        for member in members:
+            entry = calendars.get(member, {})
+            _raise_errors(member, entry.get('errors'))
+            intervals.extend(parse_busy(entry.get('busy', [])))
+        busy[calendar_id] = merge_intervals(intervals)
+    return busy
+
+
+def chunk_calendar_ids(calendar_ids: List[str]) -> List[List[str]]:
+    """Split calendar IDs, without duplicates, into chunks one query accepts"""
+    unique_ids = list(dict.fromkeys(calendar_ids))
+    return [unique_ids[offset:offset + FREEBUSY_MAX_ITEMS] for offset in range(0, len(unique_ids), FREEBUSY_MAX_ITEMS)]
+
+
+def query_busy(
+    service,
+    calendar_ids: List[str],
+    time_min: datetime,
+    time_max: datetime,
+    time_zone: str = "America/Toronto"
+) -> Dict[str, List[Interval]]:
+    """
+    Ask Google for the busy periods of calendars or calendar groups
+
+    Only busy intervals travel over the wire, not event bodies. Events marked
+    'free' (transparent) do not count as busy. A group ID yields the union of
+    its member calendars.
+
+    Parameters:
+    - service: Calendar API service
+    - calendar_ids: Calendar or group IDs to query
+    - time_min, time_max: Aware datetimes bounding the query
+
+    Returns:
+    - Dict[str, List[Interval]]: Merged, sorted busy intervals per requested ID
+
+    Raises FreeBusyError when a calendar cannot be read, rather than reporting
+    it as wide open.
+    """
+    busy: Dict[str, List[Interval]] = {}
+    for chunk in chunk_calendar_ids(calendar_ids):
+        with span("calendar", "freebusy.query"):
+            response = service.freebusy().query(
+                body=freebusy_body(chunk, time_min, time_max, time_zone)).execute()
+        busy.update(busy_from_response(chunk, response))
+    return busy
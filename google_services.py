@@ -0,0 +1,358 @@
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Optional, Tuple, List, Dict
+import threading
+import time
+import json
+import os
+
+# The Google client libraries take a few hundred milliseconds to import, so
+# they are imported on first use rather than when the app starts
+if TYPE_CHECKING:
+    import gspread
+
+DISCOVERY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "discovery")
+
+POOL_SIZE = int(os.getenv("GOOGLE_POOL_SIZE", 8))
+POOL_IDLE_TIMEOUT = float(os.getenv("GOOGLE_POOL_IDLE_TIMEOUT", 120))
+POOL_CHECKOUT_TIMEOUT = float(os.getenv("GOOGLE_POOL_CHECKOUT_TIMEOUT", 30))
+HTTP_TIMEOUT = float(os.getenv("GOOGLE_HTTP_TIMEOUT", 30))
+
+DEFAULT_CALENDAR_API_URL = "https://www.googleapis.com/calendar/v3"
+DEFAULT_SHEETS_API_URL = "https://sheets.googleapis.com/v4"
+DEFAULT_DRIVE_API_URL = "https://www.googleapis.com/drive/v3"
+# Point the clients at other servers, e.g. the local stand-ins of fake_upstreams.py
+CALENDAR_API_URL = os.getenv("GOOGLE_CALENDAR_API_URL", DEFAULT_CALENDAR_API_URL).rstrip("/")
+SHEETS_API_URL = os.getenv("GOOGLE_SHEETS_API_URL", DEFAULT_SHEETS_API_URL).rstrip("/")
+DRIVE_API_URL = os.getenv("GOOGLE_DRIVE_API_URL", DEFAULT_DRIVE_API_URL).rstrip("/")
+# Send no credentials at all instead of reading the service account key file
+ANONYMOUS_CREDENTIALS = os.getenv("GOOGLE_ANONYMOUS_CREDENTIALS", "false").lower() in ("1", "true", "yes")
+
+_discovery_documents: Dict[Tuple[str, str], dict] = {}
+_discovery_lock = threading.Lock()
+
+
+def load_discovery_document(service_name: str, version: str) -> dict:
+    """
+    Load a discovery document bundled in the `discovery/` directory
+
+    The document is read and parsed once per process; later calls return the
+    same parsed dictionary, so no request ever touches the discovery endpoint.
+
+    Parameters:
+    - service_name (str): API name, e.g. 'calendar'
+    - version (str): API version, e.g. 'v3'
+
+    Returns:
+    - dict: The parsed discovery document
+    """
+    key = (service_name, version)
+    document = _discovery_documents.get(key)
+    if document is not None:
+        return document
+
+    with _discovery_lock:
+        document = _discovery_documents.get(key)
+        if document is None:
+            path = os.path.join(DISCOVERY_DIR, f"{service_name}.{version}.json")
+            with open(path, "r", encoding="utf-8") as f:
+                document = json.load(f)
+            _discovery_documents[key] = document
+    return document
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled client becomes free within the checkout timeout"""
+
+
+class PooledClient:
+    """A client checked out of a ClientPool; call release() exactly once"""
+
+    __slots__ = ('service', 'http', 'last_used', '_pool')
+
+    def __init__(self, service, http, pool: 'ClientPool'):
+        self.service = service
+        self.http = http
+        self.last_used = time.monotonic()
+        self._pool = pool
+
+    def release(self):
+        self._pool.release(self)
+
+
+class ClientPool:
+    """
+    Bounded pool of API clients, each owning its own keep-alive HTTP transport
+
+    httplib2 connections are not thread-safe, so a client is only ever used by
+    the thread that checked it out. Released clients are reused most-recently
+    used first to keep their TLS connections warm; clients idle for longer than
+    `idle_timeout` seconds are closed instead of being handed out again.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Tuple[object, object]],
+        size: int = POOL_SIZE,
+        idle_timeout: float = POOL_IDLE_TIMEOUT,
+        checkout_timeout: float = POOL_CHECKOUT_TIMEOUT
+    ):
+        self._factory = factory
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle: List[PooledClient] = []
+        self._closed = False
+
+    def acquire(self) -> PooledClient:
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise PoolTimeout(f"No pooled client available after {self.checkout_timeout}s")
+
+        try:
+            now = time.monotonic()
+            stale = []
+            client = None
+            with self._lock:
+                while self._idle:
+                    candidate = self._idle.pop()
+                    if now - candidate.last_used <= self.idle_timeout:
+                        client = candidate
+                        break
+                    stale.append(candidate)
+            for candidate in stale:
+                _close_http(candidate.http)
+
+            if client is None:
+                service, http = self._factory()
+                client = PooledClient(service, http, self)
+            return client
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, client: PooledClient):
+        client.last_used = time.monotonic()
+        with self._lock:
+            if self._closed:
+                _close_http(client.http)
+            else:
+                self._idle.append(client)
+        self._slots.release()
+
+    @contextmanager
+    def checkout(self):
+        """Context manager yielding a client's service object for exclusive use"""
+        client = self.acquire()
+        try:
+            yield client.service
+        finally:
+            client.release()
+
+    def close(self):
+        """Close idle clients; clients still checked out are closed on release"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for client in idle:
+            _close_http(client.http)
+
+
+def bounded_adapter(
+    rewrites: Optional[Dict[str, str]] = None,
+    pool_timeout: float = POOL_CHECKOUT_TIMEOUT,
+    http_timeout: float = HTTP_TIMEOUT,
+    **kwargs
+):
+    """
+    An HTTPAdapter whose blocking pool and requests give up instead of waiting forever
+
+    With pool_block=True urllib3 waits for a free connection with no timeout
+    unless one is passed, and requests never passes one; here a checkout
+    waits at most `pool_timeout` seconds and then raises EmptyPoolError.
+    Requests made without a timeout get `http_timeout`.
+
+    Parameters:
+    - rewrites: Requests under each prefix are sent to its replacement base URL instead
+    - pool_timeout (float): Seconds to wait for a free pooled connection
+    - http_timeout (float): Connect and read timeout of requests that set none
+    """
+    from requests.adapters import HTTPAdapter
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class BoundedHTTPConnectionPool(HTTPConnectionPool):
+        def _get_conn(self, timeout=None):
+            return super()._get_conn(pool_timeout if timeout is None else timeout)
+
+    class BoundedHTTPSConnectionPool(HTTPSConnectionPool):
+        def _get_conn(self, timeout=None):
+            return super()._get_conn(pool_timeout if timeout is None else timeout)
+
+    class BoundedAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **pool_kwargs):
+            super().init_poolmanager(*args, **pool_kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                'http': BoundedHTTPConnectionPool,
+                'https': BoundedHTTPSConnectionPool,
+            }
+
+        def send(self, request, **send_kwargs):
+            for prefix, replacement in (rewrites or {}).items():
+                if request.url.startswith(prefix):
+                    request.url = replacement + request.url[len(prefix):]
+                    break
+            if send_kwargs.get('timeout') is None:
+                send_kwargs['timeout'] = http_timeout
+            return super().send(request, **send_kwargs)
+
+    return BoundedAdapter(**kwargs)
+
+
+def _url_rewrites() -> Dict[str, str]:
+    """The overridden Sheets and Drive base URLs, keyed by the default ones gspread uses"""
+    rewrites = {}
+    if SHEETS_API_URL != DEFAULT_SHEETS_API_URL:
+        rewrites[DEFAULT_SHEETS_API_URL] = SHEETS_API_URL
+    if DRIVE_API_URL != DEFAULT_DRIVE_API_URL:
+        rewrites[DEFAULT_DRIVE_API_URL] = DRIVE_API_URL
+    return rewrites
+
+
+def _close_http(http):
+    try:
+        http.http.close()
+    except Exception:
+        pass
+
+
+class ServiceRegistry:
+    """
+    Process-wide cache of service account credentials and API clients
+
+    Credentials, the pool of Calendar clients and the gspread client are built
+    once and reused until the key file (path, mtime or size) or the requested
+    scopes change, at which point everything is rebuilt on the next access.
+
+    A forked child (a pre-fork server worker) keeps the credentials and their
+    access token but builds its own clients: the connections inherited from
+    the parent are shared with it and must not be used or closed.
+    """
+
+    def __init__(self, pool_size: int = POOL_SIZE, idle_timeout: float = POOL_IDLE_TIMEOUT):
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._credentials = None
+        self._calendar_pool: Optional[ClientPool] = None
+        self._sheets = None
+        self._sheets_last_used = 0.0
+        self._pid = os.getpid()
+
+    @staticmethod
+    def fingerprint(key_file: str, scopes: List[str]) -> tuple:
+        """Identify the key file contents and scopes the clients were built from"""
+        if ANONYMOUS_CREDENTIALS:
+            return ("anonymous", tuple(scopes))
+        path = os.path.abspath(key_file)
+        stat = os.stat(path)
+        return (path, stat.st_mtime_ns, stat.st_size, tuple(scopes))
+
+    def _after_fork(self):
+        # The parent's lock may have been held by another thread at fork time
+        self._lock = threading.Lock()
+        self._calendar_pool = None
+        self._sheets = None
+        self._pid = os.getpid()
+
+    def _ensure_current(self, key_file: str, scopes: List[str]) -> tuple:
+        if self._pid != os.getpid():
+            self._after_fork()
+        fingerprint = self.fingerprint(key_file, scopes)
+        if fingerprint != self._fingerprint:
+            with self._lock:
+                if fingerprint != self._fingerprint:
+                    if ANONYMOUS_CREDENTIALS:
+                        from google.auth.credentials import AnonymousCredentials
+                        self._credentials = AnonymousCredentials()
+                    else:
+                        from google.oauth2 import service_account
+                        self._credentials = service_account.Credentials.from_service_account_file(
+                            key_file, scopes=list(scopes))
+                    self._reset_clients()
+                    self._fingerprint = fingerprint
+        return fingerprint
+
+    def _reset_clients(self):
+        if self._calendar_pool is not None:
+            self._calendar_pool.close()
+        self._calendar_pool = None
+        self._sheets = None
+
+    def credentials(self, key_file: str, scopes: List[str]):
+        self._ensure_current(key_file, scopes)
+        return self._credentials
+
+    @staticmethod
+    def _build_calendar(credentials) -> Tuple[object, object]:
+        from google_auth_httplib2 import AuthorizedHttp
+        from googleapiclient.discovery import build_from_document
+        import httplib2
+
+        http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        client_options = None
+        if CALENDAR_API_URL != DEFAULT_CALENDAR_API_URL:
+            client_options = {'api_endpoint': CALENDAR_API_URL + "/"}
+        service = build_from_document(load_discovery_document("calendar", "v3"), http=http, client_options=client_options)
+        return service, http
+
+    def calendar_pool(self, key_file: str, scopes: List[str]) -> ClientPool:
+        """Return the pool of Calendar v3 clients built from the bundled discovery document"""
+        self._ensure_current(key_file, scopes)
+        pool = self._calendar_pool
+        if pool is None:
+            with self._lock:
+                if self._calendar_pool is None:
+                    credentials = self._credentials
+                    self._calendar_pool = ClientPool(
+                        lambda: self._build_calendar(credentials),
+                        size=self.pool_size,
+                        idle_timeout=self.idle_timeout)
+                pool = self._calendar_pool
+        return pool
+
+    def sheets(self, key_file: str, scopes: List[str]) -> 'gspread.Client':
+        """
+        Return the shared gspread client
+
+        gspread talks through a requests session whose urllib3 connection pool
+        is thread-safe, so one client is shared by every thread. The pool is
+        sized like the Calendar pool and its sockets are dropped once the
+        client has been idle for longer than the idle timeout.
+        """
+        self._ensure_current(key_file, scopes)
+        with self._lock:
+            now = time.monotonic()
+            if self._sheets is None:
+                from google.auth.transport.requests import AuthorizedSession
+                import gspread
+
+                session = AuthorizedSession(self._credentials)
+                adapter = bounded_adapter(
+                    _url_rewrites(), pool_connections=1, pool_maxsize=self.pool_size, pool_block=True)
+                session.mount("https://", adapter)
+                self._sheets = gspread.authorize(self._credentials, session=session)
+            elif now - self._sheets_last_used > self.idle_timeout:
+                self._sheets.http_client.session.close()
+            self._sheets_last_used = now
+            return self._sheets
+
+    def invalidate(self):
+        """Drop every cached credential and client"""
+        with self._lock:
+            self._fingerprint = None
+            self._credentials = None
+            self._reset_clients()
+
+
+registry = ServiceRegistry()
@@ -0,0 +1,41 @@
+"""
+gunicorn settings: `gunicorn app:app` picks this file up from the working directory
+
+With the threaded workers the app is loaded once in the master, which runs
+the fork-safe `prepare` warmup (imports, credentials, access token, calendar
+mirror) in on_starting; each worker then opens its own connections in
+post_worker_init, before it accepts a request. gevent and eventlet patch the
+standard library when the worker starts, so with them the app is loaded in
+every worker instead, after the patching, and runs both stages there.
+WARMUP (see warmup.py) narrows or turns off what runs.
+"""
+import os
+
+# warmup.py is imported inside the hooks only: with gevent it must not load before the patching
+WARMUP = os.getenv("WARMUP", "full").lower()
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 100))
+# Also bounds the connect warmup: a worker silent for longer is killed and replaced
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+preload_app = worker_class not in ("gevent", "eventlet")
+wsgi_app = "app:app"
+
+
+def on_starting(server):
+    if preload_app and WARMUP in ("full", "prepare"):
+        from warmup import warm_up
+
+        warm_up("prepare")
+
+
+def post_worker_init(worker):
+    from warmup import warm_up
+
+    if not preload_app:
+        warm_up(WARMUP)
+    elif WARMUP in ("full", "connect"):
+        warm_up("connect")
@@ -0,0 +1,186 @@
+from collections import OrderedDict
+from functools import wraps
+from flask import request, current_app, Response, jsonify
+from typing import Mapping, Optional, Tuple
+import threading
+import hashlib
+import time
+import json
+import os
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", 3600))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", 10000))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", 60))
+
+KEY_HEADERS = ("Idempotency-Key", "X-Vapi-Tool-Call-Id")
+KEY_FIELDS = ("idempotency_key", "tool_call_id", "toolCallId")
+
+
+class _Entry:
+    __slots__ = ('fingerprint', 'done', 'response', 'expires_at')
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        self.response: Optional[Tuple[bytes, int, str]] = None
+        self.expires_at = float('inf')
+
+
+class IdempotencyStore:
+    """
+    Bounded, expiring record of responses by idempotency key
+
+    The first request with a key runs and its response is kept for `ttl`
+    seconds; repeats get that response back without running again. Repeats
+    arriving while the first is still running wait for its result. Server
+    errors (5xx) are handed to the waiting duplicates but not kept, so a
+    later retry runs again. Past `max_entries` the least recently used
+    completed responses are dropped first.
+    """
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    def begin(self, key: str, fingerprint: str) -> Tuple[_Entry, bool]:
+        """
+        Look up a key, claiming it when it is new or expired
+
+        Returns:
+        - Tuple[_Entry, bool]: The entry, and True when the caller owns it and must run the request
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(key)
+                return entry, False
+            entry = _Entry(fingerprint)
+            self._entries[key] = entry
+            self._evict_locked(now)
+            return entry, True
+
+    def finish(self, key: str, entry: _Entry, response: Optional[Tuple[bytes, int, str]]):
+        """Publish the owner's response to waiters; keep it unless it is missing or a server error"""
+        entry.response = response
+        with self._lock:
+            if response is None or response[1] >= 500:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            else:
+                entry.expires_at = time.monotonic() + self.ttl
+        entry.done.set()
+
+    def _evict_locked(self, now: float):
+        for key in [key for key, entry in self._entries.items() if entry.expires_at <= now]:
+            del self._entries[key]
+        if len(self._entries) <= self.max_entries:
+            return
+        for key in [key for key, entry in self._entries.items() if entry.done.is_set()]:
+            if len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def request_idempotency_key(data: Optional[dict], headers: Optional[Mapping[str, str]] = None) -> Optional[str]:
+    """
+    Find the idempotency key of a request
+
+    Checked in order: the Idempotency-Key and X-Vapi-Tool-Call-Id headers,
+    the idempotency_key / tool_call_id / toolCallId body fields, and the ID
+    of the tool call in a Vapi 'message' envelope.
+
+    Parameters:
+    - data: The JSON body
+    - headers: Case-insensitive request headers; defaults to those of the current Flask request
+    """
+    headers = request.headers if headers is None else headers
+    for header in KEY_HEADERS:
+        if headers.get(header):
+            return headers[header]
+    if not isinstance(data, dict):
+        return None
+    for field in KEY_FIELDS:
+        if data.get(field):
+            return str(data[field])
+    message = data.get('message')
+    if isinstance(message, dict):
+        for calls in (message.get('toolCallList'), message.get('toolCalls')):
+            if calls and isinstance(calls[0], dict) and calls[0].get('id'):
+                return str(calls[0]['id'])
+    return None
+
+
+def request_fingerprint(data: Optional[dict]) -> str:
+    body = {key: value for key, value in (data or {}).items() if key not in KEY_FIELDS and key != 'message'}
+    return hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode()).hexdigest()
+
+
+_store: Optional[IdempotencyStore] = None
+_store_lock = threading.Lock()
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    """Return the process-wide idempotency store"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = IdempotencyStore()
+    return _store
+
+
+def idempotent(view):
+    """
+    Replay the stored response of a view for repeated idempotency keys
+
+    Requests without a key run as before. A key reused with a different
+    request body is rejected with 422. Replayed responses carry an
+    'Idempotent-Replayed: true' header.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        data = request.get_json(silent=True)
+        key = request_idempotency_key(data)
+        if not key:
+            return view(*args, **kwargs)
+
+        store = get_idempotency_store()
+        scoped_key = f"{request.endpoint}:{key}"
+        fingerprint = request_fingerprint(data)
+        entry, owner = store.begin(scoped_key, fingerprint)
+
+        if not owner:
+            if entry.fingerprint != fingerprint:
+                return jsonify({
+                    "status": "error",
+                    "error_code": "IDEMPOTENCY_KEY_REUSED",
+                    "message": "This idempotency key was already used with a different request"
+                }), 422
+            if not entry.done.wait(IDEMPOTENCY_WAIT_TIMEOUT) or entry.response is None:
+                return jsonify({
+                    "status": "error",
+                    "error_code": "REQUEST_IN_PROGRESS",
+                    "message": "The original request with this idempotency key has not finished"
+                }), 409
+            body, status, mimetype = entry.response
+            replay = Response(body, status=status, mimetype=mimetype)
+            replay.headers['Idempotent-Replayed'] = 'true'
+            return replay
+
+        response = None
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+            return response
+        finally:
+            store.finish(scoped_key, entry, (
+                response.get_data(), response.status_code, response.mimetype
+            ) if response is not None else None)
+
+    return wrapper
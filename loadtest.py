@@ -0,0 +1,315 @@
+"""
+Load driver replaying a mix of Vapi tool calls against the aldershot endpoints
+
+    python loadtest.py --in-process --events 10000 --latency-ms 80 --concurrency 16 --duration 30
+    python loadtest.py --url http://localhost:5000/aldershot --concurrency 8 --requests 2000
+
+With --in-process the fake upstreams of fake_upstreams.py and the Flask app
+run in this process, the app pointed at the fakes; otherwise --url must be a
+server already configured that way. Each of --concurrency workers sends one
+call after another (a closed loop) until --duration seconds or --requests
+calls, and the report gives throughput and p50/p95/p99 latency per endpoint.
+"""
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict, deque
+from typing import Optional, Tuple, List, Dict
+import threading
+import argparse
+import random
+import math
+import time
+import uuid
+import json
+import sys
+import os
+
+import requests
+
+DEFAULT_MIX = "get_available=40,find_existing=25,book=15,reschedule=10,cancel=10"
+DENTISTS = ("Dr. Smith", "Dr. Jones", "Dr. Patel", "")
+SERVICES = ("Consultation", "Denture Repair", "Reline")
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parse 'endpoint=weight,...' into positive weights per endpoint"""
+    mix = {}
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        endpoint, _, weight = part.partition("=")
+        mix[endpoint.strip()] = float(weight or 1)
+    if not mix or any(weight < 0 for weight in mix.values()) or not sum(mix.values()):
+        raise ValueError(f"Invalid mix: {value!r}")
+    return mix
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(round(fraction * len(sorted_values), 9)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Patients:
+    """
+    Patients known to have an appointment, shared by the workers
+
+    A patient is checked out for a cancel or reschedule so no two workers act
+    on the same booking; bookings made during the run join the pool.
+    """
+
+    def __init__(self, patients: List[Tuple[str, str]], seed: int = 0):
+        patients = list(patients)
+        random.Random(seed).shuffle(patients)
+        self._lock = threading.Lock()
+        self._available = deque(patients)
+
+    def take(self) -> Optional[Tuple[str, str]]:
+        with self._lock:
+            return self._available.popleft() if self._available else None
+
+    def put(self, patient: Tuple[str, str]):
+        with self._lock:
+            self._available.append(patient)
+
+    def peek(self, rng: random.Random) -> Optional[Tuple[str, str]]:
+        with self._lock:
+            return self._available[rng.randrange(len(self._available))] if self._available else None
+
+
+def appointment_time(rng: random.Random, business_days: int = 10) -> str:
+    """A random on-the-hour weekday slot over the coming business days, in Toronto time"""
+    day = datetime.now().date() + timedelta(days=rng.randint(1, business_days * 7 // 5))
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    hour = rng.choice((9, 10, 11, 13, 14, 15, 16))
+    return f"{day.isoformat()}T{hour:02d}:00:00"
+
+
+class LoadDriver:
+    """Closed-loop workers sending the tool-call mix and recording (endpoint, status, seconds)"""
+
+    def __init__(self, base_url: str, mix: Dict[str, float], patients: Patients, seed: int = 0):
+        self.base_url = base_url.rstrip("/")
+        self.endpoints = list(mix)
+        self.weights = [mix[endpoint] for endpoint in self.endpoints]
+        self.patients = patients
+        self.seed = seed
+        self._booked = 0
+        self._booked_lock = threading.Lock()
+        self.samples: List[Tuple[str, int, float]] = []
+        self._samples_lock = threading.Lock()
+
+    def payload(self, endpoint: str, rng: random.Random) -> Tuple[Optional[dict], Optional[Tuple[str, str]]]:
+        """The JSON body of a call and the patient checked out for it, if any"""
+        if endpoint == 'get_available':
+            return {'dentist': rng.choice(DENTISTS)}, None
+        if endpoint == 'find_existing':
+            patient = self.patients.peek(rng)
+            return (dict(zip(('patient_name', 'patient_phone'), patient)) if patient else None), None
+        if endpoint == 'book':
+            with self._booked_lock:
+                self._booked += 1
+                number = self._booked
+            patient = (f"Load Patient {self.seed}-{number}", f"+1416{(self.seed * 1_000_000 + number) % 10 ** 7:07d}")
+            return {
+                'patient_name': patient[0],
+                'patient_phone': patient[1],
+                'service_type': rng.choice(SERVICES),
+                'dentist': rng.choice(DENTISTS[:-1]),
+                'appointment_date': appointment_time(rng),
+            }, patient
+        patient = self.patients.take()
+        if patient is None:
+            return None, None
+        data = {'patient_name': patient[0], 'patient_phone': patient[1]}
+        if endpoint == 'reschedule':
+            data['appointment_date'] = appointment_time(rng)
+        return data, patient
+
+    def call(self, session: requests.Session, endpoint: str, rng: random.Random) -> Optional[Tuple[int, float]]:
+        data, patient = self.payload(endpoint, rng)
+        if data is None:
+            return None
+        started = time.perf_counter()
+        try:
+            response = session.post(
+                f"{self.base_url}/{endpoint}", json=data,
+                headers={'X-Vapi-Tool-Call-Id': f"call_{uuid.uuid4().hex}"}, timeout=120)
+            status = response.status_code
+        except requests.RequestException:
+            status = 0
+        elapsed = time.perf_counter() - started
+        if patient is not None:
+            if endpoint == 'book':
+                if 200 <= status < 300:
+                    self.patients.put(patient)
+            elif not (endpoint == 'cancel' and 200 <= status < 300):
+                # Rescheduled (or failed to cancel): the patient still has an appointment
+                self.patients.put(patient)
+        return status, elapsed
+
+    def run(self, concurrency: int, duration: Optional[float], total: Optional[int], warmup: float = 0) -> float:
+        """Run the workers; returns the seconds measured (after warm-up)"""
+        remaining = [total]
+        remaining_lock = threading.Lock()
+        started = time.perf_counter()
+        measure_from = started + warmup
+        deadline = measure_from + duration if duration else None
+
+        def worker(index: int):
+            rng = random.Random(self.seed * 1000 + index)
+            with requests.Session() as session:
+                while deadline is None or time.perf_counter() < deadline:
+                    if total is not None:
+                        with remaining_lock:
+                            if remaining[0] <= 0:
+                                return
+                            if time.perf_counter() >= measure_from:
+                                remaining[0] -= 1
+                    endpoint = rng.choices(self.endpoints, self.weights)[0]
+                    sent_at = time.perf_counter()
+                    result = self.call(session, endpoint, rng)
+                    if result is not None and sent_at >= measure_from:
+                        with self._samples_lock:
+                            self.samples.append((endpoint, result[0], result[1]))
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="loadtest") as executor:
+            for future in [executor.submit(worker, index) for index in range(concurrency)]:
+                future.result()
+        return time.perf_counter() - max(started, measure_from)
+
+
+def summarize(samples: List[Tuple[str, int, float]], elapsed: float) -> Dict[str, dict]:
+    """Throughput, status classes and latency percentiles (in ms) per endpoint and overall"""
+    groups = defaultdict(list)
+    for endpoint, status, seconds in samples:
+        groups[endpoint].append((status, seconds))
+        groups['all'].append((status, seconds))
+    report = {}
+    for endpoint, results in sorted(groups.items(), key=lambda item: (item[0] == 'all', item[0])):
+        latencies = sorted(seconds * 1000 for _, seconds in results)
+        statuses = defaultdict(int)
+        for status, _ in results:
+            statuses[str(status)] += 1
+        report[endpoint] = {
+            'requests': len(results),
+            'throughput': len(results) / elapsed if elapsed else 0.0,
+            'ok': sum(1 for status, _ in results if 200 <= status < 300),
+            'client_errors': sum(1 for status, _ in results if 400 <= status < 500),
+            'server_errors': sum(1 for status, _ in results if status >= 500 or status == 0),
+            'statuses': dict(statuses),
+            'p50_ms': percentile(latencies, 0.50),
+            'p95_ms': percentile(latencies, 0.95),
+            'p99_ms': percentile(latencies, 0.99),
+            'max_ms': latencies[-1],
+        }
+    return report
+
+
+def print_report(report: Dict[str, dict], elapsed: float, output=sys.stdout):
+    print(f"{'endpoint':<16}{'reqs':>8}{'req/s':>9}{'ok':>7}{'4xx':>6}{'5xx':>6}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}", file=output)
+    for endpoint, row in report.items():
+        print(f"{endpoint:<16}{row['requests']:>8}{row['throughput']:>9.1f}{row['ok']:>7}"
+              f"{row['client_errors']:>6}{row['server_errors']:>6}{row['p50_ms']:>10.1f}"
+              f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}", file=output)
+    print(f"measured {elapsed:.1f}s", file=output)
+
+
+def start_in_process(args) -> Tuple[str, object, object]:
+    """Start the fakes and the Flask app (pointed at them) on local ports; returns the app's base URL"""
+    from fake_upstreams import FakeUpstreams
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    upstreams = FakeUpstreams(
+        events=0, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate, seed=args.seed, occupancy=args.occupancy).start()
+    # The blueprint reads its settings when imported, so the environment comes first
+    os.environ.update(upstreams.env())
+    os.environ.setdefault("LOG_REQUESTS", "false")
+    upstreams.load_events(args.events)
+
+    from app import app
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, name="loadtest-app", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/aldershot", upstreams, server
+
+
+def stop_in_process(upstreams, server):
+    """
+    Stop what start_in_process started, so the process can exit
+
+    The app server goes first, then the outbox workers and the audit writer
+    (which still flush to the fakes), and the fakes last.
+    """
+    try:
+        server.shutdown()
+        server.server_close()
+        import aldershot
+        aldershot.stop_side_effects()
+    finally:
+        upstreams.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a Vapi tool-call mix against the aldershot endpoints")
+    parser.add_argument("--url", help="base URL of a running blueprint, e.g. http://localhost:5000/aldershot")
+    parser.add_argument("--in-process", action="store_true", help="run the fakes and the app in this process")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint weights (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, help="seconds to measure (default 30 unless --requests)")
+    parser.add_argument("--requests", type=int, help="stop after this many measured calls")
+    parser.add_argument("--warmup", type=float, default=0, help="seconds to run before measuring")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--events", type=int, default=1000, help="appointments in the fake calendar")
+    parser.add_argument("--occupancy", type=float, default=0.5, help="share of the fake calendar's slots taken")
+    parser.add_argument("--latency-ms", type=float, default=0, help="fake upstream latency (--in-process)")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="fake upstream jitter (--in-process)")
+    parser.add_argument("--error-rate", type=float, default=0, help="fake upstream error rate (--in-process)")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+    if not args.url and not args.in_process:
+        parser.error("give --url or --in-process")
+    duration = args.duration if args.duration or args.requests else 30
+
+    upstreams = server = None
+    base_url = args.url
+    if args.in_process:
+        base_url, upstreams, server = start_in_process(args)
+
+    # The calendar's patients, generated exactly as the fakes seeded them
+    from bench_aldershot import make_events
+    from patient_index import patient_identity
+    patients = []
+    for event in make_events(args.events, seed=args.seed, occupancy=args.occupancy):
+        description = event['description']
+        name = description.split("Patient: ", 1)[1].split("\n", 1)[0]
+        patients.append((name, patient_identity(event)[0]))
+
+    driver = LoadDriver(base_url, parse_mix(args.mix), Patients(patients, args.seed), seed=args.seed)
+    try:
+        elapsed = driver.run(args.concurrency, duration, args.requests, args.warmup)
+    finally:
+        if args.in_process:
+            stop_in_process(upstreams, server)
+
+    report = summarize(driver.samples, elapsed)
+    print_report(report, elapsed)
+    if args.json:
+        document = {'config': vars(args), 'elapsed': elapsed, 'endpoints': report}
+        if upstreams is not None:
+            document['upstreams'] = upstreams.stats()
+        with open(args.json, "w") as output:
+            json.dump(document, output, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,282 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from flask import Blueprint, Response, g, request
+from typing import Optional, Tuple, List, Dict
+import threading
+import bisect
+import time
+import uuid
+import json
+import os
+
+# "text" keeps the familiar "@tag: message" lines, "json" writes one JSON object per line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Log one line per request with its status, duration and upstream time
+LOG_REQUESTS = os.getenv("LOG_REQUESTS", "true").lower() in ("1", "true", "yes")
+REQUEST_ID_HEADER = "X-Request-ID"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Endpoint label of work done outside any request (outbox workers, audit flusher, ...)
+BACKGROUND = "background"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter per label set"""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram per label set"""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...], buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> [count per bucket (non-cumulative, +Inf last), sum]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, seconds: float, *label_values: str):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += seconds
+
+    def count(self, *label_values: str) -> int:
+        with self._lock:
+            entry = self._values.get(label_values)
+            return sum(entry[0]) if entry else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((key, list(entry[0]), entry[1]) for key, entry in self._values.items())
+        for label_values, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                bucket = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, bucket)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {repr(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+
+REQUESTS = Counter(
+    "aldershot_requests_total", "Requests served, by endpoint, method and status code",
+    ("endpoint", "method", "status"))
+REQUEST_SECONDS = Histogram(
+    "aldershot_request_duration_seconds", "Time to serve a request, by endpoint",
+    ("endpoint",))
+UPSTREAM_CALLS = Counter(
+    "aldershot_upstream_calls_total", "Calls to Google Calendar, Sheets and Twilio, by outcome",
+    ("endpoint", "upstream", "operation", "outcome"))
+UPSTREAM_SECONDS = Histogram(
+    "aldershot_upstream_duration_seconds", "Latency of calls to Google Calendar, Sheets and Twilio",
+    ("endpoint", "upstream", "operation"))
+METRICS = [REQUESTS, REQUEST_SECONDS, UPSTREAM_CALLS, UPSTREAM_SECONDS]
+
+
+class RequestContext:
+    """The ID, endpoint and upstream spans of the request being served"""
+
+    __slots__ = ('request_id', 'endpoint', 'started', 'spans', '_lock', '_tokens')
+
+    def __init__(self, endpoint: str, request_id: Optional[str] = None):
+        self.request_id = request_id or uuid.uuid4().hex
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        # (upstream, operation) -> [calls, seconds]
+        self.spans: Dict[Tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+        self._tokens = None
+
+    def add_span(self, upstream: str, operation: str, seconds: float):
+        with self._lock:
+            entry = self.spans.setdefault((upstream, operation), [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def upstream_seconds(self) -> float:
+        with self._lock:
+            return sum(seconds for _, seconds in self.spans.values())
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: one metric per upstream operation plus the total, in milliseconds"""
+        with self._lock:
+            spans = sorted(self.spans.items())
+        parts = [
+            f'{upstream}-{operation.replace(".", "-")};dur={seconds * 1000:.1f};desc="{calls} call{"s" if calls != 1 else ""}"'
+            for (upstream, operation), (calls, seconds) in spans
+        ]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestContext]] = ContextVar("aldershot_request", default=None)
+
+
+def current_request() -> Optional[RequestContext]:
+    return _current.get()
+
+
+def current_request_id() -> Optional[str]:
+    context = _current.get()
+    return context.request_id if context is not None else None
+
+
+def start_request(endpoint: str, request_id: Optional[str] = None) -> RequestContext:
+    """Make `endpoint` and a request ID (the caller's, or a new one) current for logs and spans"""
+    context = RequestContext(endpoint, request_id)
+    context._tokens = _current.set(context)
+    return context
+
+
+def finish_request(context: RequestContext, method: str, status: int):
+    """Record the request in the metrics, log it and leave its context"""
+    elapsed = time.perf_counter() - context.started
+    REQUESTS.inc(context.endpoint, method, str(status))
+    REQUEST_SECONDS.observe(elapsed, context.endpoint)
+    if LOG_REQUESTS:
+        log("request", f"{method} {context.endpoint} {status} in {elapsed * 1000:.1f} ms",
+            status=status,
+            duration_ms=round(elapsed * 1000, 1),
+            upstream_ms=round(context.upstream_seconds() * 1000, 1))
+    if context._tokens is not None:
+        try:
+            _current.reset(context._tokens)
+        except ValueError:
+            # Finished from another context (e.g. an ASGI server task); nothing to restore
+            _current.set(None)
+        context._tokens = None
+
+
+@contextmanager
+def span(upstream: str, operation: str):
+    """
+    Time one upstream call
+
+    The duration is added to the latency histogram and call counter of the
+    current endpoint (or "background"), and to the current request's
+    Server-Timing header. Exceptions are counted as errors and re-raised.
+    """
+    context = _current.get()
+    endpoint = context.endpoint if context is not None else BACKGROUND
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - started
+        UPSTREAM_SECONDS.observe(elapsed, endpoint, upstream, operation)
+        UPSTREAM_CALLS.inc(endpoint, upstream, operation, outcome)
+        if context is not None:
+            context.add_span(upstream, operation, elapsed)
+
+
+def log(tag: str, message: str, level: str = "info", **fields):
+    """
+    Write a diagnostic line tagged with the current request ID
+
+    With LOG_FORMAT=json each line is a JSON object carrying the timestamp,
+    level, tag, request ID, endpoint, message and any extra fields.
+    """
+    context = _current.get()
+    if LOG_FORMAT == "json":
+        record = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "level": level,
+            "tag": tag,
+            "request_id": context.request_id if context is not None else None,
+            "endpoint": context.endpoint if context is not None else None,
+            "message": message,
+        }
+        record.update(fields)
+        print(json.dumps(record, default=str), flush=True)
+    elif context is not None:
+        print(f"@{tag} [{context.request_id}]: {message}", flush=True)
+    else:
+        print(f"@{tag}: {message}", flush=True)
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def instrument_blueprint(blueprint: Blueprint):
+    """
+    Give each request of a blueprint an ID, timing and a Server-Timing header
+
+    The ID is taken from the caller's X-Request-ID header when present and
+    echoed back on the response.
+    """
+    @blueprint.before_request
+    def start_request_metrics():
+        g.request_metrics = start_request(request.endpoint or request.path, request.headers.get(REQUEST_ID_HEADER))
+
+    @blueprint.after_request
+    def finish_request_metrics(response: Response) -> Response:
+        context = g.pop('request_metrics', None)
+        if context is not None:
+            response.headers[REQUEST_ID_HEADER] = context.request_id
+            response.headers['Server-Timing'] = context.server_timing()
+            finish_request(context, request.method, response.status_code)
+        return response
+
+    @blueprint.teardown_request
+    def abandon_request_metrics(exc):
+        # after_request does not run when the view raised
+        context = g.pop('request_metrics', None)
+        if context is not None:
+            finish_request(context, request.method, 500)
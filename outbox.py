@@ -0,0 +1,314 @@
+from typing import Any, Callable, Optional, Tuple, List, Dict
+import threading
+import sqlite3
+import random
+import json
+import time
+import os
+
+from metrics import log
+
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "outbox.sqlite3")
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", 2))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+OUTBOX_BASE_DELAY = float(os.getenv("OUTBOX_BASE_DELAY", 2))
+OUTBOX_MAX_DELAY = float(os.getenv("OUTBOX_MAX_DELAY", 600))
+OUTBOX_LEASE = float(os.getenv("OUTBOX_LEASE", 120))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 1))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+
+class PermanentFailure(Exception):
+    """Raised by a handler when retrying can never succeed; the item is dead-lettered at once"""
+
+
+class Outbox:
+    """
+    Durable queue of side effects backed by SQLite
+
+    Request handlers record side effects (audit rows, SMS) in one local
+    transaction and return immediately; background worker threads deliver them
+    through the handler registered for their kind. Failed deliveries are
+    retried with exponential backoff and jitter, and items that fail
+    permanently or exhaust OUTBOX_MAX_ATTEMPTS move to the dead-letter list.
+
+    A claimed item is leased for OUTBOX_LEASE seconds, so an item held by a
+    worker that died is picked up again, possibly by another process sharing
+    the same database file.
+    """
+
+    def __init__(
+        self,
+        path: str = OUTBOX_PATH,
+        workers: int = OUTBOX_WORKERS,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        base_delay: float = OUTBOX_BASE_DELAY,
+        max_delay: float = OUTBOX_MAX_DELAY,
+        lease: float = OUTBOX_LEASE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL
+    ):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._handlers: Dict[str, Tuple[Callable[[Any], Any], int, float]] = {}
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._started_pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must stay in the thread (and process) that opened them
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = self._connect()
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def register(self, kind: str, handler: Callable[[Any], Any], batch_size: int = 1, max_wait: float = 0):
+        """
+        Register the function delivering items of `kind`
+
+        With the default batch_size of 1 the handler receives one decoded
+        payload. With a larger batch_size it receives a list of up to that many
+        payloads claimed together, and they succeed or fail as a unit.
+
+        With `max_wait`, new items are held back until `batch_size` of them
+        are pending or the oldest has waited `max_wait` seconds, so a steady
+        trickle is delivered in full batches instead of one item at a time.
+        """
+        self._handlers[kind] = (handler, batch_size, max_wait)
+
+    def enqueue(self, items: List[Tuple[str, dict]]) -> List[int]:
+        """
+        Record side effects in a single transaction and wake the workers
+
+        Parameters:
+        - items: (kind, payload) pairs; payloads must be JSON serializable
+
+        Returns:
+        - List[int]: The IDs of the new outbox rows
+        """
+        now = time.time()
+        connection = self._connection
+        ids = []
+        held = set()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for kind, payload in items:
+                _, batch_size, max_wait = self._handlers.get(kind, (None, 1, 0))
+                if max_wait > 0 and batch_size > 1:
+                    held.add(kind)
+                cursor = connection.execute(
+                    "INSERT INTO outbox (kind, payload, next_attempt_at, created_at) VALUES (?, ?, ?, ?)",
+                    (kind, json.dumps(payload), now + (max_wait if kind in held else 0), now))
+                ids.append(cursor.lastrowid)
+            for kind in held:
+                self._release_full_batch(connection, kind, now)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+        self.start()
+        self._wakeup.set()
+        return ids
+
+    def _release_full_batch(self, connection: sqlite3.Connection, kind: str, now: float):
+        """Make held items of `kind` due at once when a full batch of them is waiting"""
+        batch_size = self._handlers[kind][1]
+        waiting = connection.execute(
+            "SELECT COUNT(*) FROM outbox WHERE status = 'pending' AND kind = ? AND attempts = 0 "
+            "AND next_attempt_at > ?",
+            (kind, now)).fetchone()[0]
+        if waiting >= batch_size:
+            connection.execute(
+                "UPDATE outbox SET next_attempt_at = ? WHERE status = 'pending' AND kind = ? AND attempts = 0 "
+                "AND next_attempt_at > ?",
+                (now, kind, now))
+
+    def _claim(self) -> List[sqlite3.Row]:
+        now = time.time()
+        connection = self._connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            rows = connection.execute(
+                "SELECT * FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at, id LIMIT 1",
+                (now,)).fetchall()
+            if rows:
+                kind = rows[0]['kind']
+                batch_size = self._handlers.get(kind, (None, 1, 0))[1]
+                if batch_size > 1:
+                    # Items still held back for batching ride along with the due one
+                    rows += connection.execute(
+                        "SELECT * FROM outbox WHERE status = 'pending' AND (next_attempt_at <= ? OR attempts = 0) "
+                        "AND kind = ? AND id != ? ORDER BY next_attempt_at, id LIMIT ?",
+                        (now, kind, rows[0]['id'], batch_size - 1)).fetchall()
+                connection.executemany(
+                    "UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ? WHERE id = ?",
+                    [(now + self.lease, row['id']) for row in rows])
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return rows
+
+    def backoff(self, attempts: int) -> float:
+        """Delay before the next attempt: exponential in `attempts`, capped, with up to 20% jitter"""
+        delay = min(self.max_delay, self.base_delay * (2 ** max(attempts - 1, 0)))
+        return delay * random.uniform(0.8, 1.0)
+
+    def process_one(self) -> bool:
+        """
+        Deliver the next due item, or batch of items for kinds registered with a batch size
+
+        Returns:
+        - bool: False when nothing was due
+        """
+        rows = self._claim()
+        if not rows:
+            return False
+
+        kind = rows[0]['kind']
+        ids = [(row['id'],) for row in rows]
+        connection = self._connection
+        try:
+            handler, batch_size, _ = self._handlers.get(kind, (None, 1, 0))
+            if handler is None:
+                raise PermanentFailure(f"No handler registered for '{kind}'")
+            payloads = [json.loads(row['payload']) for row in rows]
+            handler(payloads if batch_size > 1 else payloads[0])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            for row in rows:
+                attempts = row['attempts'] + 1
+                if isinstance(e, PermanentFailure) or attempts >= self.max_attempts:
+                    connection.execute(
+                        "UPDATE outbox SET status = 'dead', last_error = ? WHERE id = ?",
+                        (error, row['id']))
+                    log("outbox", f"{kind} #{row['id']} dead-lettered after {attempts} attempts: {error}", level="warning")
+                else:
+                    connection.execute(
+                        "UPDATE outbox SET next_attempt_at = ?, last_error = ? WHERE id = ?",
+                        (time.time() + self.backoff(attempts), error, row['id']))
+            return True
+
+        connection.executemany("DELETE FROM outbox WHERE id = ?", ids)
+        return True
+
+    def drain(self) -> int:
+        """Deliver every item that is currently due; returns how many were processed"""
+        processed = 0
+        while self.process_one():
+            processed += 1
+        return processed
+
+    def _worker(self):
+        while not self._stopping.is_set():
+            try:
+                if self.process_one():
+                    continue
+            except Exception as e:
+                log("outbox", f"worker error: {str(e)}", level="error")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def start(self):
+        """Start the worker threads once per process (again in a forked child)"""
+        if self.workers <= 0 or self._started_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._started_pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._worker, name=f"outbox-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._started_pid = os.getpid()
+
+    def stop(self, timeout: float = 5):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._started_pid = None
+
+    def pending_count(self) -> int:
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+
+    def dead_letters(self, limit: int = 100) -> List[dict]:
+        """Return the most recent dead-lettered items, newest first"""
+        rows = self._connection.execute(
+            "SELECT id, kind, payload, attempts, last_error, created_at FROM outbox "
+            "WHERE status = 'dead' ORDER BY id DESC LIMIT ?",
+            (limit,)).fetchall()
+        return [
+            {
+                'id': row['id'],
+                'kind': row['kind'],
+                'payload': json.loads(row['payload']),
+                'attempts': row['attempts'],
+                'last_error': row['last_error'],
+                'created_at': row['created_at'],
+            }
+            for row in rows
+        ]
+
+    def retry_dead_letter(self, item_id: int) -> bool:
+        """Move a dead-lettered item back to the queue with a fresh attempt budget"""
+        cursor = self._connection.execute(
+            "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ? "
+            "WHERE id = ? AND status = 'dead'",
+            (time.time(), item_id))
+        if cursor.rowcount:
+            self.start()
+            self._wakeup.set()
+        return bool(cursor.rowcount)
+
+
+_outbox: Optional[Outbox] = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    """Return the process-wide outbox"""
+    global _outbox
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                _outbox = Outbox()
+    return _outbox
@@ -0,0 +1,149 @@
+from datetime import datetime
+from typing import Optional, Tuple, List, Dict
+import threading
+import unicodedata
+import re
+
+_NON_DIGITS = re.compile(r"\D")
+_NAME_JUNK = re.compile(r"[^\w\s'-]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_phone(phone: Optional[str]) -> str:
+    """
+    Normalize a phone number to E.164
+
+    Separators are dropped and North American numbers written without a
+    country code get '+1' (e.g. '(905) 555-0100' -> '+19055550100').
+    Returns an empty string when the input contains no digits.
+    """
+    if not phone:
+        return ""
+    phone = phone.strip()
+    digits = _NON_DIGITS.sub("", phone)
+    if not digits:
+        return ""
+    if not phone.startswith('+'):
+        if len(digits) == 10:
+            digits = "1" + digits
+    return "+" + digits
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Case-fold a patient name and collapse punctuation and whitespace"""
+    if not name:
+        return ""
+    name = unicodedata.normalize("NFKC", name).casefold()
+    name = _NAME_JUNK.sub(" ", name)
+    return _WHITESPACE.sub(" ", name).strip()
+
+
+def parse_description_fields(description: str) -> Dict[str, str]:
+    """Read the 'Key: value' lines written by create_appointment_description()"""
+    fields = {}
+    for line in (description or "").split('\n'):
+        if ':' not in line:
+            continue
+        key, value = line.split(':', 1)
+        key = key.strip().lower()
+        if key and key not in fields:
+            fields[key] = value.strip()
+    return fields
+
+
+def private_properties(event: dict) -> Dict[str, str]:
+    """Return the event's private extendedProperties (empty for events booked before they were written)"""
+    return (event.get('extendedProperties') or {}).get('private') or {}
+
+
+def patient_identity(event: dict) -> Tuple[str, str]:
+    """
+    Return the normalized (phone, name) of the patient an event was booked for
+
+    The structured extendedProperties written by /book are preferred; older
+    events fall back to the lines of the free-text description.
+    """
+    properties = private_properties(event)
+    if properties.get('phone'):
+        return normalize_phone(properties['phone']), normalize_name(properties.get('patient_name'))
+
+    fields = parse_description_fields(event.get('description', ''))
+    name = fields.get('patient') or fields.get('patient name') or ''
+    phone = fields.get('phone') or ''
+    return normalize_phone(phone), normalize_name(name)
+
+
+def event_dentist(event: dict) -> Optional[str]:
+    """Return the lowercase dentist of an event, or None when it names no dentist"""
+    properties = private_properties(event)
+    if 'dentist' in properties:
+        return properties['dentist']
+
+    fields = parse_description_fields(event.get('description', ''))
+    if 'dentist' not in fields:
+        return None
+    return fields['dentist'].strip().lower()
+
+
+def patient_matches(event: dict, patient_name: str, patient_phone: str) -> bool:
+    """Exact comparison of normalized phone and name, so 'Ann' no longer matches 'Joanne'"""
+    phone, name = patient_identity(event)
+    return bool(phone) and phone == normalize_phone(patient_phone) and name == normalize_name(patient_name)
+
+
+class PatientIndex:
+    """
+    Map of normalized (phone, name) to the event IDs and start times booked for that patient
+
+    Lookups are a single dictionary access. The index is updated together
+    with the calendar mirror, so every insert, move or delete the blueprint
+    makes is reflected immediately.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], Dict[str, datetime]] = {}
+        self._keys: Dict[str, Tuple[str, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, event: dict, start: datetime):
+        """Index an event, replacing any previous entry for the same event ID"""
+        event_id = event.get('id')
+        if not event_id:
+            return
+        key = patient_identity(event)
+        with self._lock:
+            self._discard_locked(event_id)
+            if not key[0]:
+                return
+            self._entries.setdefault(key, {})[event_id] = start
+            self._keys[event_id] = key
+
+    def remove(self, event_id: str):
+        with self._lock:
+            self._discard_locked(event_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys.clear()
+
+    def _discard_locked(self, event_id: str):
+        key = self._keys.pop(event_id, None)
+        if key is None:
+            return
+        entries = self._entries.get(key)
+        if entries is not None:
+            entries.pop(event_id, None)
+            if not entries:
+                del self._entries[key]
+
+    def lookup(self, patient_name: str, patient_phone: str) -> List[Tuple[str, datetime]]:
+        """Return the (event_id, start) pairs booked for a patient, ordered by start time"""
+        key = (normalize_phone(patient_phone), normalize_name(patient_name))
+        with self._lock:
+            entries = list(self._entries.get(key, {}).items())
+        entries.sort(key=lambda entry: entry[1])
+        return entries
@@ -0,0 +1,247 @@
+from collections import Counter
+from datetime import datetime, timezone
+from flask import Flask, Blueprint, Response, g, request
+from typing import Optional, Union, List
+import cProfile
+import threading
+import tracemalloc
+import random
+import time
+import uuid
+import sys
+import os
+import re
+
+from metrics import REQUEST_ID_HEADER, current_request_id, log
+
+# "off", "sample" (profile PROFILE_SAMPLE_RATE of requests) or "slow" (keep profiles of requests
+# slower than PROFILE_SLOW_SECONDS)
+PROFILE_MODE = os.getenv("PROFILE_MODE", "off").lower()
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.01))
+PROFILE_SLOW_SECONDS = float(os.getenv("PROFILE_SLOW_SECONDS", 2))
+# "collapsed" samples stacks every PROFILE_INTERVAL seconds; "pstats" traces every call with cProfile
+PROFILE_FORMAT = os.getenv("PROFILE_FORMAT", "collapsed").lower()
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))
+PROFILE_TRACEMALLOC = os.getenv("PROFILE_TRACEMALLOC", "false").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 200))
+PROFILE_MAX_BYTES = int(os.getenv("PROFILE_MAX_BYTES", 50 * 1024 * 1024))
+
+_UNSAFE_NAME = re.compile(r"[^\w.-]+")
+
+
+def collapse_stack(frame) -> str:
+    """One line of the collapsed-stack format: outermost frame first, separated by ';'"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """
+    Background thread counting the stacks of registered threads
+
+    Every `interval` seconds it reads the current frame of each thread being
+    profiled (sys._current_frames) and counts its collapsed stack. Nothing is
+    traced between samples, so the profiled code runs at full speed; the
+    thread sleeps while no thread is registered.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self._condition = threading.Condition()
+        self._targets = {}
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def add(self, thread_id: int) -> Counter:
+        """Start sampling a thread; returns the stack counts that fill up while it runs"""
+        counts = Counter()
+        with self._condition:
+            self._targets[thread_id] = counts
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return counts
+
+    def remove(self, thread_id: int):
+        with self._condition:
+            self._targets.pop(thread_id, None)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            with self._condition:
+                while not self._targets:
+                    self._condition.wait()
+                targets = list(self._targets.items())
+            frames = sys._current_frames()
+            for thread_id, counts in targets:
+                frame = frames.get(thread_id)
+                if frame is not None and thread_id != own_id:
+                    counts[collapse_stack(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+_sampler: Optional[StackSampler] = None
+_sampler_lock = threading.Lock()
+
+
+def get_stack_sampler() -> StackSampler:
+    """Return the process-wide stack sampler"""
+    global _sampler
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                _sampler = StackSampler()
+    return _sampler
+
+
+class ProfileSession:
+    """The profile of one request, from start() until stop()"""
+
+    def __init__(self, profile_format: str = PROFILE_FORMAT, trace_memory: bool = PROFILE_TRACEMALLOC):
+        self.profile_format = profile_format
+        self.trace_memory = trace_memory
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self.elapsed: Optional[float] = None
+        self.stacks: Optional[Counter] = None
+        self.profiler: Optional[cProfile.Profile] = None
+        self.memory_before = None
+        self.memory_after = None
+
+    def start(self) -> 'ProfileSession':
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self.memory_before = tracemalloc.take_snapshot()
+        if self.profile_format == "pstats":
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.stacks = get_stack_sampler().add(self.thread_id)
+        self.started = time.perf_counter()
+        return self
+
+    def stop(self) -> float:
+        self.elapsed = time.perf_counter() - self.started
+        if self.profiler is not None:
+            self.profiler.disable()
+        else:
+            get_stack_sampler().remove(self.thread_id)
+        if self.memory_before is not None:
+            self.memory_after = tracemalloc.take_snapshot()
+        return self.elapsed
+
+    def write(self, directory: str, endpoint: str, request_id: str) -> List[str]:
+        """
+        Write the profile (and the allocation diff) into `directory`
+
+        Files are named <UTC time>-<endpoint>-<request ID>-<ms>ms.<ext>, so they
+        sort by time and can be matched with the request logs.
+        """
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%fZ")
+        base = os.path.join(directory, _UNSAFE_NAME.sub("_", f"{stamp}-{endpoint}-{request_id}-{self.elapsed * 1000:.0f}ms"))
+        paths = []
+        if self.profiler is not None:
+            paths.append(base + ".pstats")
+            self.profiler.dump_stats(paths[-1])
+        else:
+            paths.append(base + ".collapsed")
+            with open(paths[-1], "w") as output:
+                for stack, count in self.stacks.most_common():
+                    output.write(f"{stack} {count}\n")
+        if self.memory_after is not None:
+            paths.append(base + ".tracemalloc.txt")
+            with open(paths[-1], "w") as output:
+                # Allocations of every thread during the request, largest growth first
+                for stat in self.memory_after.compare_to(self.memory_before, "lineno")[:50]:
+                    output.write(f"{stat}\n")
+        return paths
+
+
+def prune_profiles(directory: str, max_files: int = PROFILE_MAX_FILES, max_bytes: int = PROFILE_MAX_BYTES) -> int:
+    """Delete the oldest profiles until at most `max_files` files and `max_bytes` bytes remain"""
+    try:
+        entries = [entry for entry in os.scandir(directory) if entry.is_file()]
+    except FileNotFoundError:
+        return 0
+    entries.sort(key=lambda entry: entry.name)
+    total = sum(entry.stat().st_size for entry in entries)
+    removed = 0
+    while entries and (len(entries) > max_files or total > max_bytes):
+        oldest = entries.pop(0)
+        total -= oldest.stat().st_size
+        try:
+            os.remove(oldest.path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def should_profile(mode: str = None, sample_rate: float = None) -> bool:
+    mode = PROFILE_MODE if mode is None else mode
+    if mode == "slow":
+        return True
+    if mode == "sample":
+        return random.random() < (PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate)
+    return False
+
+
+def should_keep(elapsed: float, mode: str = None) -> bool:
+    mode = PROFILE_MODE if mode is None else mode
+    return mode == "sample" or (mode == "slow" and elapsed >= PROFILE_SLOW_SECONDS)
+
+
+def install_profiler(target: Union[Flask, Blueprint]):
+    """
+    Profile requests of an app or blueprint according to PROFILE_MODE
+
+    Installing on both the app and a blueprint it registers is harmless: the
+    first hook to run decides for the request, so it is sampled once at
+    PROFILE_SAMPLE_RATE and profiled at most once. With PROFILE_MODE=off the
+    hooks return immediately.
+    """
+    @target.before_request
+    def start_profile():
+        if PROFILE_MODE == "off" or 'profile_decided' in g:
+            return
+        g.profile_decided = True
+        if should_profile():
+            g.profile_session = ProfileSession().start()
+
+    def finish_profile(response: Optional[Response]):
+        session = g.pop('profile_session', None)
+        if session is None:
+            return
+        elapsed = session.stop()
+        if not should_keep(elapsed):
+            return
+        request_id = (response.headers.get(REQUEST_ID_HEADER) if response is not None else None) \
+            or current_request_id() or uuid.uuid4().hex
+        try:
+            paths = session.write(PROFILE_DIR, request.endpoint or "unknown", request_id)
+            prune_profiles(PROFILE_DIR)
+            log("profile", f"{request.endpoint} took {elapsed * 1000:.0f} ms, profile written to {paths[0]}",
+                duration_ms=round(elapsed * 1000, 1), files=paths)
+        except OSError as e:
+            log("profile", f"could not write profile: {str(e)}", level="warning")
+
+    @target.after_request
+    def write_profile(response: Response) -> Response:
+        finish_profile(response)
+        return response
+
+    @target.teardown_request
+    def abandon_profile(exc):
+        # after_request does not run when the view raised
+        finish_profile(None)
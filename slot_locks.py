@@ -0,0 +1,120 @@
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, Tuple, List, Dict
+import threading
+import os
+
+SLOT_LOCK_TIMEOUT = float(os.getenv("SLOT_LOCK_TIMEOUT", 30))
+
+
+class SlotLockTimeout(Exception):
+    """Another booking held an overlapping slot for longer than the lock timeout"""
+
+
+class SlotLocks:
+    """
+    Fine-grained locks on (dentist, grid cell) pairs
+
+    Time is cut into cells of `cell_minutes`. Reserving an appointment locks
+    every cell it touches for that dentist, so two bookings block each other
+    only when they overlap for the same dentist; everything else proceeds in
+    parallel. Cells are always locked in sorted order, which rules out
+    deadlocks between bookings spanning several cells. Locks are dropped from
+    the table as soon as nobody holds or waits for them.
+
+    The locks only order bookings within one process; book() verifies the
+    calendar after inserting to catch races with other processes.
+    """
+
+    def __init__(self, cell_minutes: int, timeout: float = SLOT_LOCK_TIMEOUT):
+        if cell_minutes <= 0:
+            raise ValueError("Cell size must be positive")
+        self.cell_seconds = cell_minutes * 60
+        self.timeout = timeout
+        self._table_lock = threading.Lock()
+        self._locks: Dict[Tuple[str, int], List] = {}
+
+    def cells(self, dentist: str, start: datetime, end: datetime) -> List[Tuple[str, int]]:
+        """Return the sorted (dentist, cell) keys covering [start, end)"""
+        dentist = (dentist or "").strip().lower()
+        first = int(start.timestamp() // self.cell_seconds)
+        last = int((end.timestamp() - 1e-6) // self.cell_seconds) if end > start else first
+        return [(dentist, cell) for cell in range(first, last + 1)]
+
+    def _checkout(self, key: Tuple[str, int]) -> threading.Lock:
+        with self._table_lock:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+            return entry[0]
+
+    def _checkin(self, key: Tuple[str, int]):
+        with self._table_lock:
+            entry = self._locks[key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    @contextmanager
+    def reserve(self, dentist: str, start: datetime, end: datetime, timeout: Optional[float] = None):
+        """
+        Hold the dentist's cells covering [start, end) for the duration of the block
+
+        Raises SlotLockTimeout when they cannot all be taken within `timeout` seconds.
+        """
+        with self.reserve_many(dentist, [(start, end)], timeout):
+            yield
+
+    @contextmanager
+    def reserve_many(self, dentist: str, intervals: List[Tuple[datetime, datetime]], timeout: Optional[float] = None):
+        """
+        Hold the dentist's cells covering every [start, end) interval for the duration of the block
+
+        The cells of all the intervals are taken together in sorted order, so
+        a bulk move holding many slots cannot deadlock with single bookings.
+        Raises SlotLockTimeout when they cannot all be taken within `timeout` seconds.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        keys = sorted({key for start, end in intervals for key in self.cells(dentist, start, end)})
+        held = []
+        try:
+            for key in keys:
+                lock = self._checkout(key)
+                if not lock.acquire(timeout=timeout):
+                    self._checkin(key)
+                    start = min(start for start, _ in intervals)
+                    raise SlotLockTimeout(f"Slot {start.isoformat()} for '{dentist}' is being booked by another call")
+                held.append((key, lock))
+            yield
+        finally:
+            for key, lock in reversed(held):
+                lock.release()
+                self._checkin(key)
+
+    def __len__(self) -> int:
+        with self._table_lock:
+            return len(self._locks)
+
+
+_slot_locks: Optional[SlotLocks] = None
+_slot_locks_lock = threading.Lock()
+
+
+def get_slot_locks(cell_minutes: int) -> SlotLocks:
+    """
+    Return the process-wide slot locks
+
+    Every booking path must share one grid, otherwise bookings on different
+    grids would not exclude each other, so asking for another cell size than
+    the first caller did raises ValueError.
+    """
+    global _slot_locks
+    if _slot_locks is None:
+        with _slot_locks_lock:
+            if _slot_locks is None:
+                _slot_locks = SlotLocks(cell_minutes)
+    if _slot_locks.cell_seconds != cell_minutes * 60:
+        raise ValueError(
+            f"Slot locks use {_slot_locks.cell_seconds // 60} minute cells, not {cell_minutes}")
+    return _slot_locks
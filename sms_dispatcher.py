@@ -0,0 +1,158 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Optional, Tuple, Dict
+import contextvars
+import threading
+import time
+import os
+
+from metrics import span
+
+# twilio is imported when the first client is built, not when the app starts
+if TYPE_CHECKING:
+    from twilio.rest import Client
+
+SMS_WORKERS = int(os.getenv("SMS_WORKERS", 4))
+SMS_RATE_PER_SECOND = float(os.getenv("SMS_RATE_PER_SECOND", 1))
+SMS_DEDUPE_WINDOW = float(os.getenv("SMS_DEDUPE_WINDOW", 300))
+SMS_HTTP_TIMEOUT = float(os.getenv("SMS_HTTP_TIMEOUT", 15))
+DEFAULT_TWILIO_BASE_URL = "https://api.twilio.com"
+# Point the client at another server, e.g. the local stand-in of fake_upstreams.py
+TWILIO_BASE_URL = os.getenv("TWILIO_BASE_URL", DEFAULT_TWILIO_BASE_URL).rstrip("/")
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second with bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def build_twilio_client(account_sid: str, auth_token: str, pool_size: int = SMS_WORKERS) -> 'Client':
+    """Build a Twilio client whose keep-alive session has room for every dispatcher worker"""
+    from twilio.rest import Client
+    from twilio.http.http_client import TwilioHttpClient
+    from requests.adapters import HTTPAdapter
+
+    http_client = TwilioHttpClient(pool_connections=True, timeout=SMS_HTTP_TIMEOUT)
+    http_client.session.mount("https://", HTTPAdapter(pool_maxsize=pool_size))
+    client = Client(account_sid, auth_token, http_client=http_client)
+    if TWILIO_BASE_URL != DEFAULT_TWILIO_BASE_URL:
+        client.api.base_url = TWILIO_BASE_URL
+    return client
+
+
+class SmsDispatcher:
+    """
+    Sends SMS through one shared Twilio client from a bounded worker pool
+
+    Sends are spaced by a token-bucket rate limit (Twilio long codes accept
+    about one message per second). The same body sent to the same number
+    within `dedupe_window` seconds returns the first send's handle instead of
+    sending again; failed sends are forgotten so that a retry really resends.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], 'Client'],
+        workers: int = SMS_WORKERS,
+        rate_per_second: float = SMS_RATE_PER_SECOND,
+        dedupe_window: float = SMS_DEDUPE_WINDOW
+    ):
+        self._client_factory = client_factory
+        self._client: Optional['Client'] = None
+        self._client_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sms-dispatcher")
+        self._limiter = RateLimiter(rate_per_second)
+        self.dedupe_window = dedupe_window
+        self._recent: Dict[Tuple[str, str, str], Tuple[float, Future]] = {}
+        self._recent_lock = threading.Lock()
+
+    def client(self) -> 'Client':
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._client_factory()
+        return self._client
+
+    def send(self, to_number: str, message_body: str, from_number: str) -> Future:
+        """
+        Queue an SMS
+
+        Returns:
+        - Future: Resolves to the result dict of send_sms_notification(); it can be
+          waited on with .result() or simply ignored
+        """
+        key = (to_number, from_number, message_body)
+        now = time.monotonic()
+        with self._recent_lock:
+            for recent_key, (sent_at, _) in list(self._recent.items()):
+                if now - sent_at > self.dedupe_window:
+                    del self._recent[recent_key]
+            recent = self._recent.get(key)
+            if recent is not None:
+                return recent[1]
+            # Run in a copy of the caller's context so the send is timed against its request
+            future = self._executor.submit(contextvars.copy_context().run, self._send_once, key)
+            self._recent[key] = (now, future)
+        return future
+
+    def _send_once(self, key: Tuple[str, str, str]) -> dict:
+        to_number, from_number, message_body = key
+        result = self._send(to_number, message_body, from_number)
+        if not result['success']:
+            # Forget the failure before the handle resolves, so a retry really resends
+            with self._recent_lock:
+                self._recent.pop(key, None)
+        return result
+
+    def _send(self, to_number: str, message_body: str, from_number: str) -> dict:
+        from twilio.base.exceptions import TwilioRestException
+
+        self._limiter.acquire()
+        try:
+            client = self.client()
+            with span("twilio", "messages.create"):
+                message = client.messages.create(
+                    body=message_body,
+                    from_=from_number,
+                    to=to_number
+                )
+            return {
+                'success': True,
+                'message': 'SMS sent successfully',
+                'sid': message.sid
+            }
+        except TwilioRestException as e:
+            return {
+                'success': False,
+                'message': f'Twilio error: {str(e)}',
+                'error_code': e.code
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Unexpected error: {str(e)}',
+                'error_code': 'UNKNOWN_ERROR'
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
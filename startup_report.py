@@ -0,0 +1,149 @@
+"""
+Cold-start report: what `import app` costs and how long a new process takes to answer
+
+    python startup_report.py imports --top 20
+    python startup_report.py first-response --runs 5 --target-ms 1000
+
+`imports` runs `python -X importtime -c "import app"` in a fresh interpreter
+and lists the slowest modules (cumulative and self time). `first-response`
+starts the app in new processes, pointed at the local fakes of
+fake_upstreams.py, and times process start to the first answered
+/get_available call, exiting with status 1 when the median misses the target.
+It also prints the latency of the first and second call once the process
+serves; with the warmup they should be about the same.
+"""
+from typing import Optional, List, Dict
+import subprocess
+import statistics
+import argparse
+import json
+import time
+import sys
+import os
+
+import requests
+
+# Process start to first /get_available response, median over the runs, including the
+# warmup of warmup.py; about 550 ms on a developer laptop (300 ms with WARMUP=off)
+FIRST_RESPONSE_TARGET_MS = float(os.getenv("FIRST_RESPONSE_TARGET_MS", 1000))
+
+_SERVE = """
+from werkzeug.serving import make_server
+from app import app
+from warmup import warm_up
+warm_up()
+server = make_server("127.0.0.1", 0, app, threaded=True)
+print(server.server_port, flush=True)
+server.serve_forever()
+"""
+
+
+def parse_importtime(output: str) -> List[Dict[str, object]]:
+    """
+    Parse the stderr of `python -X importtime`
+
+    Returns:
+    - List[dict]: module, depth, self_us and cumulative_us per imported module, in import order
+    """
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.append({
+            'module': name.strip(),
+            'depth': (len(name) - len(name.lstrip())) // 2,
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us),
+        })
+    return modules
+
+
+def import_report(module: str = "app", python: str = sys.executable) -> List[Dict[str, object]]:
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def time_first_response(env: Dict[str, str], path: str, payload: dict, timeout: float = 60) -> Dict[str, float]:
+    """
+    Spawn an app process and call `path` on it twice
+
+    Returns:
+    - Dict[str, float]: Seconds from spawning to the first answer ('total'), and the
+      latency of the first ('first') and of the second ('second') call once it serves
+    """
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-c", _SERVE], env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        # The warmup logs to stdout before the port is printed
+        port = ""
+        while not port.isdigit():
+            line = process.stdout.readline()
+            if not line:
+                raise RuntimeError("the app process exited before serving")
+            port = line.strip()
+        timings = {}
+        for call in ("first", "second"):
+            call_started = time.perf_counter()
+            response = requests.post(f"http://127.0.0.1:{port}{path}", json=payload, timeout=timeout)
+            timings[call] = time.perf_counter() - call_started
+            if call == "first":
+                timings['total'] = time.perf_counter() - started
+            if response.status_code >= 500:
+                raise RuntimeError(f"{path} answered {response.status_code}: {response.text[:200]}")
+        return timings
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure the cold start of the app")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    imports = commands.add_parser("imports", help="list the slowest imports of `import app`")
+    imports.add_argument("--module", default="app")
+    imports.add_argument("--top", type=int, default=20)
+    imports.add_argument("--json", action="store_true", help="print every module as JSON")
+
+    first = commands.add_parser("first-response", help="time process start to the first response")
+    first.add_argument("--runs", type=int, default=3)
+    first.add_argument("--path", default="/aldershot/get_available")
+    first.add_argument("--events", type=int, default=200, help="appointments in the fake calendar")
+    first.add_argument("--target-ms", type=float, default=FIRST_RESPONSE_TARGET_MS)
+
+    args = parser.parse_args(argv)
+    if args.command == "imports":
+        modules = import_report(args.module)
+        if args.json:
+            print(json.dumps(modules, indent=2))
+            return 0
+        total = max((entry['cumulative_us'] for entry in modules if entry['module'] == args.module), default=0)
+        print(f"import {args.module}: {total / 1000:.1f} ms ({len(modules)} modules)")
+        print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+        for entry in sorted(modules, key=lambda entry: -entry['cumulative_us'])[:args.top]:
+            print(f"{entry['cumulative_us'] / 1000:>14.1f}{entry['self_us'] / 1000:>10.1f}  {'  ' * entry['depth']}{entry['module']}")
+        return 0
+
+    from fake_upstreams import FakeUpstreams
+    with FakeUpstreams(events=0) as upstreams:
+        env = dict(os.environ, **upstreams.env(), LOG_REQUESTS="false")
+        upstreams.load_events(args.events)
+        runs = [time_first_response(env, args.path, {'dentist': ''}) for _ in range(args.runs)]
+    timings = [run['total'] * 1000 for run in runs]
+    median = statistics.median(timings)
+    print(f"process start to first {args.path}: median {median:.0f} ms "
+          f"(runs: {', '.join(f'{timing:.0f}' for timing in timings)}; target {args.target_ms:.0f} ms)")
+    print(f"first call once serving: median {statistics.median(run['first'] for run in runs) * 1000:.0f} ms, "
+          f"second call: median {statistics.median(run['second'] for run in runs) * 1000:.0f} ms")
+    return 0 if median <= args.target_ms else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,6 +4,8 @@ from datetime import datetime, timedelta
 import pytz
 from flask import Flask
 import json
+import threading
+import time
 
 from aldershot import asbp, BusinessHours, format_time_slots
 
@@ -150,7 +152,7 @@ class TestAldershotEndpoints(unittest.TestCase):
         
         mock_service = MagicMock()
         mock_service.events().list().execute.return_value = mock_events_result
-        mock_service.events().update().execute.return_value = {'id': 'test_event_id'}
+        mock_service.events().patch().execute.return_value = {'id': 'test_event_id'}
         mock_calendar_service.return_value = mock_service
 
         reschedule_data = {
@@ -230,5 +232,366 @@ class TestAldershotEndpoints(unittest.TestCase):
         self.assertEqual(data['status'], 'error')
         self.assertIn('outside business hours', data['message'].lower())
 
+class TestFormatTimeSlots(unittest.TestCase):
+    @patch.object(BusinessHours, 'SLOT_DURATION', 30)
+    def test_half_hour_boundaries_keep_their_minutes(self):
+        toronto_tz = pytz.timezone('America/Toronto')
+        monday = toronto_tz.localize(datetime(2025, 3, 3, 9, 30))
+        tuesday = toronto_tz.localize(datetime(2025, 3, 4, 12, 30))
+        result = format_time_slots({
+            monday.date(): [monday, monday.replace(hour=11, minute=0)],
+            tuesday.date(): [tuesday, tuesday.replace(hour=16, minute=0)],
+        })
+        self.assertEqual(result, "Monday 9:30 am ~ 11:30 am, Tuesday 12:30 pm ~ 4:30 pm")
+
+
+class TestAvailabilityBatch(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.register_blueprint(asbp)
+        self.client = self.app.test_client()
+
+    def _event(self, dentist, start):
+        return {
+            'id': f"{dentist}-{start.isoformat()}",
+            'description': f"Dentist: {dentist}",
+            'start': {'dateTime': start.isoformat()},
+            'end': {'dateTime': (start + timedelta(hours=1)).isoformat()}
+        }
+
+    @patch('aldershot.calendar_mirror.MIRROR_ENABLED', False)
+    @patch('aldershot.get_calendar_service')
+    def test_batch_partitions_one_listing_per_dentist(self, mock_calendar_service):
+        from availability_cache import AvailabilityCache
+        import aldershot
+
+        now = datetime.now(aldershot.TORONTO_TZ)
+        day = aldershot.requested_business_days({'days': 2}, now)[-1]
+        nine = datetime.combine(day, datetime.min.time(), tzinfo=aldershot.TORONTO_TZ) + timedelta(hours=9)
+        ten = nine + timedelta(hours=1)
+
+        mock_service = MagicMock()
+        mock_service.events.return_value.list.return_value.execute.return_value = {
+            'items': [self._event('Robert', nine), self._event('Alice', ten)]
+        }
+        mock_calendar_service.return_value = mock_service
+
+        with patch('aldershot.get_availability_cache', return_value=AvailabilityCache(ttl=0)):
+            response = self.client.post('/get_available_batch', json={'dentists': ['Robert', 'Alice'], 'days': 2})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        label = day.strftime("%A, %B %d, %Y")
+        self.assertNotIn("09:00 AM", data['dentists']['Robert'][label])
+        self.assertIn("10:00 AM", data['dentists']['Robert'][label])
+        self.assertIn("09:00 AM", data['dentists']['Alice'][label])
+        self.assertNotIn("10:00 AM", data['dentists']['Alice'][label])
+        self.assertIn("09:00 AM", data['any_dentist'][label])
+        self.assertIn("10:00 AM", data['any_dentist'][label])
+        self.assertEqual(mock_service.events.return_value.list.call_count, 1)
+
+    @patch('aldershot.get_calendar_service')
+    def test_malformed_dates_are_rejected(self, mock_calendar_service):
+        for path, body in (
+            ('/get_available', {'dentist': 'Robert', 'start_date': 'next tuesday'}),
+            ('/get_available_batch', {'dentists': ['Robert'], 'end_date': '2025-13-45'}),
+        ):
+            response = self.client.post(path, json=body)
+            self.assertEqual(response.status_code, 400)
+            data = response.get_json()
+            self.assertEqual(data['status'], 'error')
+            self.assertIn('must be a date', data['message'])
+        mock_calendar_service.assert_not_called()
+
+class FakeCalendar:
+    """Thread-safe in-memory stand-in for the events collection, slow enough to race"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = {}
+        self.counter = 0
+        self.batches = []
+
+    def _request(self, result):
+        request = MagicMock()
+        request.execute.side_effect = result
+        return request
+
+    def events(self):
+        calendar = self
+
+        class Events:
+            def list(self, **params):
+                def result():
+                    with calendar.lock:
+                        return {'items': list(calendar.items.values())}
+                return calendar._request(result)
+
+            def insert(self, calendarId, body):
+                def result():
+                    time.sleep(0.02)
+                    with calendar.lock:
+                        calendar.counter += 1
+                        event = dict(body, id=f"evt{calendar.counter}", created=f"2025-01-01T00:00:{calendar.counter:02d}Z")
+                        calendar.items[event['id']] = event
+                        return event
+                return calendar._request(result)
+
+            def delete(self, calendarId, eventId):
+                def result():
+                    with calendar.lock:
+                        calendar.items.pop(eventId, None)
+                return calendar._request(result)
+
+            def patch(self, calendarId, eventId, body):
+                def result():
+                    with calendar.lock:
+                        calendar.items[eventId] = dict(calendar.items[eventId], **body)
+                        return calendar.items[eventId]
+                return calendar._request(result)
+
+        return Events()
+
+    def new_batch_http_request(self, callback):
+        calendar = self
+        requests = []
+
+        class Batch:
+            def add(self, request, request_id):
+                requests.append((request_id, request))
+
+            def execute(self):
+                calendar.batches.append([request_id for request_id, _ in requests])
+                for request_id, request in requests:
+                    try:
+                        callback(request_id, request.execute(), None)
+                    except Exception as e:
+                        callback(request_id, None, e)
+
+        return Batch()
+
+
+class TestSlotReservation(unittest.TestCase):
+    def setUp(self):
+        import aldershot
+        self.app = Flask(__name__)
+        self.app.register_blueprint(asbp)
+        day = aldershot.requested_business_days({'days': 2}, datetime.now(aldershot.TORONTO_TZ))[-1]
+        self.appointment = f"{day.isoformat()}T10:00:00"
+        self.calendar = FakeCalendar()
+        patches = [
+            patch('aldershot.calendar_mirror.MIRROR_ENABLED', False),
+            patch('aldershot.get_calendar_service', return_value=self.calendar),
+            patch('aldershot.record_side_effects'),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def book(self, patient_phone):
+        with self.app.test_client() as client:
+            return client.post('/book', json={
+                'patient_name': 'Test Patient',
+                'patient_phone': patient_phone,
+                'service_type': 'Consultation',
+                'dentist': 'Robert',
+                'appointment_date': self.appointment
+            })
+
+    def test_taken_slot_returns_structured_conflict(self):
+        self.assertEqual(self.book('+12345678900').status_code, 200)
+        response = self.book('+12345678901')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()['error_code'], 'SLOT_CONFLICT')
+        self.assertEqual(len(self.calendar.items), 1)
+
+    def test_concurrent_bookings_of_one_slot_book_it_once(self):
+        responses = []
+        threads = [
+            threading.Thread(target=lambda phone=phone: responses.append(self.book(phone).status_code))
+            for phone in ('+12345678900', '+12345678901', '+12345678902')
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(responses), [200, 409, 409])
+        self.assertEqual(len(self.calendar.items), 1)
+
+    def test_booking_racing_another_process_backs_out(self):
+        rival = {
+            'id': 'rival',
+            'created': '2024-12-31T23:59:59Z',
+            'description': 'Dentist: Robert',
+            'start': {'dateTime': self.appointment, 'timeZone': 'America/Toronto'},
+            'end': {'dateTime': f"{self.appointment[:11]}11:00:00", 'timeZone': 'America/Toronto'},
+        }
+        original_events = self.calendar.events
+
+        def events_with_rival():
+            events = original_events()
+            insert = events.insert
+
+            def racing_insert(calendarId, body):
+                self.calendar.items['rival'] = rival
+                return insert(calendarId, body)
+
+            events.insert = racing_insert
+            return events
+
+        self.calendar.events = events_with_rival
+        response = self.book('+12345678900')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(list(self.calendar.items), ['rival'])
+
+class TestBulkCancel(unittest.TestCase):
+    def setUp(self):
+        import aldershot
+        self.app = Flask(__name__)
+        self.app.register_blueprint(asbp)
+        self.day = aldershot.requested_business_days({'days': 2}, datetime.now(aldershot.TORONTO_TZ))[-1]
+        self.calendar = FakeCalendar()
+        for hour, dentist, phone in ((9, 'Robert', '+12345678900'), (10, 'Robert', '+12345678901'), (11, 'Anna', '+12345678902')):
+            event = aldershot.build_appointment_event(
+                'Test Patient', phone, 'Consultation', dentist,
+                datetime.combine(self.day, datetime.min.time(), tzinfo=aldershot.TORONTO_TZ).replace(hour=hour),
+                datetime.combine(self.day, datetime.min.time(), tzinfo=aldershot.TORONTO_TZ).replace(hour=hour + 1))
+            self.calendar.items[phone] = dict(event, id=phone, created='2025-01-02T00:00:00Z')
+        self.audit_writer = MagicMock()
+        self.outbox = MagicMock()
+        self.sms = []
+
+        def dispatch_sms(to_number, message_body, from_number=None):
+            self.sms.append(to_number)
+            return aldershot.completed_future({'success': True, 'message': 'SMS sent successfully', 'sid': 'SM1'})
+
+        patches = [
+            patch('aldershot.calendar_mirror.MIRROR_ENABLED', False),
+            patch('aldershot.get_calendar_service', return_value=self.calendar),
+            patch('aldershot.get_audit_writer', return_value=self.audit_writer),
+            patch('aldershot.dispatch_sms', side_effect=dispatch_sms),
+            patch('aldershot.get_side_effect_outbox', return_value=self.outbox),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post(self, **body):
+        with self.app.test_client() as client:
+            return client.post('/bulk_cancel', json=dict({'dentist': 'Robert', 'start_date': self.day.isoformat()}, **body))
+
+    def test_cancels_the_dentists_day_in_one_batch(self):
+        response = self.post()
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['summary'], {'cancelled': 2})
+        self.assertEqual(list(self.calendar.items), ['+12345678902'])
+        self.assertEqual(self.calendar.batches, [['+12345678900', '+12345678901']])
+        # The SMS are queued in the outbox instead of being waited for
+        self.assertEqual([outcome['sms'] for outcome in data['appointments']], ['queued', 'queued'])
+        queued = self.outbox.enqueue.call_args[0][0]
+        self.assertEqual(sorted(payload['to'] for kind, payload in queued if kind == 'sms'), ['+12345678900', '+12345678901'])
+        self.assertEqual(self.sms, [])
+        rows = self.audit_writer.write_rows.call_args[0][0]
+        self.assertEqual([row[0] for row in rows], ['@Cancel', '@Cancel'])
+
+    def test_dry_run_changes_nothing(self):
+        data = self.post(dry_run=True).get_json()
+        self.assertEqual(data['summary'], {'would_cancel': 2})
+        self.assertEqual(len(self.calendar.items), 3)
+        self.assertEqual(self.sms, [])
+
+    def test_move_refuses_weekends(self):
+        self.calendar.items['+12345678900']['attendees'] = [{'email': 'patient@example.com'}]
+        data = self.post(shift_days=7, notify=False).get_json()
+        self.assertEqual(data['summary'], {'moved': 2})
+        moved = self.calendar.items['+12345678900']
+        self.assertIn((self.day + timedelta(days=7)).isoformat(), moved['start']['dateTime'])
+        # Only the times are sent, so fields the listing did not fetch survive the move
+        self.assertEqual(moved['attendees'], [{'email': 'patient@example.com'}])
+        self.outbox.enqueue.assert_not_called()
+
+        to_saturday = 5 - self.day.weekday()
+        data = self.post(start_date=(self.day + timedelta(days=7)).isoformat(), shift_days=to_saturday).get_json()
+        self.assertEqual(data['bulk_status'], 'partial')
+        self.assertEqual(data['summary'], {'failed': 2})
+
+    def test_move_waits_for_the_target_slot_locks(self):
+        """A target slot held by a booking in progress is refused instead of being taken"""
+        import aldershot
+        from slot_locks import SlotLocks
+
+        locks = SlotLocks(aldershot.BusinessHours.SLOT_GRANULARITY, timeout=0.05)
+        target = datetime.combine(self.day + timedelta(days=7), datetime.min.time(), tzinfo=aldershot.TORONTO_TZ)
+        with patch('aldershot.get_slot_locks', return_value=locks):
+            with locks.reserve('Robert', target.replace(hour=10), target.replace(hour=11)):
+                data = self.post(shift_days=7, notify=False).get_json()
+        self.assertEqual(data['summary'], {'failed': 2})
+        self.assertIn("being booked", data['appointments'][0]['error'])
+        self.assertEqual(self.calendar.batches, [])
+        self.assertEqual(len(locks), 0)
+
+    def test_move_losing_a_race_is_moved_back(self):
+        """A target booked by another process during the move goes to the earlier booking"""
+        import aldershot
+
+        rival = aldershot.build_appointment_event(
+            'Other Patient', '+12345678999', 'Consultation', 'Robert',
+            datetime.combine(self.day + timedelta(days=7), datetime.min.time(), tzinfo=aldershot.TORONTO_TZ).replace(hour=9),
+            datetime.combine(self.day + timedelta(days=7), datetime.min.time(), tzinfo=aldershot.TORONTO_TZ).replace(hour=10))
+        real_patch_events = aldershot.patch_events
+
+        def patch_events(service, calendar_id, bodies, **kwargs):
+            # The rival lands between the availability check and the patch
+            self.calendar.items.setdefault('rival', dict(rival, id='rival', created='2025-01-01T00:00:00Z'))
+            return real_patch_events(service, calendar_id, bodies, **kwargs)
+
+        original_start = self.calendar.items['+12345678900']['start']
+        with patch('aldershot.patch_events', side_effect=patch_events):
+            data = self.post(shift_days=7, notify=False).get_json()
+        self.assertEqual(data['summary'], {'moved': 1, 'failed': 1})
+        self.assertIn("was just booked", data['appointments'][0]['error'])
+        self.assertEqual(self.calendar.items['+12345678900']['start'], original_start)
+        self.assertIn((self.day + timedelta(days=7)).isoformat(), self.calendar.items['+12345678901']['start']['dateTime'])
+
+    def test_rejects_bad_range(self):
+        self.assertEqual(self.post(end_date='2000-01-01').status_code, 400)
+        self.assertEqual(self.post(dentist='').status_code, 400)
+
+
+class TestSideEffectHandlers(unittest.TestCase):
+    def test_audit_rows_written_without_the_writer_buffer(self):
+        """The outbox handler writes its batch at once instead of waiting on the writer's flusher"""
+        import aldershot
+
+        writer = MagicMock()
+        with patch('aldershot.get_audit_writer', return_value=writer):
+            aldershot.deliver_audit_rows([{'row': ["@Book"]}, {'row': ["@Cancel"]}])
+        writer.write_rows.assert_called_once_with([["@Book"], ["@Cancel"]])
+
+    def test_bookings_share_one_sheets_append(self):
+        """Audit rows of separate bookings are held in the outbox and written together"""
+        import tempfile
+        import os
+        import aldershot
+        from outbox import Outbox
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            side_effects = Outbox(path=os.path.join(tmpdir, "outbox.sqlite3"), workers=0)
+            writer = MagicMock()
+            with patch('aldershot.get_outbox', return_value=side_effects), \
+                    patch('aldershot.get_audit_writer', return_value=writer), \
+                    patch('aldershot.deliver_sms'), \
+                    patch('aldershot.AUDIT_BATCH_SIZE', 3):
+                for i in range(3):
+                    aldershot.record_side_effects(["@Book", f"Patient {i}"], "+19055550100", "Booked")
+                    if i < 2:
+                        side_effects.drain()
+                        writer.write_rows.assert_not_called()
+                side_effects.drain()
+        writer.write_rows.assert_called_once()
+        self.assertEqual(len(writer.write_rows.call_args[0][0]), 3)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
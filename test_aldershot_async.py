@@ -0,0 +1,288 @@
+import asyncio
+import json
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from flask import Flask
+
+import aldershot
+from aldershot_async import (
+    AldershotASGI, AsyncUpstreams, AsyncSlotLocks, FlaskAsyncUpstreams, UpstreamError, async_asbp, encode_json,
+    _upstream_operation
+)
+from idempotency import IdempotencyStore
+from slot_locks import SlotLocks, SlotLockTimeout
+
+
+class FakeUpstreams(AsyncUpstreams):
+    """AsyncUpstreams over an in-memory calendar; audit rows and SMS are recorded"""
+
+    def __init__(self):
+        super().__init__()
+        self.items = {}
+        self.counter = 0
+        self.audit_rows = []
+        self.sms = []
+        self.operations = []
+
+    async def google(self, method, url, params=None, body=None):
+        self.operations.append(_upstream_operation(method, url))
+        await asyncio.sleep(0.01)
+        event_id = url.rsplit('/events/', 1)[1] if '/events/' in url else None
+        if method == 'GET':
+            return {'items': list(self.items.values())}
+        if method == 'POST':
+            self.counter += 1
+            event = dict(body, id=f"evt{self.counter}", created=f"2025-01-01T00:00:{self.counter:02d}Z")
+            self.items[event['id']] = event
+            return event
+        if event_id not in self.items:
+            raise UpstreamError(404, "Not Found")
+        if method == 'PATCH':
+            self.items[event_id] = dict(self.items[event_id], **body)
+            return self.items[event_id]
+        del self.items[event_id]
+        return {}
+
+    async def append_rows(self, rows):
+        self.audit_rows.extend(rows)
+
+    async def send_sms(self, to_number, message_body, from_number=None):
+        self.sms.append((to_number, message_body))
+        return {'success': True, 'message': 'SMS sent successfully', 'sid': 'SM1'}
+
+
+class TestAldershotASGI(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        day = aldershot.requested_business_days({'days': 2}, datetime.now(aldershot.TORONTO_TZ))[-1]
+        self.appointment = f"{day.isoformat()}T10:00:00"
+        self.upstreams = FakeUpstreams()
+        self.app = AldershotASGI()
+        self.app._upstreams = self.upstreams
+        for patcher in [
+            patch('aldershot.calendar_mirror.MIRROR_ENABLED', False),
+            patch('aldershot_async.GMAIL_ACCOUNT', 'clinic@example.com'),
+            patch('aldershot_async.get_idempotency_store', return_value=IdempotencyStore()),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def post(self, path, data, headers=()):
+        messages = [{'type': 'http.request', 'body': json.dumps(data).encode(), 'more_body': False}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            'type': 'http',
+            'method': 'POST',
+            'path': path,
+            'headers': [(key.lower().encode(), value.encode()) for key, value in headers],
+        }
+        await self.app(scope, receive, send)
+        response_headers = dict(sent[0]['headers'])
+        return sent[0]['status'], json.loads(sent[1]['body']), response_headers
+
+    def booking(self, patient_phone="+14165550100"):
+        return {
+            'patient_name': 'Jane Doe',
+            'patient_phone': patient_phone,
+            'service_type': 'cleaning',
+            'dentist': 'Smith',
+            'appointment_date': self.appointment,
+        }
+
+    async def test_book_find_reschedule_cancel(self):
+        status, body, _ = await self.post('/aldershot/book', self.booking())
+        self.assertEqual((status, body), (200, {'booking_status': 'success'}))
+        self.assertEqual(len(self.upstreams.items), 1)
+        self.assertEqual(len(self.upstreams.audit_rows), 1)
+        self.assertEqual(len(self.upstreams.sms), 1)
+
+        lookup = {'patient_name': 'Jane Doe', 'patient_phone': '+14165550100'}
+        status, body, _ = await self.post('/find_existing', lookup)
+        self.assertEqual(body, {'existing_appointment_status': 'True'})
+
+        new_date = self.appointment.replace("T10:00", "T14:00")
+        status, body, _ = await self.post('/reschedule', dict(lookup, appointment_date=new_date))
+        self.assertEqual(body, {'rescheduling_appointment_status': 'success'})
+        event = next(iter(self.upstreams.items.values()))
+        self.assertIn("T14:00:00", event['start']['dateTime'])
+        # The move carries the Flask path's metric label
+        self.assertEqual(self.upstreams.operations[-1], ('calendar', 'events.patch'))
+
+        status, body, _ = await self.post('/cancel', lookup)
+        self.assertEqual((status, body), (200, {'cancel_appointment_statusmessage': 'success'}))
+        self.assertEqual(self.upstreams.items, {})
+        self.assertEqual(len(self.upstreams.sms), 3)
+
+    async def test_concurrent_bookings_get_one_slot(self):
+        results = await asyncio.gather(*(
+            self.post('/book', self.booking(f"+1416555010{i}")) for i in range(3)
+        ))
+        self.assertEqual(sorted(status for status, _, _ in results), [200, 409, 409])
+        self.assertEqual(len(self.upstreams.items), 1)
+        conflict = next(body for status, body, _ in results if status == 409)
+        self.assertEqual(conflict['error_code'], 'SLOT_CONFLICT')
+
+    async def test_get_available_skips_booked_slot(self):
+        await self.post('/book', self.booking())
+        status, body, _ = await self.post('/get_available', {'dentist': 'Smith', 'days': 2})
+        self.assertEqual(body['available_dates'], 'success')
+        day_slots = list(body['details'].values())[-1]
+        self.assertNotIn('10:00 AM', day_slots)
+        self.assertIn('09:00 AM', day_slots)
+
+    async def test_get_available_rejects_malformed_dates(self):
+        status, body, _ = await self.post('/get_available', {'dentist': 'Smith', 'start_date': '03/04/2030'})
+        self.assertEqual(status, 400)
+        self.assertEqual(body['status'], 'error')
+
+    async def test_repeated_tool_call_is_replayed(self):
+        headers = [('X-Vapi-Tool-Call-Id', 'call_1')]
+        first = await self.post('/book', self.booking(), headers)
+        second = await self.post('/book', self.booking(), headers)
+        self.assertEqual(first[:2], second[:2])
+        self.assertEqual(second[2].get(b'idempotent-replayed'), b'true')
+        self.assertIn(b'total;dur=', first[2][b'server-timing'])
+        self.assertNotEqual(first[2][b'x-request-id'], second[2][b'x-request-id'])
+        self.assertEqual(len(self.upstreams.items), 1)
+        self.assertEqual(len(self.upstreams.sms), 1)
+
+    async def test_unknown_path_and_method(self):
+        status, _, _ = await self.post('/nope', {})
+        self.assertEqual(status, 404)
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        await self.app({'type': 'http', 'method': 'GET', 'path': '/book', 'headers': []}, None, send)
+        self.assertEqual(sent[0]['status'], 405)
+
+
+class TestAsyncUpstreamsHttp(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.requests = []
+
+        async def list_events(request):
+            self.requests.append(request)
+            if request.headers['Authorization'] == 'Bearer expired':
+                return web.Response(status=401)
+            if request.query.get('pageToken') == 'p2':
+                return web.json_response({'items': [{'id': 'b'}]})
+            return web.json_response({'items': [{'id': 'a'}], 'nextPageToken': 'p2'})
+
+        app = web.Application()
+        app.router.add_get('/calendars/{calendar}/events', list_events)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.addAsyncCleanup(self.server.close)
+
+        self.upstreams = AsyncUpstreams()
+        self.addAsyncCleanup(self.upstreams.close)
+        token = ['expired']
+
+        async def google_token(force_refresh=False):
+            if force_refresh:
+                token[0] = 'fresh'
+            return token[0]
+
+        self.upstreams.google_token = google_token
+        patcher = patch('aldershot_async.CALENDAR_API_URL', str(self.server.make_url('')).rstrip('/'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_pages_and_token_refresh(self):
+        events = [event async for event in self.upstreams.list_events('clinic@example.com', singleEvents=True)]
+        self.assertEqual([event['id'] for event in events], ['a', 'b'])
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(self.requests[-1].query['singleEvents'], 'true')
+        self.assertIn('nextPageToken', self.requests[-1].query['fields'])
+
+
+class TestAsyncSlotLocks(unittest.IsolatedAsyncioTestCase):
+    async def test_overlapping_reservation_times_out(self):
+        locks = AsyncSlotLocks(15, timeout=0.05)
+        start = datetime(2025, 3, 3, 14)
+        end = datetime(2025, 3, 3, 15)
+        async with locks.reserve("smith", start, end):
+            with self.assertRaises(SlotLockTimeout):
+                async with locks.reserve("Smith", start, end):
+                    pass
+            async with locks.reserve("jones", start, end):
+                pass
+        self.assertEqual(locks._locks, {})
+
+
+class TestFlaskAsyncUpstreams(unittest.IsolatedAsyncioTestCase):
+    async def test_slot_locks_and_sms_are_process_wide(self):
+        """Each Flask async view has its own upstreams, but bookings and SMS are ordered across them"""
+        shared = SlotLocks(15, timeout=0.05)
+        start = datetime(2025, 3, 3, 14)
+        end = datetime(2025, 3, 3, 15)
+        with patch('aldershot_async.get_slot_locks', return_value=shared), \
+                patch('aldershot.dispatch_sms', return_value=aldershot.completed_future({'success': True})) as dispatch:
+            first, second = FlaskAsyncUpstreams(), FlaskAsyncUpstreams()
+            async with first.slot_locks.reserve("smith", start, end):
+                with self.assertRaises(SlotLockTimeout):
+                    with shared.reserve("Smith", start, end):
+                        pass
+            async with second.slot_locks.reserve("smith", start, end):
+                pass
+            self.assertEqual(await second.send_sms("+19055550100", "Hi"), {'success': True})
+        dispatch.assert_called_once_with("+19055550100", "Hi", None)
+        self.assertEqual(len(shared), 0)
+
+
+class TestAsyncBlueprint(unittest.TestCase):
+    """The Flask async views, called through the test client (needs flask[async])"""
+
+    def setUp(self):
+        day = aldershot.requested_business_days({'days': 2}, datetime.now(aldershot.TORONTO_TZ))[-1]
+        self.appointment = f"{day.isoformat()}T10:00:00"
+        self.upstreams = FakeUpstreams()
+        app = Flask(__name__)
+        app.register_blueprint(async_asbp, url_prefix="/aldershot_async")
+        self.client = app.test_client()
+        for patcher in [
+            patch('aldershot.calendar_mirror.MIRROR_ENABLED', False),
+            patch('aldershot_async.GMAIL_ACCOUNT', 'clinic@example.com'),
+            patch('aldershot_async.get_idempotency_store', return_value=IdempotencyStore()),
+            patch('aldershot_async.FlaskAsyncUpstreams', return_value=self.upstreams),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_book_then_find(self):
+        response = self.client.post('/aldershot_async/book', json={
+            'patient_name': 'Jane Doe',
+            'patient_phone': '+14165550100',
+            'service_type': 'cleaning',
+            'dentist': 'Smith',
+            'appointment_date': self.appointment,
+        })
+        self.assertEqual((response.status_code, response.get_json()), (200, {'booking_status': 'success'}))
+        self.assertEqual(len(self.upstreams.items), 1)
+        self.assertEqual(len(self.upstreams.sms), 1)
+
+        response = self.client.post('/aldershot_async/find_existing', json={
+            'patient_name': 'Jane Doe', 'patient_phone': '+14165550100'})
+        self.assertEqual(response.get_json(), {'existing_appointment_status': 'True'})
+
+
+class TestEncodeJson(unittest.TestCase):
+    def test_matches_flask_layout(self):
+        self.assertEqual(encode_json({'b': 1, 'a': 'x'}), b'{"a":"x","b":1}\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
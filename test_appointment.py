@@ -0,0 +1,96 @@
+import unittest
+from unittest.mock import patch
+from datetime import datetime, timezone, timedelta
+
+import appointment
+from appointment import Appointment, decode_event, parse_iso, clear_appointment_cache, TORONTO_TZ
+
+EVENT = {
+    'id': 'evt1',
+    'etag': '"1"',
+    'summary': 'Cleaning - Jane Doe',
+    'description': (
+        "Booking Information:\n------------------\nPatient: Jane Doe\nPhone: +14165550100\n"
+        "Service: Cleaning\nDentist: Dr. Smith\n\nInsurance: Sun Life"
+    ),
+    'start': {'dateTime': '2025-03-03T10:00:00-05:00', 'timeZone': 'America/Toronto'},
+    'end': {'dateTime': '2025-03-03T11:00:00-05:00', 'timeZone': 'America/Toronto'},
+    'reminders': {'overrides': [{'method': 'popup', 'minutes': 60}]},
+}
+
+
+class TestParseIso(unittest.TestCase):
+    def test_offsets_share_tzinfo(self):
+        first = parse_iso('2025-03-03T10:00:00-05:00')
+        second = parse_iso('2025-03-04T09:30:00-05:00')
+        self.assertEqual(first, datetime(2025, 3, 3, 15, tzinfo=timezone.utc))
+        self.assertIs(first.tzinfo, second.tzinfo)
+        self.assertIs(parse_iso('2025-03-03T15:00:00Z').tzinfo, timezone.utc)
+        self.assertEqual(parse_iso('2025-03-03T15:00:00.250+00:00').microsecond, 250000)
+
+    def test_dates_and_naive_times_are_toronto(self):
+        self.assertEqual(parse_iso('2025-03-03'), datetime(2025, 3, 3, tzinfo=TORONTO_TZ))
+        self.assertEqual(parse_iso('2025-07-03T10:00:00').utcoffset(), timedelta(hours=-4))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            parse_iso('next tuesday')
+
+
+class TestAppointment(unittest.TestCase):
+    def setUp(self):
+        clear_appointment_cache()
+
+    def test_details(self):
+        details = Appointment(EVENT).details()
+        self.assertEqual(details['patient_name'], 'Jane Doe')
+        self.assertEqual(details['patient_phone'], '+14165550100')
+        self.assertEqual(details['service_type'], 'Cleaning')
+        self.assertEqual(details['dentist'], 'Dr. Smith')
+        self.assertEqual(details['insurance_name'], 'Sun Life')
+        self.assertEqual(details['referral'], '')
+        self.assertEqual(details['start_time'], '2025-03-03 10:00 AM EST')
+        self.assertEqual(details['duration_minutes'], 60)
+        self.assertEqual(details['reminders'], [{'method': 'popup', 'minutes': 60}])
+
+    def test_properties_fill_missing_description(self):
+        event = {
+            'id': 'evt2',
+            'start': {'dateTime': '2025-03-03T10:00:00-05:00'},
+            'extendedProperties': {'private': {'patient_name': 'Jane Doe', 'phone': '+14165550100'}},
+        }
+        record = Appointment(event)
+        self.assertEqual((record.patient_name, record.patient_phone), ('Jane Doe', '+14165550100'))
+        self.assertIsNone(record.bounds)
+        self.assertNotIn('duration_minutes', record.details())
+
+    def test_bad_time_is_logged(self):
+        event = dict(EVENT, id='evt3', start={'dateTime': 'not a time'})
+        with patch('appointment.log') as log:
+            self.assertIsNone(Appointment(event).start)
+        log.assert_called_once()
+        self.assertEqual(log.call_args.kwargs['level'], 'warning')
+        self.assertEqual(log.call_args.kwargs['event_id'], 'evt3')
+
+    def test_format_start(self):
+        self.assertEqual(Appointment(EVENT).format_start(), 'March 03, 2025 at 10:00 AM EST')
+
+    def test_cached_per_etag(self):
+        first = decode_event(EVENT)
+        self.assertIs(decode_event(dict(EVENT)), first)
+        self.assertIsNot(decode_event(dict(EVENT, etag='"2"')), first)
+        without_etag = {key: value for key, value in EVENT.items() if key != 'etag'}
+        self.assertIsNot(decode_event(without_etag), decode_event(without_etag))
+
+    def test_cache_is_bounded(self):
+        original = appointment.APPOINTMENT_CACHE_SIZE
+        appointment.APPOINTMENT_CACHE_SIZE = 2
+        self.addCleanup(setattr, appointment, 'APPOINTMENT_CACHE_SIZE', original)
+        first = decode_event(EVENT)
+        decode_event(dict(EVENT, id='evt2'))
+        decode_event(dict(EVENT, id='evt3'))
+        self.assertIsNot(decode_event(EVENT), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
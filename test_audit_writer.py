@@ -0,0 +1,38 @@
+import unittest
+from unittest.mock import MagicMock
+
+from audit_writer import AuditWriter, AUDIT_ROW_WIDTH
+
+
+class TestAuditWriter(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.worksheet = self.client.open_by_key.return_value.sheet1
+
+    def make_writer(self, **kwargs):
+        return AuditWriter(lambda: self.client, "Clinic Log", spreadsheet_key="sheet-key", **kwargs)
+
+    def test_rows_written_in_one_append(self):
+        """A batch of rows is padded to the audit layout and written with a single append_rows call"""
+        writer = self.make_writer()
+        writer.write_rows([["@Book", "Relines", f"Patient {i}"] for i in range(3)] + [["@Reschedule", None]])
+
+        self.worksheet.append_rows.assert_called_once()
+        rows = self.worksheet.append_rows.call_args[0][0]
+        self.assertEqual(len(rows), 4)
+        self.assertTrue(all(len(row) == AUDIT_ROW_WIDTH for row in rows))
+        self.assertEqual(rows[3][:3], ["@Reschedule", "", ""])
+
+    def test_worksheet_opened_once_by_name(self):
+        """Opening by name happens once and the spreadsheet key is remembered"""
+        self.client.open.return_value.id = "resolved-key"
+        writer = AuditWriter(lambda: self.client, "Clinic Log", spreadsheet_key=None)
+        writer.write_rows([["@Book"]])
+        writer.write_rows([["@Cancel"]])
+
+        self.client.open.assert_called_once_with("Clinic Log")
+        self.assertEqual(writer.spreadsheet_key, "resolved-key")
+
+
+if __name__ == '__main__':
+    unittest.main()
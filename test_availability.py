@@ -0,0 +1,86 @@
+import random
+import unittest
+from datetime import datetime, date, timedelta
+from zoneinfo import ZoneInfo
+
+from availability import OpeningHours, parse_clock, slot_grid, merge_intervals, free_slots
+
+TORONTO = ZoneInfo("America/Toronto")
+
+
+def hours(open_time="9:00", close_time="17:00", lunch_start="12:00", lunch_end="13:00", duration=60, granularity=60):
+    return OpeningHours(
+        parse_clock(open_time), parse_clock(close_time),
+        parse_clock(lunch_start), parse_clock(lunch_end),
+        duration, granularity
+    )
+
+
+class TestParseClock(unittest.TestCase):
+    def test_accepts_hours_and_minutes(self):
+        self.assertEqual(parse_clock("9"), 540)
+        self.assertEqual(parse_clock("09:30"), 570)
+        self.assertEqual(parse_clock("24:00"), 1440)
+
+    def test_rejects_garbage(self):
+        for value in ("", "9am", "12:60", "25:00", "24:30"):
+            with self.assertRaises(ValueError):
+                parse_clock(value)
+
+
+class TestSlotGrid(unittest.TestCase):
+    def test_hourly_grid_matches_legacy_layout(self):
+        slots = slot_grid(date(2025, 3, 3), hours(), TORONTO)
+        self.assertEqual([slot.hour for slot in slots], [9, 10, 11, 13, 14, 15, 16])
+
+    def test_slots_never_run_into_lunch_or_closing(self):
+        slots = slot_grid(date(2025, 3, 3), hours(lunch_start="12:30", lunch_end="13:15", duration=45, granularity=15), TORONTO)
+        times = [slot.strftime("%H:%M") for slot in slots]
+        self.assertEqual(times[0], "09:00")
+        self.assertIn("11:45", times)
+        self.assertNotIn("12:00", times)
+        self.assertIn("13:15", times)
+        self.assertEqual(times[-1], "16:15")
+
+    def test_slots_follow_wall_clock_across_dst(self):
+        # Clocks went forward in Toronto on 2025-03-09
+        before = slot_grid(date(2025, 3, 7), hours(), TORONTO)[0]
+        after = slot_grid(date(2025, 3, 10), hours(), TORONTO)[0]
+        self.assertEqual((before.hour, after.hour), (9, 9))
+        self.assertNotEqual(before.utcoffset(), after.utcoffset())
+
+
+class TestSweep(unittest.TestCase):
+    def test_merge_intervals_joins_overlapping_and_touching(self):
+        t = datetime(2025, 3, 3, 9, tzinfo=TORONTO)
+        busy = [
+            (t + timedelta(hours=3), t + timedelta(hours=4)),
+            (t, t + timedelta(hours=1)),
+            (t + timedelta(minutes=30), t + timedelta(hours=2)),
+            (t + timedelta(hours=2), t + timedelta(hours=2, minutes=30)),
+        ]
+        self.assertEqual(merge_intervals(busy), [
+            (t, t + timedelta(hours=2, minutes=30)),
+            (t + timedelta(hours=3), t + timedelta(hours=4)),
+        ])
+
+    def test_sweep_matches_pairwise_check(self):
+        rng = random.Random(7)
+        layout = hours(duration=30, granularity=15)
+        duration = timedelta(minutes=30)
+        slots = [slot for offset in range(10) for slot in slot_grid(date(2025, 3, 3) + timedelta(days=offset), layout, TORONTO)]
+        start = slots[0]
+        for _ in range(50):
+            busy = []
+            for _ in range(rng.randint(0, 40)):
+                begin = start + timedelta(minutes=5 * rng.randint(0, 10 * 24 * 12))
+                busy.append((begin, begin + timedelta(minutes=5 * rng.randint(1, 24))))
+            expected = [
+                slot for slot in slots
+                if not any(slot < end and slot + duration > begin for begin, end in busy)
+            ]
+            self.assertEqual(free_slots(slots, merge_intervals(busy), duration), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import threading
+import time
+import unittest
+from datetime import date, datetime
+
+from availability_cache import AvailabilityCache
+
+MONDAY = date(2025, 3, 3)
+TUESDAY = date(2025, 3, 4)
+
+
+class CountingLoader:
+    """Returns one slot per requested day and records every (dentist, days) it is asked for"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, wanted):
+        self.calls.extend((dentist, list(days)) for dentist, days in wanted.items())
+        return {
+            dentist: {day: [datetime(day.year, day.month, day.day, 9)] for day in days}
+            for dentist, days in wanted.items()
+        }
+
+
+class TestAvailabilityCache(unittest.TestCase):
+    def test_misses_are_loaded_together_and_then_hit(self):
+        cache = AvailabilityCache(ttl=60, stale=0)
+        loader = CountingLoader()
+        cache.get_many(["Dr. Smith"], [MONDAY, TUESDAY], loader)
+        result = cache.get_many(["dr. smith "], [MONDAY, TUESDAY], loader)
+        self.assertEqual(loader.calls, [("dr. smith", [MONDAY, TUESDAY])])
+        self.assertEqual(list(result["dr. smith"]), [MONDAY, TUESDAY])
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 2))
+
+    def test_only_missing_days_are_loaded(self):
+        cache = AvailabilityCache(ttl=60, stale=0)
+        loader = CountingLoader()
+        cache.get_many(["smith"], [MONDAY], loader)
+        cache.get_many(["smith"], [MONDAY, TUESDAY], loader)
+        self.assertEqual(loader.calls[-1], ("smith", [TUESDAY]))
+
+    def test_invalidate_drops_dentist_and_any_dentist_entries(self):
+        cache = AvailabilityCache(ttl=60, stale=0)
+        loader = CountingLoader()
+        for dentist in ("smith", "jones", ""):
+            cache.get_many([dentist], [MONDAY], loader)
+        cache.invalidate("Smith", MONDAY)
+        for dentist in ("smith", "jones", ""):
+            cache.get_many([dentist], [MONDAY], loader)
+        self.assertEqual([call[0] for call in loader.calls[3:]], ["smith", ""])
+
+    def test_invalidate_without_dentist_drops_whole_day(self):
+        cache = AvailabilityCache(ttl=60, stale=0)
+        loader = CountingLoader()
+        cache.get_many(["smith"], [MONDAY, TUESDAY], loader)
+        cache.invalidate(None, MONDAY)
+        cache.get_many(["smith"], [MONDAY, TUESDAY], loader)
+        self.assertEqual(loader.calls[-1], ("smith", [MONDAY]))
+
+    def test_stale_entry_is_served_while_refreshing(self):
+        cache = AvailabilityCache(ttl=0.01, stale=60)
+        loader = CountingLoader()
+        cache.get_many(["smith"], [MONDAY], loader)
+        time.sleep(0.02)
+
+        release = threading.Event()
+
+        def slow_loader(wanted):
+            release.wait(5)
+            return loader(wanted)
+
+        started = time.monotonic()
+        self.assertIn(MONDAY, cache.get_many(["smith"], [MONDAY], slow_loader)["smith"])
+        self.assertLess(time.monotonic() - started, 1)
+        release.set()
+        cache._get_executor().shutdown(wait=True)
+        self.assertEqual(len(loader.calls), 2)
+        stats = cache.stats()
+        self.assertEqual((stats['stale'], stats['refreshes']), (1, 1))
+
+    def test_load_racing_an_invalidation_is_not_stored(self):
+        cache = AvailabilityCache(ttl=60, stale=0)
+        loader = CountingLoader()
+
+        def racing_loader(wanted):
+            cache.invalidate("smith", MONDAY)
+            return loader(wanted)
+
+        cache.get_many(["smith"], [MONDAY], racing_loader)
+        cache.get_many(["smith"], [MONDAY], loader)
+        self.assertEqual(len(loader.calls), 2)
+
+    def test_zero_ttl_disables_caching(self):
+        cache = AvailabilityCache(ttl=0)
+        loader = CountingLoader()
+        cache.get_many(["smith"], [MONDAY], loader)
+        cache.get_many(["smith"], [MONDAY], loader)
+        self.assertEqual(len(loader.calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
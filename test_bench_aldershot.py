@@ -0,0 +1,44 @@
+import unittest
+
+from bench_aldershot import make_events, measure, compare_results, sized_benchmarks
+from patient_index import patient_identity
+
+
+class TestMakeEvents(unittest.TestCase):
+    def test_calendar_shape(self):
+        events = make_events(50)
+        self.assertEqual(len(events), 50)
+        self.assertEqual(len({event['id'] for event in events}), 50)
+        self.assertIn('extendedProperties', events[0])
+        self.assertNotIn('extendedProperties', events[1])
+        # Legacy and structured events decode to the same kind of identity
+        self.assertTrue(all(patient_identity(event)[0].startswith("+1905") for event in events))
+
+    def test_patient_matching_finds_the_last_patient(self):
+        events = make_events(20)
+        self.assertEqual(sized_benchmarks(events)['patient_matching'](), [events[-1]])
+
+
+class TestCompare(unittest.TestCase):
+    def test_regressions(self):
+        before = {'results': [
+            {'name': 'a', 'size': None, 'median': 1.0},
+            {'name': 'b', 'size': 10, 'median': 1.0},
+            {'name': 'gone', 'size': None, 'median': 1.0},
+        ]}
+        after = {'results': [
+            {'name': 'a', 'size': None, 'median': 1.05},
+            {'name': 'b', 'size': 10, 'median': 1.5},
+            {'name': 'new', 'size': None, 'median': 1.0},
+        ]}
+        rows = compare_results(before, after, threshold=0.10)
+        self.assertEqual([(row['name'], row['regressed']) for row in rows], [('a', False), ('b[10]', True)])
+
+    def test_measure(self):
+        timing = measure(lambda: None, repeat=3, min_time=0.001)
+        self.assertEqual(timing['rounds'], 3)
+        self.assertLessEqual(timing['min'], timing['median'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+from unittest.mock import MagicMock
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from bulk_ops import execute_batched, delete_events
+
+
+def http_error(status, content=b'{}'):
+    return HttpError(httplib2.Response({'status': status}), content)
+
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.round_trips.append([request_id for request_id, _ in self.requests])
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request(), None)
+            except Exception as e:
+                self.callback(request_id, None, e)
+
+
+class FakeService:
+    def __init__(self, failures=None):
+        self.round_trips = []
+        self.failures = failures or {}
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(self, callback)
+
+    def call(self, call_id):
+        def run():
+            errors = self.failures.get(call_id)
+            if errors:
+                raise errors.pop(0)
+            return {'id': call_id}
+        return run
+
+
+class TestExecuteBatched(unittest.TestCase):
+    def test_chunks_calls(self):
+        service = FakeService()
+        calls = {f"e{i}": (lambda i=i: service.call(f"e{i}")) for i in range(120)}
+        results = execute_batched(service, calls, batch_size=50)
+        self.assertEqual([len(trip) for trip in service.round_trips], [50, 50, 20])
+        self.assertEqual(results["e7"], ({'id': 'e7'}, None))
+
+    def test_retries_only_retryable_errors(self):
+        service = FakeService({
+            'busy': [http_error(429)],
+            'bad': [http_error(400), http_error(400)],
+        })
+        calls = {call_id: (lambda call_id=call_id: service.call(call_id)) for call_id in ('ok', 'busy', 'bad')}
+        results = execute_batched(service, calls, retry_delay=0)
+        self.assertEqual(results['busy'], ({'id': 'busy'}, None))
+        self.assertEqual(results['bad'][1].resp.status, 400)
+        self.assertEqual(service.round_trips, [['ok', 'busy', 'bad'], ['busy']])
+
+    def test_rate_limit_403_is_retried(self):
+        service = FakeService({'a': [http_error(403, b'{"error": {"errors": [{"reason": "rateLimitExceeded"}]}}')]})
+        results = execute_batched(service, {'a': lambda: service.call('a')}, retry_delay=0)
+        self.assertIsNone(results['a'][1])
+
+    def test_deleting_a_gone_event_succeeds(self):
+        service = MagicMock()
+        service.new_batch_http_request.side_effect = lambda callback: FakeBatch(FakeService(), callback)
+
+        def delete(calendarId, eventId):
+            def run():
+                raise http_error(410)
+            return run
+
+        service.events.return_value.delete.side_effect = delete
+        self.assertEqual(delete_events(service, 'cal', ['gone']), {'gone': (None, None)})
+
+
+if __name__ == '__main__':
+    unittest.main()
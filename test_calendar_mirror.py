@@ -0,0 +1,98 @@
+import unittest
+from unittest.mock import MagicMock
+from datetime import datetime, timedelta, timezone
+
+from calendar_mirror import CalendarMirror
+
+
+def make_event(event_id: str, start: datetime, minutes: int = 60, **extra) -> dict:
+    event = {
+        'id': event_id,
+        'status': 'confirmed',
+        'start': {'dateTime': start.isoformat()},
+        'end': {'dateTime': (start + timedelta(minutes=minutes)).isoformat()},
+    }
+    event.update(extra)
+    return event
+
+
+class FakeCalendarService:
+    """Serves events().list() pages and records the parameters of each call"""
+
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.calls = []
+
+    def events(self):
+        service = self
+
+        class Events:
+            def list(self, **params):
+                service.calls.append(params)
+                request = MagicMock()
+                request.execute.return_value = service.pages.pop(0)
+                return request
+
+        return Events()
+
+
+class TestCalendarMirror(unittest.TestCase):
+    def setUp(self):
+        self.base = (datetime.now(timezone.utc) + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+
+    def test_full_sync_follows_pages_and_sorts(self):
+        """The full sync reads every page and keeps events ordered by start time"""
+        service = FakeCalendarService([
+            {'items': [make_event('b', self.base + timedelta(hours=2))], 'nextPageToken': 'p2'},
+            {'items': [make_event('a', self.base)], 'nextSyncToken': 'token-1'},
+        ])
+        mirror = CalendarMirror('clinic')
+        mirror.refresh(service)
+
+        self.assertEqual([event['id'] for event in mirror.upcoming()], ['a', 'b'])
+        self.assertEqual(service.calls[1]['pageToken'], 'p2')
+        self.assertNotIn('syncToken', service.calls[0])
+        # Only events that have not ended are listed, not the whole history
+        self.assertLessEqual(datetime.fromisoformat(service.calls[0]['timeMin']), datetime.now(timezone.utc))
+
+    def test_incremental_sync_applies_changes(self):
+        """Later syncs send the sync token and apply updates and deletions"""
+        service = FakeCalendarService([
+            {'items': [make_event('a', self.base), make_event('b', self.base + timedelta(hours=1))],
+             'nextSyncToken': 'token-1'},
+            {'items': [{'id': 'a', 'status': 'cancelled'}, make_event('c', self.base - timedelta(hours=1))],
+             'nextSyncToken': 'token-2'},
+        ])
+        mirror = CalendarMirror('clinic')
+        mirror.refresh(service)
+        mirror.refresh(service, force=True)
+
+        self.assertEqual(service.calls[1]['syncToken'], 'token-1')
+        self.assertNotIn('timeMin', service.calls[1])
+        self.assertEqual([event['id'] for event in mirror.upcoming()], ['c', 'b'])
+
+    def test_between_returns_overlapping_events(self):
+        """Range queries include events that started before the window but overlap it"""
+        mirror = CalendarMirror('clinic')
+        mirror.upsert(make_event('long', self.base, minutes=180))
+        mirror.upsert(make_event('inside', self.base + timedelta(hours=2)))
+        mirror.upsert(make_event('after', self.base + timedelta(hours=5)))
+
+        window = mirror.between(self.base + timedelta(hours=1), self.base + timedelta(hours=4))
+        self.assertEqual([event['id'] for event in window], ['long', 'inside'])
+
+    def test_write_through_update_and_remove(self):
+        """Moving an event re-sorts it and removing it drops it from every read"""
+        mirror = CalendarMirror('clinic')
+        mirror.upsert(make_event('a', self.base))
+        mirror.upsert(make_event('b', self.base + timedelta(hours=1)))
+        mirror.upsert(make_event('a', self.base + timedelta(hours=3)))
+        self.assertEqual([event['id'] for event in mirror.upcoming()], ['b', 'a'])
+
+        mirror.remove('b')
+        self.assertIsNone(mirror.get('b'))
+        self.assertEqual([event['id'] for event in mirror.upcoming()], ['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
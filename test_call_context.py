@@ -0,0 +1,145 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask
+
+import google_services
+from google_services import ServiceRegistry
+from fake_upstreams import FakeUpstreams
+from availability_cache import AvailabilityCache
+from call_context import CallContextCache, request_call_id
+from aldershot import asbp
+
+EVENT = {
+    'id': 'evt1',
+    'summary': 'Consultation - Jane Doe',
+    'description': 'Patient: Jane Doe\nPhone: +19055550100\nDentist: Dr. Smith',
+    'extendedProperties': {'private': {'phone': '+19055550100', 'patient_name': 'Jane Doe', 'dentist': 'dr. smith'}},
+    'start': {'dateTime': '2030-03-04T10:00:00-05:00'},
+    'end': {'dateTime': '2030-03-04T11:00:00-05:00'},
+}
+PATIENT = ('+19055550100', 'jane doe')
+MORNING = datetime(2030, 3, 4, 9, tzinfo=timezone.utc)
+
+
+class TestCallContextCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = CallContextCache(ttl=60, max_entries=2)
+
+    def test_limited_lookup_only_answers_smaller_limits(self):
+        self.cache.remember_patient_events("call1", "Jane Doe", "(905) 555-0100", 1, [EVENT])
+        self.assertEqual(self.cache.patient_events("call1", "jane  doe", "+19055550100", limit=1), [EVENT])
+        self.assertIsNone(self.cache.patient_events("call1", "Jane Doe", "+19055550100"))
+        self.assertIsNone(self.cache.patient_events("call2", "Jane Doe", "+19055550100", limit=1))
+
+        self.cache.remember_patient_events("call1", "Jane Doe", "+19055550100", None, [EVENT, EVENT])
+        self.assertEqual(len(self.cache.patient_events("call1", "Jane Doe", "+19055550100")), 2)
+        self.assertEqual(len(self.cache.patient_events("call1", "Jane Doe", "+19055550100", limit=1)), 1)
+
+    def test_busy_intervals_need_a_covering_window(self):
+        busy = [(MORNING, MORNING + timedelta(hours=1)), (MORNING + timedelta(days=1), MORNING + timedelta(days=1, hours=1))]
+        self.cache.remember_busy_intervals("call1", {'dr. smith': busy}, MORNING, MORNING + timedelta(days=2))
+        self.assertEqual(
+            self.cache.busy_intervals("call1", 'dr. smith', MORNING + timedelta(days=1), MORNING + timedelta(days=2)),
+            busy[1:])
+        self.assertIsNone(self.cache.busy_intervals("call1", 'dr. smith', MORNING, MORNING + timedelta(days=3)))
+        self.assertIsNone(self.cache.busy_intervals("call1", 'dr. jones', MORNING, MORNING + timedelta(days=1)))
+
+    def test_writes_invalidate_every_call(self):
+        window = (MORNING, MORNING + timedelta(days=1))
+        for call_id in ("call1", "call2"):
+            self.cache.remember_patient_events(call_id, "Jane Doe", "+19055550100", None, [EVENT])
+            self.cache.remember_busy_intervals(call_id, {'dr. smith': [], 'dr. jones': [], '': []}, *window)
+
+        self.cache.invalidate(PATIENT, "Dr. Smith", MORNING + timedelta(hours=1), MORNING + timedelta(hours=2))
+        for call_id in ("call1", "call2"):
+            self.assertIsNone(self.cache.patient_events(call_id, "Jane Doe", "+19055550100"))
+            self.assertIsNone(self.cache.busy_intervals(call_id, 'dr. smith', *window))
+            self.assertIsNone(self.cache.busy_intervals(call_id, '', *window))
+            self.assertEqual(self.cache.busy_intervals(call_id, 'dr. jones', *window), [])
+
+    def test_expiry_and_eviction(self):
+        self.cache.remember_patient_events("call1", "Jane Doe", "+19055550100", None, [EVENT])
+        with patch('call_context.time.monotonic', return_value=10 ** 9):
+            self.assertIsNone(self.cache.patient_events("call1", "Jane Doe", "+19055550100"))
+
+        for call_id in ("call1", "call2", "call3"):
+            self.cache.remember_patient_events(call_id, "Jane Doe", "+19055550100", None, [EVENT])
+        self.assertIsNone(self.cache.patient_events("call1", "Jane Doe", "+19055550100"))
+        self.assertEqual(self.cache.stats()['calls'], 2)
+
+    def test_call_id_from_header_body_or_vapi_envelope(self):
+        self.assertEqual(request_call_id({}, {'X-Vapi-Call-Id': 'c1'}), 'c1')
+        self.assertEqual(request_call_id({'callId': 'c2'}, {}), 'c2')
+        self.assertEqual(request_call_id({'message': {'call': {'id': 'c3'}}}, {}), 'c3')
+        self.assertIsNone(request_call_id({'message': {'toolCallList': [{'id': 't1'}]}}, {}))
+
+
+class TestCallContextEndpoints(unittest.TestCase):
+    def setUp(self):
+        self.upstreams = FakeUpstreams(events=0).start()
+        self.upstreams.calendar("clinic@example.com").load([EVENT])
+        env = self.upstreams.env()
+        self.patches = [
+            patch('google_services.ANONYMOUS_CREDENTIALS', True),
+            patch('google_services.CALENDAR_API_URL', env['GOOGLE_CALENDAR_API_URL']),
+            patch('google_services.registry', ServiceRegistry(pool_size=2)),
+            patch('calendar_mirror.MIRROR_ENABLED', False),
+            patch('aldershot.GMAIL_ACCOUNT', "clinic@example.com"),
+            patch('aldershot.get_availability_cache', return_value=AvailabilityCache(ttl=0)),
+            patch('aldershot.get_call_contexts', return_value=CallContextCache(ttl=60)),
+            patch('aldershot.record_side_effects', MagicMock()),
+        ]
+        for p in self.patches:
+            p.start()
+        app = Flask(__name__)
+        app.register_blueprint(asbp)
+        self.client = app.test_client()
+
+    def tearDown(self):
+        google_services.registry.invalidate()
+        for p in self.patches:
+            p.stop()
+        self.upstreams.stop()
+
+    def calls(self, route: str) -> int:
+        return self.upstreams.stats()['calls'].get(route, 0)
+
+    def post(self, path: str, body: dict):
+        response = self.client.post(path, json=body, headers={'X-Vapi-Call-Id': 'call1'})
+        self.assertLess(response.status_code, 400, response.get_data(as_text=True))
+        return response.get_json()
+
+    def test_unknown_patient_scan_skipped_after_backfill(self):
+        """A miss on the phone property costs one listing once the backfill is recorded, two before"""
+        stranger = {'patient_name': 'John Smith', 'patient_phone': '+19055550199'}
+        self.assertEqual(self.post('/find_existing', stranger), {'existing_appointment_status': 'False'})
+        self.assertEqual(self.calls("calendar.events.list"), 2)
+
+        with patch('aldershot.PATIENT_PROPERTIES_BACKFILLED', True):
+            response = self.client.post('/find_existing', json=stranger, headers={'X-Vapi-Call-Id': 'call2'})
+        self.assertEqual(response.get_json(), {'existing_appointment_status': 'False'})
+        self.assertEqual(self.calls("calendar.events.list"), 3)
+
+    def test_reschedule_conversation_reuses_lookups(self):
+        patient = {'patient_name': 'Jane Doe', 'patient_phone': '+19055550100'}
+        self.assertEqual(self.post('/find_existing', patient), {'existing_appointment_status': 'True'})
+        lookups = self.calls("calendar.events.list")
+
+        self.post('/get_available', {'dentist': 'Dr. Smith'})
+        self.post('/get_available', {'dentist': 'Dr. Smith'})
+        self.assertEqual(self.calls("calendar.events.list"), lookups + 1)
+
+        result = self.post('/reschedule', dict(patient, appointment_date='2030-03-05T10:00:00-05:00'))
+        self.assertEqual(result, {'rescheduling_appointment_status': 'success'})
+        self.assertEqual(self.calls("calendar.events.list"), lookups + 1)
+        self.assertEqual(self.calls("calendar.events.patch"), 1)
+
+        # The move invalidated the patient's lookup, so this one reads the calendar again
+        self.post('/find_existing', patient)
+        self.assertGreater(self.calls("calendar.events.list"), lookups + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from unittest.mock import MagicMock
+
+from event_stream import stream_events, LIST_FIELDS
+
+
+class PagedCalendarService:
+    """Serves numbered pages of events keyed by page token"""
+
+    def __init__(self, page_count: int, per_page: int = 2):
+        self.page_count = page_count
+        self.per_page = per_page
+        self.calls = []
+
+    def events(self):
+        service = self
+
+        class Events:
+            def list(self, **params):
+                service.calls.append(params)
+                number = int(params.get('pageToken') or 0)
+                page = {'items': [{'id': f"{number}-{i}"} for i in range(service.per_page)]}
+                if number + 1 < service.page_count:
+                    page['nextPageToken'] = str(number + 1)
+                request = MagicMock()
+                request.execute.return_value = page
+                return request
+
+        return Events()
+
+
+class TestStreamEvents(unittest.TestCase):
+    def test_follows_every_page(self):
+        """All pages are read and the field projection is sent on each call"""
+        service = PagedCalendarService(page_count=3)
+        events = list(stream_events(service, 'clinic', timeMin='now'))
+
+        self.assertEqual(len(events), 6)
+        self.assertEqual([call.get('pageToken') for call in service.calls], [None, '1', '2'])
+        self.assertTrue(all(call['fields'] == LIST_FIELDS for call in service.calls))
+
+    def test_early_stop_without_prefetch_reads_one_page(self):
+        """Breaking out on the first page issues a single request"""
+        service = PagedCalendarService(page_count=5)
+        for event in stream_events(service, 'clinic', prefetch=False, page_size=2):
+            break
+
+        self.assertEqual(len(service.calls), 1)
+        self.assertEqual(service.calls[0]['maxResults'], 2)
+
+    def test_early_stop_waits_for_prefetch(self):
+        """Closing the stream leaves no prefetch running on the transport"""
+        service = PagedCalendarService(page_count=5)
+        stream = stream_events(service, 'clinic')
+        next(stream)
+        stream.close()
+
+        self.assertLessEqual(len(service.calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+from unittest.mock import patch
+
+from googleapiclient.errors import HttpError
+
+import google_services
+from google_services import ServiceRegistry
+from fake_upstreams import FakeUpstreams
+from sms_dispatcher import build_twilio_client
+from loadtest import parse_mix, percentile, summarize
+
+EVENT = {
+    'id': 'evt1',
+    'summary': 'Consultation - Jane Doe',
+    'description': 'Patient: Jane Doe\nPhone: +19055550100\nDentist: Dr. Smith',
+    'extendedProperties': {'private': {'phone': '+19055550100', 'dentist': 'dr. smith'}},
+    'start': {'dateTime': '2030-03-04T10:00:00-05:00'},
+    'end': {'dateTime': '2030-03-04T11:00:00-05:00'},
+}
+
+
+class TestFakeUpstreams(unittest.TestCase):
+    def setUp(self):
+        self.upstreams = FakeUpstreams(events=0).start()
+        self.upstreams.calendar("clinic@example.com").load([EVENT])
+        env = self.upstreams.env()
+        self.patches = [
+            patch('google_services.ANONYMOUS_CREDENTIALS', True),
+            patch('google_services.CALENDAR_API_URL', env['GOOGLE_CALENDAR_API_URL']),
+            patch('google_services.SHEETS_API_URL', env['GOOGLE_SHEETS_API_URL']),
+            patch('google_services.DRIVE_API_URL', env['GOOGLE_DRIVE_API_URL']),
+            patch('sms_dispatcher.TWILIO_BASE_URL', env['TWILIO_BASE_URL']),
+        ]
+        for p in self.patches:
+            p.start()
+        self.registry = ServiceRegistry(pool_size=1)
+
+    def tearDown(self):
+        self.registry.invalidate()
+        for p in self.patches:
+            p.stop()
+        self.upstreams.stop()
+
+    def test_calendar_client_and_sync_tokens(self):
+        with self.registry.calendar_pool("unused.json", ["scope"]).checkout() as service:
+            events = service.events()
+            page = events.list(calendarId="clinic@example.com", singleEvents=True,
+                               privateExtendedProperty="phone=+19055550100").execute()
+            self.assertEqual([event['id'] for event in page['items']], ['evt1'])
+
+            inserted = events.insert(calendarId="clinic@example.com", body=dict(EVENT, id=None)).execute()
+            events.delete(calendarId="clinic@example.com", eventId='evt1').execute()
+            changes = events.list(calendarId="clinic@example.com", syncToken=page['nextSyncToken'], showDeleted=True).execute()
+            self.assertEqual(
+                [(event['id'], event['status']) for event in changes['items']],
+                [(inserted['id'], 'confirmed'), ('evt1', 'cancelled')])
+
+            with self.assertRaises(HttpError) as raised:
+                events.delete(calendarId="clinic@example.com", eventId='evt1').execute()
+            self.assertEqual(raised.exception.resp.status, 410)
+
+    def test_sheets_and_twilio(self):
+        worksheet = self.registry.sheets("unused.json", ["scope"]).open("Audit Log").sheet1
+        worksheet.append_rows([["@Book", "Consultation"]])
+        self.assertEqual(self.upstreams.appended_rows, [["@Book", "Consultation"]])
+
+        message = build_twilio_client("ACfake", "token").messages.create(body="Hi", from_="+15550000000", to="+19055550100")
+        self.assertTrue(message.sid.startswith("SM"))
+        self.assertEqual(self.upstreams.messages[0]['to'], "+19055550100")
+
+    def test_injected_errors(self):
+        self.upstreams.error_rate = 1.0
+        with self.registry.calendar_pool("unused.json", ["scope"]).checkout() as service:
+            with self.assertRaises(HttpError) as raised:
+                service.events().list(calendarId="clinic@example.com").execute()
+        self.assertEqual(raised.exception.resp.status, 503)
+
+
+class TestLoadReport(unittest.TestCase):
+    def test_mix_and_percentiles(self):
+        self.assertEqual(parse_mix("book=1,cancel=3"), {'book': 1.0, 'cancel': 3.0})
+        with self.assertRaises(ValueError):
+            parse_mix("book=0")
+        values = [float(value) for value in range(1, 101)]
+        self.assertEqual((percentile(values, 0.5), percentile(values, 0.99)), (50.0, 99.0))
+
+        report = summarize([('book', 200, 0.1), ('book', 409, 0.3), ('cancel', 500, 0.2)], elapsed=2.0)
+        self.assertEqual(list(report), ['book', 'cancel', 'all'])
+        self.assertEqual((report['book']['ok'], report['book']['client_errors']), (1, 1))
+        self.assertEqual(report['all']['server_errors'], 1)
+        self.assertEqual(report['all']['throughput'], 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+from zoneinfo import ZoneInfo
+
+from freebusy import FreeBusyError, parse_calendar_map, query_busy
+
+TORONTO = ZoneInfo("America/Toronto")
+
+
+def freebusy_service(response: dict) -> MagicMock:
+    service = MagicMock()
+    service.freebusy.return_value.query.return_value.execute.return_value = response
+    return service
+
+
+class TestFreeBusy(unittest.TestCase):
+    def setUp(self):
+        self.time_min = datetime(2025, 3, 3, 9, tzinfo=TORONTO)
+        self.time_max = datetime(2025, 3, 3, 17, tzinfo=TORONTO)
+
+    def test_parse_calendar_map_lowercases_dentists(self):
+        self.assertEqual(parse_calendar_map('{"Dr. Smith": "smith@example.com"}'), {"dr. smith": "smith@example.com"})
+        self.assertEqual(parse_calendar_map(None), {})
+        with self.assertRaises(ValueError):
+            parse_calendar_map('["smith@example.com"]')
+
+    def test_busy_intervals_are_parsed_and_merged(self):
+        service = freebusy_service({'calendars': {'smith': {'busy': [
+            {'start': '2025-03-03T15:00:00Z', 'end': '2025-03-03T16:00:00Z'},
+            {'start': '2025-03-03T14:00:00Z', 'end': '2025-03-03T15:00:00Z'},
+        ]}}})
+        busy = query_busy(service, ['smith'], self.time_min, self.time_max)
+        self.assertEqual(busy['smith'], [(
+            datetime(2025, 3, 3, 9, tzinfo=TORONTO),
+            datetime(2025, 3, 3, 11, tzinfo=TORONTO),
+        )])
+        body = service.freebusy.return_value.query.call_args.kwargs['body']
+        self.assertEqual(body['items'], [{'id': 'smith'}])
+        self.assertEqual(body['timeMin'], self.time_min.isoformat())
+
+    def test_group_is_union_of_members(self):
+        service = freebusy_service({
+            'groups': {'team': {'calendars': ['a', 'b']}},
+            'calendars': {
+                'a': {'busy': [{'start': '2025-03-03T14:00:00Z', 'end': '2025-03-03T15:00:00Z'}]},
+                'b': {'busy': [{'start': '2025-03-03T18:00:00Z', 'end': '2025-03-03T19:00:00Z'}]},
+            },
+        })
+        self.assertEqual(len(query_busy(service, ['team'], self.time_min, self.time_max)['team']), 2)
+
+    def test_unreadable_calendar_raises(self):
+        service = freebusy_service({'calendars': {'smith': {'errors': [{'domain': 'global', 'reason': 'notFound'}]}}})
+        with self.assertRaises(FreeBusyError):
+            query_busy(service, ['smith'], self.time_min, self.time_max)
+
+    def test_large_requests_are_chunked(self):
+        service = freebusy_service({'calendars': {}})
+        query_busy(service, [f"cal-{i}" for i in range(120)], self.time_min, self.time_max)
+        self.assertEqual(service.freebusy.return_value.query.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
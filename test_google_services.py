@@ -0,0 +1,137 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import tempfile
+import json
+import os
+import time
+import rsa
+
+from google_services import ServiceRegistry, ClientPool, PoolTimeout, bounded_adapter, load_discovery_document
+
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+_, PRIVATE_KEY = rsa.newkeys(1024)
+
+
+def write_service_account_file(path: str):
+    """Write a syntactically valid service account key file"""
+    with open(path, "w") as f:
+        json.dump({
+            "type": "service_account",
+            "project_id": "test",
+            "private_key_id": "abc",
+            "private_key": PRIVATE_KEY.save_pkcs1().decode(),
+            "client_email": "test@test.iam.gserviceaccount.com",
+            "client_id": "1",
+            "token_uri": "https://oauth2.googleapis.com/token",
+        }, f)
+
+
+class TestServiceRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.key_file = os.path.join(self.tmpdir.name, "key.json")
+        write_service_account_file(self.key_file)
+        self.registry = ServiceRegistry()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_discovery_document_parsed_once(self):
+        """The bundled discovery document is cached after the first load"""
+        first = load_discovery_document("calendar", "v3")
+        self.assertEqual(first['name'], 'calendar')
+        self.assertIs(load_discovery_document("calendar", "v3"), first)
+
+    def test_calendar_pool_reused(self):
+        """Repeated calls return the same pool and a released client is handed out again"""
+        pool = self.registry.calendar_pool(self.key_file, SCOPES)
+        self.assertIs(self.registry.calendar_pool(self.key_file, SCOPES), pool)
+
+        with pool.checkout() as first:
+            pass
+        with pool.checkout() as second:
+            self.assertIs(first, second)
+
+    def test_rebuild_when_scopes_change(self):
+        """A different scope list produces fresh credentials and clients"""
+        first = self.registry.calendar_pool(self.key_file, SCOPES)
+        second = self.registry.calendar_pool(self.key_file, SCOPES + ['https://www.googleapis.com/auth/drive'])
+        self.assertIsNot(first, second)
+
+    def test_rebuild_when_key_file_changes(self):
+        """Rewriting the key file invalidates the cached clients"""
+        first = self.registry.calendar_pool(self.key_file, SCOPES)
+        write_service_account_file(self.key_file)
+        stat = os.stat(self.key_file)
+        os.utime(self.key_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        self.assertIsNot(self.registry.calendar_pool(self.key_file, SCOPES), first)
+
+    def test_forked_child_keeps_credentials_but_not_clients(self):
+        """A child process builds its own pool from the credentials it inherited"""
+        credentials = self.registry.credentials(self.key_file, SCOPES)
+        first = self.registry.calendar_pool(self.key_file, SCOPES)
+        with patch('google_services.os.getpid', return_value=os.getpid() + 1):
+            self.assertIsNot(self.registry.calendar_pool(self.key_file, SCOPES), first)
+            self.assertIs(self.registry.credentials(self.key_file, SCOPES), credentials)
+
+
+class TestClientPool(unittest.TestCase):
+    def make_pool(self, **kwargs):
+        self.built = []
+
+        def factory():
+            service = MagicMock()
+            self.built.append(service)
+            return service, MagicMock()
+
+        return ClientPool(factory, **kwargs)
+
+    def test_concurrent_checkouts_get_distinct_clients(self):
+        """Clients checked out at the same time are never shared"""
+        pool = self.make_pool(size=2)
+        first = pool.acquire()
+        second = pool.acquire()
+        self.assertIsNot(first.service, second.service)
+        first.release()
+        second.release()
+
+    def test_checkout_blocks_when_exhausted(self):
+        """Checking out beyond the pool size times out instead of creating more clients"""
+        pool = self.make_pool(size=1, checkout_timeout=0.01)
+        client = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        client.release()
+        pool.acquire().release()
+        self.assertEqual(len(self.built), 1)
+
+    def test_idle_clients_are_closed(self):
+        """Clients idle longer than the idle timeout are replaced"""
+        pool = self.make_pool(size=1, idle_timeout=0)
+        client = pool.acquire()
+        client.release()
+        time.sleep(0.01)
+        fresh = pool.acquire()
+        self.assertIsNot(fresh.service, client.service)
+        client.http.http.close.assert_called_once()
+        fresh.release()
+
+
+class TestBoundedAdapter(unittest.TestCase):
+    def test_blocking_pool_checkout_times_out(self):
+        """An exhausted blocking pool raises after the pool timeout instead of waiting forever"""
+        from urllib3.exceptions import EmptyPoolError
+
+        adapter = bounded_adapter(pool_timeout=0.01, pool_connections=1, pool_maxsize=1, pool_block=True)
+        for url in ("http://sheets.test", "https://sheets.test"):
+            pool = adapter.poolmanager.connection_from_url(url)
+            connection = pool._get_conn()
+            with self.assertRaises(EmptyPoolError):
+                pool._get_conn()
+            pool._put_conn(connection)
+            pool._put_conn(pool._get_conn())
+        adapter.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
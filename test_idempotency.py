@@ -0,0 +1,97 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from flask import Flask, request
+
+from idempotency import IdempotencyStore, idempotent
+
+
+def make_app(calls):
+    app = Flask(__name__)
+
+    @app.route("/book", methods=['POST'])
+    @idempotent
+    def book():
+        calls.append(request.get_json())
+        time.sleep(0.05)
+        if request.get_json().get('fail'):
+            return {"booking_status": "error"}, 500
+        return {"booking_status": "success", "call": len(calls)}
+
+    return app
+
+
+class TestIdempotency(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.app = make_app(self.calls)
+        patcher = patch('idempotency.get_idempotency_store', return_value=IdempotencyStore(ttl=60, max_entries=10))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, body, headers=None):
+        with self.app.test_client() as client:
+            return client.post('/book', json=body, headers=headers or {})
+
+    def test_repeat_with_header_replays_first_response(self):
+        first = self.post({'patient': 'a'}, {'Idempotency-Key': 'k1'})
+        second = self.post({'patient': 'a'}, {'Idempotency-Key': 'k1'})
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(first.get_json(), second.get_json())
+        self.assertEqual(second.headers['Idempotent-Replayed'], 'true')
+
+    def test_tool_call_id_in_body_or_vapi_envelope(self):
+        self.post({'patient': 'a', 'tool_call_id': 't1'})
+        self.post({'patient': 'a', 'tool_call_id': 't1'})
+        envelope = {'patient': 'b', 'message': {'toolCallList': [{'id': 't2'}]}}
+        self.post(envelope)
+        self.post(envelope)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_requests_without_key_always_run(self):
+        self.post({'patient': 'a'})
+        self.post({'patient': 'a'})
+        self.assertEqual(len(self.calls), 2)
+
+    def test_key_reused_with_other_body_is_rejected(self):
+        self.post({'patient': 'a'}, {'Idempotency-Key': 'k1'})
+        response = self.post({'patient': 'b'}, {'Idempotency-Key': 'k1'})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_server_errors_are_not_kept(self):
+        self.post({'fail': True}, {'Idempotency-Key': 'k1'})
+        self.post({'fail': True}, {'Idempotency-Key': 'k1'})
+        self.assertEqual(len(self.calls), 2)
+
+    def test_concurrent_duplicates_wait_for_the_first(self):
+        responses = []
+        threads = [
+            threading.Thread(target=lambda: responses.append(self.post({'patient': 'a'}, {'X-Vapi-Tool-Call-Id': 'c1'}).get_json()))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(len({response['call'] for response in responses}), 1)
+
+
+class TestIdempotencyStore(unittest.TestCase):
+    def test_completed_entries_expire_and_are_bounded(self):
+        store = IdempotencyStore(ttl=0.01, max_entries=2)
+        entry, owner = store.begin("a", "f")
+        store.finish("a", entry, (b"{}", 200, "application/json"))
+        time.sleep(0.02)
+        self.assertTrue(store.begin("a", "f")[1])
+        for key in ("b", "c", "d"):
+            entry, _ = store.begin(key, "f")
+            store.finish(key, entry, (b"{}", 200, "application/json"))
+        self.assertEqual(len(store), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import io
+import json
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+
+from flask import Blueprint, Flask
+
+import metrics
+from metrics import Counter, Histogram, span, start_request, finish_request, current_request_id, log
+
+
+class TestMetricTypes(unittest.TestCase):
+    def test_counter_render(self):
+        counter = Counter("calls_total", "Calls", ("upstream",))
+        counter.inc("calendar")
+        counter.inc("calendar", amount=2)
+        counter.inc('sh"eets')
+        self.assertEqual(counter.render(), [
+            "# HELP calls_total Calls",
+            "# TYPE calls_total counter",
+            'calls_total{upstream="calendar"} 3',
+            'calls_total{upstream="sh\\"eets"} 1',
+        ])
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("latency_seconds", "Latency", ("op",), buckets=(0.1, 1.0))
+        for seconds in (0.05, 0.1, 0.5, 3):
+            histogram.observe(seconds, "list")
+        lines = histogram.render()
+        self.assertIn('latency_seconds_bucket{op="list",le="0.1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{op="list",le="1"} 3', lines)
+        self.assertIn('latency_seconds_bucket{op="list",le="+Inf"} 4', lines)
+        self.assertIn('latency_seconds_count{op="list"} 4', lines)
+        self.assertEqual(histogram.count("list"), 4)
+
+
+class TestSpans(unittest.TestCase):
+    def test_span_is_attributed_to_the_request(self):
+        context = start_request("test.view", "req-1")
+        try:
+            self.assertEqual(current_request_id(), "req-1")
+            with span("calendar", "events.list"):
+                pass
+            with self.assertRaises(RuntimeError):
+                with span("calendar", "events.list"):
+                    raise RuntimeError("boom")
+            timing = context.server_timing()
+        finally:
+            with redirect_stdout(io.StringIO()):
+                finish_request(context, "POST", 200)
+
+        self.assertIsNone(current_request_id())
+        self.assertRegex(timing, r'^calendar-events-list;dur=[\d.]+;desc="2 calls", total;dur=[\d.]+$')
+        self.assertEqual(metrics.UPSTREAM_CALLS.value("test.view", "calendar", "events.list", "error"), 1)
+        self.assertGreaterEqual(metrics.UPSTREAM_SECONDS.count("test.view", "calendar", "events.list"), 2)
+        self.assertEqual(metrics.REQUESTS.value("test.view", "POST", "200"), 1)
+
+    def test_span_outside_a_request(self):
+        before = metrics.UPSTREAM_CALLS.value(metrics.BACKGROUND, "twilio", "messages.create", "ok")
+        with span("twilio", "messages.create"):
+            pass
+        self.assertEqual(metrics.UPSTREAM_CALLS.value(metrics.BACKGROUND, "twilio", "messages.create", "ok"), before + 1)
+
+
+class TestLog(unittest.TestCase):
+    def test_json_lines_carry_the_request_id(self):
+        context = start_request("test.log", "req-2")
+        output = io.StringIO()
+        try:
+            with patch('metrics.LOG_FORMAT', 'json'), redirect_stdout(output):
+                log("cancel", "delete calendar event", event_id="evt1")
+        finally:
+            with redirect_stdout(io.StringIO()):
+                finish_request(context, "POST", 200)
+        record = json.loads(output.getvalue())
+        self.assertEqual(
+            {key: record[key] for key in ("tag", "request_id", "endpoint", "message", "event_id")},
+            {"tag": "cancel", "request_id": "req-2", "endpoint": "test.log",
+             "message": "delete calendar event", "event_id": "evt1"})
+
+    def test_text_lines(self):
+        output = io.StringIO()
+        with patch('metrics.LOG_FORMAT', 'text'), redirect_stdout(output):
+            log("outbox", "worker error")
+        self.assertEqual(output.getvalue(), "@outbox: worker error\n")
+
+
+class TestInstrumentBlueprint(unittest.TestCase):
+    def test_headers_and_metrics(self):
+        blueprint = Blueprint("instrumented", __name__)
+        metrics.instrument_blueprint(blueprint)
+
+        @blueprint.route("/work", methods=['POST'])
+        def work():
+            with span("sheets", "append"):
+                pass
+            return {"status": "ok"}
+
+        app = Flask(__name__)
+        app.register_blueprint(blueprint)
+        with redirect_stdout(io.StringIO()), app.test_client() as client:
+            response = client.post('/work', headers={'X-Request-ID': 'abc'})
+        self.assertEqual(response.headers['X-Request-ID'], 'abc')
+        self.assertIn('sheets-append;dur=', response.headers['Server-Timing'])
+        exposition = metrics.render_metrics()
+        self.assertIn('aldershot_requests_total{endpoint="instrumented.work",method="POST",status="200"} 1', exposition)
+        self.assertIn('aldershot_upstream_duration_seconds_count{endpoint="instrumented.work",upstream="sheets",operation="append"} 1', exposition)
+
+
+if __name__ == '__main__':
+    unittest.main()
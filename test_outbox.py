@@ -0,0 +1,103 @@
+import unittest
+import tempfile
+import time
+import os
+
+from outbox import Outbox, PermanentFailure
+
+
+class TestOutbox(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.outbox = Outbox(
+            path=os.path.join(self.tmpdir.name, "outbox.sqlite3"),
+            workers=0,
+            max_attempts=3,
+            base_delay=0,
+            max_delay=0
+        )
+        self.delivered = []
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_items_delivered_and_removed(self):
+        """Delivered items leave the queue"""
+        self.outbox.register("sms", self.delivered.append)
+        self.outbox.enqueue([("sms", {'to': '+19055550100', 'body': 'hi'}), ("sms", {'to': '+19055550101', 'body': 'hi'})])
+
+        self.assertEqual(self.outbox.drain(), 2)
+        self.assertEqual([payload['to'] for payload in self.delivered], ['+19055550100', '+19055550101'])
+        self.assertEqual(self.outbox.pending_count(), 0)
+
+    def test_transient_failures_are_retried_then_dead_lettered(self):
+        """An item failing on every attempt ends in the dead-letter list with its last error"""
+        attempts = []
+
+        def failing(payload):
+            attempts.append(payload)
+            raise RuntimeError("Sheets quota exceeded")
+
+        self.outbox.register("audit_row", failing)
+        self.outbox.enqueue([("audit_row", {'row': ['@Book']})])
+        self.outbox.drain()
+
+        self.assertEqual(len(attempts), 3)
+        dead = self.outbox.dead_letters()
+        self.assertEqual(len(dead), 1)
+        self.assertEqual(dead[0]['payload'], {'row': ['@Book']})
+        self.assertIn("Sheets quota exceeded", dead[0]['last_error'])
+
+    def test_permanent_failure_skips_retries(self):
+        """PermanentFailure dead-letters on the first attempt, and the item can be requeued"""
+        def rejecting(payload):
+            raise PermanentFailure("invalid number")
+
+        self.outbox.register("sms", rejecting)
+        item_id, = self.outbox.enqueue([("sms", {'to': 'bad'})])
+        self.outbox.drain()
+        self.assertEqual(self.outbox.dead_letters()[0]['attempts'], 1)
+
+        self.outbox.register("sms", self.delivered.append)
+        self.assertTrue(self.outbox.retry_dead_letter(item_id))
+        self.outbox.drain()
+        self.assertEqual(self.delivered, [{'to': 'bad'}])
+        self.assertEqual(self.outbox.dead_letters(), [])
+
+    def test_batched_kind_delivered_together(self):
+        """Kinds registered with a batch size receive their due items as one list"""
+        batches = []
+        self.outbox.register("audit_row", batches.append, batch_size=10)
+        self.outbox.register("sms", self.delivered.append)
+        self.outbox.enqueue([("audit_row", {'row': [1]}), ("sms", {'to': 'a'}), ("audit_row", {'row': [2]})])
+        self.outbox.drain()
+
+        self.assertEqual(batches, [[{'row': [1]}, {'row': [2]}]])
+        self.assertEqual(self.delivered, [{'to': 'a'}])
+
+
+    def test_held_kind_waits_for_a_full_batch(self):
+        """Items of a kind registered with max_wait are held until a batch is full"""
+        batches = []
+        self.outbox.register("audit_row", batches.append, batch_size=3, max_wait=60)
+        self.outbox.enqueue([("audit_row", {'row': [1]})])
+        self.outbox.enqueue([("audit_row", {'row': [2]})])
+        self.assertEqual(self.outbox.drain(), 0)
+
+        self.outbox.enqueue([("audit_row", {'row': [3]}), ("audit_row", {'row': [4]})])
+        self.assertEqual(self.outbox.drain(), 2)
+        self.assertEqual([[payload['row'][0] for payload in batch] for batch in batches], [[1, 2, 3], [4]])
+
+    def test_held_kind_flushed_after_max_wait(self):
+        """A lone held item is delivered once it has waited max_wait seconds"""
+        batches = []
+        self.outbox.register("audit_row", batches.append, batch_size=3, max_wait=0.05)
+        self.outbox.enqueue([("audit_row", {'row': [1]})])
+        self.assertEqual(self.outbox.drain(), 0)
+        time.sleep(0.06)
+        self.assertEqual(self.outbox.drain(), 1)
+        self.assertEqual(batches, [[{'row': [1]}]])
+
+
+if __name__ == '__main__':
+    unittest.main()
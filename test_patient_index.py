@@ -0,0 +1,73 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from patient_index import PatientIndex, normalize_phone, normalize_name, patient_matches, event_dentist
+
+
+def make_event(event_id: str, name: str, phone: str) -> dict:
+    return {
+        'id': event_id,
+        'description': f"Booking Information:\n------------------\nPatient: {name}\nPhone: {phone}\nService: Relines",
+    }
+
+
+class TestNormalization(unittest.TestCase):
+    def test_normalize_phone(self):
+        """Formatting differences collapse to the same E.164 number"""
+        self.assertEqual(normalize_phone('+1 (905) 555-0100'), '+19055550100')
+        self.assertEqual(normalize_phone('905.555.0100'), '+19055550100')
+        self.assertEqual(normalize_phone('+447700900123'), '+447700900123')
+        self.assertEqual(normalize_phone(''), '')
+
+    def test_normalize_name(self):
+        """Case, punctuation and spacing are ignored"""
+        self.assertEqual(normalize_name('  John   DOE. '), 'john doe')
+        self.assertEqual(normalize_name("O'Neil"), "o'neil")
+
+    def test_partial_name_does_not_match(self):
+        """'Ann' must not match an appointment booked for 'Joanne'"""
+        event = make_event('e1', 'Joanne', '+19055550100')
+        self.assertFalse(patient_matches(event, 'Ann', '+19055550100'))
+        self.assertTrue(patient_matches(event, 'joanne', '(905) 555-0100'))
+
+    def test_extended_properties_preferred(self):
+        """Structured properties win over the free-text description"""
+        event = make_event('e1', 'Someone Else', '+10000000000')
+        event['extendedProperties'] = {'private': {
+            'patient_name': 'John Doe', 'phone': '+19055550100', 'dentist': 'robert'}}
+        self.assertTrue(patient_matches(event, 'John Doe', '+19055550100'))
+        self.assertEqual(event_dentist(event), 'robert')
+
+    def test_event_dentist_from_description(self):
+        """Older events fall back to the Dentist line of the description"""
+        self.assertEqual(event_dentist({'description': 'Patient: A\nDentist: Robert '}), 'robert')
+        self.assertIsNone(event_dentist({'description': 'Lunch'}))
+
+
+class TestPatientIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = PatientIndex()
+        self.start = datetime(2030, 1, 7, 14, 0, tzinfo=timezone.utc)
+
+    def test_lookup_orders_by_start(self):
+        """Several appointments for one patient come back earliest first"""
+        self.index.add(make_event('late', 'John Doe', '+19055550100'), self.start + timedelta(days=1))
+        self.index.add(make_event('early', 'John Doe', '+19055550100'), self.start)
+        self.index.add(make_event('other', 'Jane Doe', '+19055550100'), self.start)
+
+        self.assertEqual([event_id for event_id, _ in self.index.lookup('john doe', '905-555-0100')],
+                         ['early', 'late'])
+
+    def test_move_and_remove(self):
+        """Re-adding an event replaces its entry and removing it empties the key"""
+        self.index.add(make_event('e1', 'John Doe', '+19055550100'), self.start)
+        self.index.add(make_event('e1', 'John Doe', '+19055550100'), self.start + timedelta(hours=2))
+        self.assertEqual(self.index.lookup('John Doe', '+19055550100'), [('e1', self.start + timedelta(hours=2))])
+
+        self.index.remove('e1')
+        self.assertEqual(self.index.lookup('John Doe', '+19055550100'), [])
+        self.assertEqual(len(self.index), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import io
+import os
+import pstats
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+
+from flask import Blueprint, Flask
+
+import metrics
+import profiling
+from profiling import StackSampler, ProfileSession, prune_profiles, install_profiler
+
+
+def busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class TestStackSampler(unittest.TestCase):
+    def test_samples_only_the_registered_thread(self):
+        sampler = StackSampler(interval=0.001)
+        counts = sampler.add(threading.get_ident())
+        busy_wait(0.05)
+        sampler.remove(threading.get_ident())
+        self.assertTrue(counts)
+        self.assertTrue(all("busy_wait" in stack for stack in counts))
+        self.assertTrue(all(stack.split(";")[-1].startswith("busy_wait") for stack in counts))
+
+
+class TestProfileSession(unittest.TestCase):
+    def test_collapsed_file_with_tracemalloc(self):
+        with tempfile.TemporaryDirectory() as directory:
+            session = ProfileSession("collapsed", trace_memory=True).start()
+            busy_wait(0.03)
+            garbage = [bytearray(1024) for _ in range(100)]
+            session.stop()
+            paths = session.write(directory, "aldershot.get_available", "req/1")
+            self.assertEqual(len(paths), 2)
+            name = os.path.basename(paths[0])
+            self.assertIn("aldershot.get_available-req_1-", name)
+            self.assertTrue(name.endswith(".collapsed"))
+            with open(paths[0]) as profile:
+                self.assertRegex(profile.readline(), r"busy_wait \(test_profiling\.py:\d+\) \d+\n$")
+            self.assertTrue(paths[1].endswith(".tracemalloc.txt"))
+            del garbage
+
+    def test_pstats_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            session = ProfileSession("pstats", trace_memory=False).start()
+            busy_wait(0.001)
+            session.stop()
+            [path] = session.write(directory, "aldershot.book", "req-2")
+            functions = {function for _, _, function in pstats.Stats(path).stats}
+            self.assertIn("busy_wait", functions)
+
+
+class TestPruneProfiles(unittest.TestCase):
+    def test_removes_oldest_first(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for index in range(5):
+                with open(os.path.join(directory, f"2026010{index}-x.collapsed"), "w") as output:
+                    output.write("a" * 100)
+            self.assertEqual(prune_profiles(directory, max_files=3, max_bytes=10_000), 2)
+            self.assertEqual(sorted(os.listdir(directory))[0], "20260102-x.collapsed")
+            self.assertEqual(prune_profiles(directory, max_files=10, max_bytes=150), 2)
+            self.assertEqual(os.listdir(directory), ["20260104-x.collapsed"])
+
+
+class TestInstallProfiler(unittest.TestCase):
+    def make_app(self):
+        blueprint = Blueprint("profiled", __name__)
+        metrics.instrument_blueprint(blueprint)
+        install_profiler(blueprint)
+
+        @blueprint.route("/fast")
+        def fast():
+            return {"status": "ok"}
+
+        @blueprint.route("/slow")
+        def slow():
+            busy_wait(0.05)
+            return {"status": "ok"}
+
+        app = Flask(__name__)
+        install_profiler(app)
+        app.register_blueprint(blueprint)
+        return app
+
+    def test_slow_mode_keeps_only_slow_requests(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                patch('profiling.PROFILE_MODE', 'slow'), \
+                patch('profiling.PROFILE_SLOW_SECONDS', 0.04), \
+                patch('profiling.PROFILE_FORMAT', 'collapsed'), \
+                patch('profiling.PROFILE_TRACEMALLOC', False), \
+                patch('profiling.PROFILE_DIR', directory), \
+                redirect_stdout(io.StringIO()):
+            with self.make_app().test_client() as client:
+                client.get('/fast')
+                client.get('/slow', headers={'X-Request-ID': 'slow-1'})
+            files = os.listdir(directory)
+        # Installed on both the app and the blueprint, the request is profiled once
+        self.assertEqual(len(files), 1)
+        self.assertIn("-profiled.slow-slow-1-", files[0])
+
+    def test_sampled_once_per_request(self):
+        """With hooks on the app and the blueprint, requests are still sampled at PROFILE_SAMPLE_RATE"""
+        import random
+
+        requests = 400
+        with tempfile.TemporaryDirectory() as directory, \
+                patch('profiling.PROFILE_MODE', 'sample'), \
+                patch('profiling.PROFILE_SAMPLE_RATE', 0.25), \
+                patch('profiling.PROFILE_FORMAT', 'pstats'), \
+                patch('profiling.PROFILE_TRACEMALLOC', False), \
+                patch('profiling.PROFILE_DIR', directory), \
+                patch('profiling.PROFILE_MAX_FILES', requests), \
+                patch('profiling.random', random.Random(7)), \
+                redirect_stdout(io.StringIO()):
+            with self.make_app().test_client() as client:
+                for _ in range(requests):
+                    client.get('/fast')
+            rate = len(os.listdir(directory)) / requests
+        self.assertGreater(rate, 0.18)
+        self.assertLess(rate, 0.32)
+
+    def test_off_by_default(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                patch('profiling.PROFILE_MODE', 'off'), \
+                patch('profiling.PROFILE_DIR', directory), \
+                redirect_stdout(io.StringIO()):
+            with self.make_app().test_client() as client:
+                client.get('/slow')
+            self.assertEqual(os.listdir(directory), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from datetime import datetime, timedelta, timezone
+
+from slot_locks import SlotLocks, SlotLockTimeout, get_slot_locks
+
+NINE = datetime(2025, 3, 3, 14, tzinfo=timezone.utc)
+
+
+class TestSlotLocks(unittest.TestCase):
+    def test_cells_cover_the_appointment(self):
+        locks = SlotLocks(15)
+        self.assertEqual(len(locks.cells("Smith", NINE, NINE + timedelta(hours=1))), 4)
+        self.assertEqual(len(locks.cells("Smith", NINE + timedelta(minutes=5), NINE + timedelta(minutes=20))), 2)
+        self.assertEqual(locks.cells("Smith", NINE, NINE + timedelta(minutes=15))[0][0], "smith")
+
+    def test_overlapping_reservation_waits(self):
+        locks = SlotLocks(15, timeout=0.05)
+        with locks.reserve("smith", NINE, NINE + timedelta(hours=1)):
+            with self.assertRaises(SlotLockTimeout):
+                with locks.reserve("Smith", NINE + timedelta(minutes=45), NINE + timedelta(hours=2)):
+                    pass
+        self.assertEqual(len(locks), 0)
+
+    def test_other_dentist_or_slot_proceeds(self):
+        locks = SlotLocks(15, timeout=0.05)
+        with locks.reserve("smith", NINE, NINE + timedelta(hours=1)):
+            with locks.reserve("jones", NINE, NINE + timedelta(hours=1)):
+                pass
+            with locks.reserve("smith", NINE + timedelta(hours=1), NINE + timedelta(hours=2)):
+                pass
+
+    def test_reservations_are_serialized(self):
+        locks = SlotLocks(15)
+        inside = []
+        overlaps = []
+
+        def book(offset):
+            start = NINE + timedelta(minutes=offset)
+            with locks.reserve("smith", start, start + timedelta(hours=1)):
+                if inside:
+                    overlaps.append(offset)
+                inside.append(offset)
+                time.sleep(0.01)
+                inside.remove(offset)
+
+        threads = [threading.Thread(target=book, args=(offset,)) for offset in (0, 15, 30, 45, 0, 30)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(overlaps, [])
+        self.assertEqual(len(locks), 0)
+
+    def test_shared_locks_keep_one_grid(self):
+        with patch('slot_locks._slot_locks', None):
+            locks = get_slot_locks(15)
+            self.assertIs(get_slot_locks(15), locks)
+            with self.assertRaises(ValueError):
+                get_slot_locks(30)
+
+
+if __name__ == '__main__':
+    unittest.main()
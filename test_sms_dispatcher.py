@@ -0,0 +1,70 @@
+import unittest
+from unittest.mock import MagicMock
+import time
+
+from sms_dispatcher import SmsDispatcher, RateLimiter
+
+
+class TestSmsDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.messages.create.return_value.sid = 'SM123'
+        self.factory_calls = 0
+
+    def make_dispatcher(self, **kwargs):
+        def factory():
+            self.factory_calls += 1
+            return self.client
+
+        kwargs.setdefault('rate_per_second', 0)
+        return SmsDispatcher(factory, **kwargs)
+
+    def test_result_dict_contract(self):
+        """The handle resolves to the same dict send_sms_notification always returned"""
+        dispatcher = self.make_dispatcher()
+        result = dispatcher.send('+19055550100', 'Hello', '+19055550199').result(timeout=5)
+        self.assertEqual(result, {'success': True, 'message': 'SMS sent successfully', 'sid': 'SM123'})
+        dispatcher.shutdown()
+
+    def test_client_built_once(self):
+        """Every message goes through the same Twilio client"""
+        dispatcher = self.make_dispatcher()
+        for i in range(3):
+            dispatcher.send(f'+1905555010{i}', 'Hello', '+19055550199').result(timeout=5)
+        self.assertEqual(self.factory_calls, 1)
+        dispatcher.shutdown()
+
+    def test_duplicate_within_window_sent_once(self):
+        """The same message to the same number is only sent once inside the dedupe window"""
+        dispatcher = self.make_dispatcher()
+        first = dispatcher.send('+19055550100', 'Hello', '+19055550199')
+        second = dispatcher.send('+19055550100', 'Hello', '+19055550199')
+        self.assertIs(first, second)
+        first.result(timeout=5)
+        self.assertEqual(self.client.messages.create.call_count, 1)
+        dispatcher.shutdown()
+
+    def test_failed_send_can_be_retried(self):
+        """A failed send is not deduplicated, so a retry sends again"""
+        self.client.messages.create.side_effect = [RuntimeError('timeout'), MagicMock(sid='SM456')]
+        dispatcher = self.make_dispatcher()
+        failed = dispatcher.send('+19055550100', 'Hello', '+19055550199').result(timeout=5)
+        self.assertEqual(failed['error_code'], 'UNKNOWN_ERROR')
+
+        retried = dispatcher.send('+19055550100', 'Hello', '+19055550199').result(timeout=5)
+        self.assertEqual(retried['sid'], 'SM456')
+        dispatcher.shutdown()
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_spaces_acquisitions(self):
+        """At 20 per second, three acquisitions after the burst take about 0.1s"""
+        limiter = RateLimiter(rate=20)
+        start = time.monotonic()
+        for _ in range(3):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+
+from startup_report import parse_importtime
+
+SAMPLE = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     _io
+import time:       372 |     156037 |   flask
+import time:      5705 |     214714 | app
+"""
+
+
+class TestParseImporttime(unittest.TestCase):
+    def test_modules_and_depth(self):
+        modules = parse_importtime(SAMPLE)
+        self.assertEqual([entry['module'] for entry in modules], ['_io', 'flask', 'app'])
+        self.assertEqual([entry['depth'] for entry in modules], [2, 1, 0])
+        self.assertEqual(modules[2]['cumulative_us'], 214714)
+        self.assertEqual(modules[1]['self_us'], 372)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import os
+
+import google_services
+from google_services import ServiceRegistry
+from fake_upstreams import FakeUpstreams
+import calendar_mirror
+import aldershot
+import warmup
+
+EVENT = {
+    'id': 'evt1',
+    'summary': 'Consultation - Jane Doe',
+    'description': 'Patient: Jane Doe\nPhone: +19055550100\nDentist: Dr. Smith',
+    'start': {'dateTime': '2030-03-04T10:00:00-05:00'},
+    'end': {'dateTime': '2030-03-04T11:00:00-05:00'},
+}
+
+
+class TestWarmup(unittest.TestCase):
+    def setUp(self):
+        self.upstreams = FakeUpstreams(events=0).start()
+        self.upstreams.calendar("clinic@example.com").load([EVENT])
+        env = self.upstreams.env()
+        self.patches = [
+            patch('google_services.ANONYMOUS_CREDENTIALS', True),
+            patch('google_services.CALENDAR_API_URL', env['GOOGLE_CALENDAR_API_URL']),
+            patch('google_services.SHEETS_API_URL', env['GOOGLE_SHEETS_API_URL']),
+            patch('google_services.DRIVE_API_URL', env['GOOGLE_DRIVE_API_URL']),
+            patch('google_services.registry', ServiceRegistry(pool_size=2)),
+            patch('calendar_mirror.MIRROR_ENABLED', True),
+            patch.dict('calendar_mirror._mirrors', clear=True),
+            patch('aldershot.GMAIL_ACCOUNT', "clinic@example.com"),
+            patch('aldershot.SPREAD_SHEET', "Audit Log"),
+            patch('aldershot.TWILIO_ACCOUNT_SID', None),
+            patch('aldershot._audit_writer', None),
+            patch('aldershot.get_side_effect_outbox', MagicMock()),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        google_services.registry.invalidate()
+        for p in self.patches:
+            p.stop()
+        self.upstreams.stop()
+
+    def test_full_warmup(self):
+        """Every step succeeds against the fakes and leaves warm clients behind"""
+        timings = warmup.warm_up("full")
+        self.assertEqual(list(timings), [step.__name__ for step in warmup.warmup_steps("full")])
+        self.assertNotIn(None, timings.values())
+        self.assertTrue(calendar_mirror.get_mirror("clinic@example.com").is_synced)
+        self.assertIsNotNone(aldershot._audit_writer._worksheet)
+        aldershot.get_side_effect_outbox().start.assert_called_once()
+
+    def test_failing_step_is_skipped(self):
+        """A step that raises is reported as None and the later steps still run"""
+        self.upstreams.error_rate = 1.0
+        timings = warmup.warm_up("connect")
+        self.assertIsNone(timings['open_calendar_clients'])
+        self.assertIsNotNone(timings['start_outbox'])
+
+    def test_building_the_app_makes_no_calls(self):
+        """The app module builds its app without a warmup, so importing it stays offline"""
+        import app
+
+        app.create_app()
+        self.assertEqual(sum(self.upstreams.stats()['calls'].values()), 0)
+        self.assertFalse(calendar_mirror.get_mirror("clinic@example.com").is_synced)
+
+    def test_unknown_stage(self):
+        with self.assertRaises(ValueError):
+            warmup.warm_up("eager")
+
+    def test_forked_worker_uses_its_own_clients(self):
+        """After a prepare in the parent, a forked child connects and calls the calendar"""
+        warmup.warm_up("prepare")
+        parent_pool = google_services.registry.calendar_pool(aldershot.SERVICE_ACCOUNT_FILE, aldershot.SCOPES)
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                timings = warmup.warm_up("connect")
+                pool = google_services.registry.calendar_pool(aldershot.SERVICE_ACCOUNT_FILE, aldershot.SCOPES)
+                if None not in timings.values() and pool is not parent_pool:
+                    status = 0
+            finally:
+                os._exit(status)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+"""
+Warm the process up before it takes traffic
+
+Building the app never touches the network; the serving entrypoints run the
+warmup instead: gunicorn.conf.py's hooks, `python app.py` and the cold-start
+report. WARMUP picks what they run:
+
+    WARMUP=full      prepare, then connect (default)
+    WARMUP=prepare   only the fork-safe work
+    WARMUP=connect   only the connections
+    WARMUP=off       build everything on first use, as before
+
+`prepare` imports the Google and Twilio client libraries, parses the bundled
+discovery document, loads the service account credentials, fetches an access
+token and syncs the calendar mirror. All of it is plain data, so a pre-fork
+server can do it once in the master and every worker inherits it.
+
+`connect` opens what must not cross a fork: Calendar clients with live
+connections, the gspread client and audit worksheet, the Twilio client and
+the outbox workers. The modules owning them rebuild them in a forked child,
+so running `connect` in the master as well is wasteful but not unsafe.
+"""
+from typing import Callable, Optional, List, Dict
+import importlib
+import time
+import os
+
+from metrics import log
+import google_services
+import calendar_mirror
+import aldershot
+
+WARMUP = os.getenv("WARMUP", "full").lower()
+WARMUP_STAGES = ("full", "prepare", "connect", "off")
+# Calendar clients opened per process; each one holds its own keep-alive connection
+WARMUP_CALENDAR_CLIENTS = int(os.getenv("WARMUP_CALENDAR_CLIENTS", 2))
+
+WARMUP_MODULES = (
+    "googleapiclient.discovery",
+    "google_auth_httplib2",
+    "httplib2",
+    "google.oauth2.service_account",
+    "google.auth.transport.requests",
+    "gspread",
+    "twilio.rest",
+)
+
+
+def import_client_libraries():
+    for module in WARMUP_MODULES:
+        importlib.import_module(module)
+    google_services.load_discovery_document("calendar", "v3")
+
+
+def load_credentials():
+    """Load the service account credentials and fetch an access token if they have none"""
+    credentials = google_services.registry.credentials(aldershot.SERVICE_ACCOUNT_FILE, aldershot.SCOPES)
+    if not credentials.valid:
+        from google.auth.transport.requests import Request
+        import requests
+
+        # A throwaway session, so no connection outlives the refresh
+        with requests.Session() as session:
+            credentials.refresh(Request(session))
+
+
+def sync_calendar_mirror():
+    # The client used here stays idle in the master; workers build their own pool
+    if not calendar_mirror.MIRROR_ENABLED:
+        return
+    pool = google_services.registry.calendar_pool(aldershot.SERVICE_ACCOUNT_FILE, aldershot.SCOPES)
+    with pool.checkout() as service:
+        calendar_mirror.get_mirror(aldershot.GMAIL_ACCOUNT).refresh(service)
+
+
+def open_calendar_clients(count: int = WARMUP_CALENDAR_CLIENTS):
+    """Check out `count` pooled Calendar clients at once and make one cheap call on each"""
+    pool = google_services.registry.calendar_pool(aldershot.SERVICE_ACCOUNT_FILE, aldershot.SCOPES)
+    clients = []
+    try:
+        for _ in range(min(count, pool.size)):
+            clients.append(pool.acquire())
+        for client in clients:
+            client.service.events().list(
+                calendarId=aldershot.GMAIL_ACCOUNT, maxResults=1, fields="items(id)").execute()
+    finally:
+        for client in clients:
+            client.release()
+
+
+def open_audit_worksheet():
+    aldershot.get_audit_writer().worksheet()
+
+
+def build_twilio_client():
+    if aldershot.TWILIO_ACCOUNT_SID and aldershot.TWILIO_AUTH_TOKEN:
+        aldershot.get_sms_dispatcher().client()
+
+
+def start_outbox():
+    aldershot.get_side_effect_outbox().start()
+
+
+def warmup_steps(stage: str) -> List[Callable[[], None]]:
+    """The steps of a stage, in the order they run"""
+    prepare = [import_client_libraries, load_credentials, sync_calendar_mirror]
+    connect = [open_calendar_clients, open_audit_worksheet, build_twilio_client, start_outbox]
+    if stage == "full":
+        return prepare + connect
+    if stage == "prepare":
+        return prepare
+    if stage == "connect":
+        return connect
+    if stage == "off":
+        return []
+    raise ValueError(f"Unknown warmup stage {stage!r}; expected one of {', '.join(WARMUP_STAGES)}")
+
+
+def warm_up(stage: Optional[str] = None) -> Dict[str, Optional[float]]:
+    """
+    Run the steps of a warmup stage
+
+    A failing step is logged and skipped: the client it would have built is
+    then built on first use, exactly as without the warmup.
+
+    Parameters:
+    - stage (str): 'full', 'prepare', 'connect' or 'off'; defaults to WARMUP
+
+    Returns:
+    - Dict[str, Optional[float]]: Milliseconds per step, None for the steps that failed
+    """
+    stage = (stage or WARMUP).lower()
+    timings = {}
+    started = time.perf_counter()
+    for step in warmup_steps(stage):
+        step_started = time.perf_counter()
+        try:
+            step()
+            timings[step.__name__] = round((time.perf_counter() - step_started) * 1000, 1)
+        except Exception as e:
+            timings[step.__name__] = None
+            log("warmup", f"{step.__name__} failed: {str(e)}", level="warning")
+    if timings:
+        detail = ", ".join(
+            f"{name} {elapsed:.0f} ms" if elapsed is not None else f"{name} failed"
+            for name, elapsed in timings.items())
+        log("warmup", f"{stage} warmup in pid {os.getpid()} took "
+                      f"{(time.perf_counter() - started) * 1000:.0f} ms ({detail})", steps=timings)
+    return timings